@@ -2,13 +2,47 @@
 from .settings import (
     TUSHARE_TOKEN,
     TUSHARE_POINTS,
+    TUSHARE_HTTP_URL,
     DATABASE_PATH,
+    DATABASE_READ_ONLY,
+    DATABASE_MODE,
+    WRITER_ADDRESS,
+    WRITER_AUTHKEY,
+    WRITER_KEY_PATH,
+    SNAPSHOT_INTERVAL,
+    SNAPSHOT_KEEP,
     RATE_LIMIT_PER_MINUTE,
     RATE_LIMIT_DAILY,
+    RATE_LIMIT_BACKEND,
+    RATE_LIMIT_STATE_PATH,
+    RETRY_MAX_TRIES,
+    RETRY_BASE_DELAY,
+    RETRY_MAX_DELAY,
+    RETRY_THROTTLE_DELAY,
+    THROTTLE_PENALTY_SECONDS,
+    CIRCUIT_FAILURE_THRESHOLD,
+    CIRCUIT_RESET_SECONDS,
+    FETCH_MAX_WORKERS,
+    PIPELINE_CPU_WORKERS,
+    PIPELINE_MAX_IN_FLIGHT,
+    ASYNC_MAX_CONNECTIONS,
+    ASYNC_REQUEST_TIMEOUT,
+    CACHE_ENABLED,
+    CACHE_MEMORY_ITEMS,
+    CACHE_DEFAULT_TTL,
+    RAW_STORAGE,
+    PARQUET_COMPRESSION,
+    PIPELINE_FORMAT,
+    BATCH_MAX_ROWS,
+    BATCH_MAX_BYTES,
+    COMPACT_STORAGE,
     LOG_LEVEL,
     DATA_RAW_PATH,
     DATA_CLEAN_PATH,
     DATA_SERVE_PATH,
+    CACHE_PATH,
+    SNAPSHOT_PATH,
+    PANEL_SNAPSHOT_PATH,
     load_endpoint_registry,
     get_available_endpoints,
 )
@@ -16,13 +50,47 @@ from .settings import (
 __all__ = [
     "TUSHARE_TOKEN",
     "TUSHARE_POINTS",
+    "TUSHARE_HTTP_URL",
     "DATABASE_PATH",
+    "DATABASE_READ_ONLY",
+    "DATABASE_MODE",
+    "WRITER_ADDRESS",
+    "WRITER_AUTHKEY",
+    "WRITER_KEY_PATH",
+    "SNAPSHOT_INTERVAL",
+    "SNAPSHOT_KEEP",
     "RATE_LIMIT_PER_MINUTE",
     "RATE_LIMIT_DAILY",
+    "RATE_LIMIT_BACKEND",
+    "RATE_LIMIT_STATE_PATH",
+    "RETRY_MAX_TRIES",
+    "RETRY_BASE_DELAY",
+    "RETRY_MAX_DELAY",
+    "RETRY_THROTTLE_DELAY",
+    "THROTTLE_PENALTY_SECONDS",
+    "CIRCUIT_FAILURE_THRESHOLD",
+    "CIRCUIT_RESET_SECONDS",
+    "FETCH_MAX_WORKERS",
+    "PIPELINE_CPU_WORKERS",
+    "PIPELINE_MAX_IN_FLIGHT",
+    "ASYNC_MAX_CONNECTIONS",
+    "ASYNC_REQUEST_TIMEOUT",
+    "CACHE_ENABLED",
+    "CACHE_MEMORY_ITEMS",
+    "CACHE_DEFAULT_TTL",
+    "RAW_STORAGE",
+    "PARQUET_COMPRESSION",
+    "PIPELINE_FORMAT",
+    "BATCH_MAX_ROWS",
+    "BATCH_MAX_BYTES",
+    "COMPACT_STORAGE",
     "LOG_LEVEL",
     "DATA_RAW_PATH",
     "DATA_CLEAN_PATH",
     "DATA_SERVE_PATH",
+    "CACHE_PATH",
+    "SNAPSHOT_PATH",
+    "PANEL_SNAPSHOT_PATH",
     "load_endpoint_registry",
     "get_available_endpoints",
 ]
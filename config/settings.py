@@ -13,14 +13,71 @@ PROJECT_ROOT = Path(__file__).parent.parent
 # Tushare配置
 TUSHARE_TOKEN = os.getenv("TUSHARE_TOKEN", "")
 TUSHARE_POINTS = int(os.getenv("TUSHARE_POINTS", "5000"))
+TUSHARE_HTTP_URL = os.getenv("TUSHARE_HTTP_URL", "http://api.tushare.pro")
 
 # 数据库配置
 DATABASE_PATH = PROJECT_ROOT / os.getenv("DATABASE_PATH", "data/serve/tushare.duckdb")
+# 只读打开（只跑看板/查询的进程设置为 true）
+DATABASE_READ_ONLY = os.getenv("DATABASE_READ_ONLY", "false").lower() in ("1", "true", "yes")
+
+# 数据库访问模式：direct（本进程直接读写）/ client（只读最新快照，写入转发给写入进程）
+DATABASE_MODE = os.getenv("DATABASE_MODE", "direct").lower()
+
+# 写入进程配置（scripts/writer_daemon.py 监听地址、认证口令，快照导出间隔秒数与保留份数）
+# 认证口令留空时，写入进程首次启动生成随机密钥写入 WRITER_KEY_PATH（仅当前用户可读），客户端读取同一文件
+WRITER_ADDRESS = os.getenv("WRITER_ADDRESS", "127.0.0.1:6543")
+WRITER_AUTHKEY = os.getenv("WRITER_AUTHKEY", "")
+WRITER_KEY_PATH = PROJECT_ROOT / os.getenv("WRITER_KEY_PATH", "data/serve/writer.key")
+SNAPSHOT_INTERVAL = float(os.getenv("SNAPSHOT_INTERVAL", "300"))
+SNAPSHOT_KEEP = int(os.getenv("SNAPSHOT_KEEP", "2"))
 
 # 限频配置（5000+积分）
 RATE_LIMIT_PER_MINUTE = int(os.getenv("RATE_LIMIT_PER_MINUTE", "500"))
 RATE_LIMIT_DAILY = int(os.getenv("RATE_LIMIT_DAILY", "999999"))
 
+# 限频状态后端：local（进程内）/ sqlite（本机多进程共享同一配额）
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "local")
+RATE_LIMIT_STATE_PATH = PROJECT_ROOT / os.getenv("RATE_LIMIT_STATE_PATH", "data/serve/rate_limit.sqlite")
+
+# 重试与熔断配置（限频错误以 RETRY_THROTTLE_DELAY 为退避基准，并临时降速 THROTTLE_PENALTY_SECONDS 秒）
+RETRY_MAX_TRIES = int(os.getenv("RETRY_MAX_TRIES", "3"))
+RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", "1"))
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", "30"))
+RETRY_THROTTLE_DELAY = float(os.getenv("RETRY_THROTTLE_DELAY", "10"))
+THROTTLE_PENALTY_SECONDS = float(os.getenv("THROTTLE_PENALTY_SECONDS", "60"))
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_SECONDS = float(os.getenv("CIRCUIT_RESET_SECONDS", "60"))
+
+# 并发拉取配置（fetch_many线程池大小）
+FETCH_MAX_WORKERS = int(os.getenv("FETCH_MAX_WORKERS", "8"))
+
+# ETL任务图执行器（cpu 节点进程数，0 表示与 io 节点共用线程池；同时在途的任务图数，即流水线深度）
+PIPELINE_CPU_WORKERS = int(os.getenv("PIPELINE_CPU_WORKERS", "0"))
+PIPELINE_MAX_IN_FLIGHT = int(os.getenv("PIPELINE_MAX_IN_FLIGHT", "4"))
+
+# 异步客户端配置（连接池大小、单请求超时秒数）
+ASYNC_MAX_CONNECTIONS = int(os.getenv("ASYNC_MAX_CONNECTIONS", "64"))
+ASYNC_REQUEST_TIMEOUT = float(os.getenv("ASYNC_REQUEST_TIMEOUT", "30"))
+
+# 响应缓存配置（内存LRU条数、默认有效期秒数；已收盘日期的结果永久有效）
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+CACHE_MEMORY_ITEMS = int(os.getenv("CACHE_MEMORY_ITEMS", "256"))
+CACHE_DEFAULT_TTL = float(os.getenv("CACHE_DEFAULT_TTL", "300"))
+
+# 原始层存储：duckdb（写入库内 raw_* 表）/ parquet（data/raw 下按日期分区的 Parquet，库内以视图暴露）
+RAW_STORAGE = os.getenv("RAW_STORAGE", "duckdb").lower()
+PARQUET_COMPRESSION = os.getenv("PARQUET_COMPRESSION", "zstd")
+
+# 入库数据格式：pandas（默认）/ arrow（拉取结果转为 pyarrow.Table，转换与入库全程不回到 pandas）
+PIPELINE_FORMAT = os.getenv("PIPELINE_FORMAT", "pandas").lower()
+
+# 批量写入配置（多日数据攒够行数或字节数后单事务提交）
+BATCH_MAX_ROWS = int(os.getenv("BATCH_MAX_ROWS", "500000"))
+BATCH_MAX_BYTES = int(os.getenv("BATCH_MAX_BYTES", str(256 * 1024 * 1024)))
+
+# 紧凑存储（ts_code 按证券主表编码为整数/category，成交量、金额、股本等列用 FLOAT）
+COMPACT_STORAGE = os.getenv("COMPACT_STORAGE", "false").lower() in ("1", "true", "yes")
+
 # 日志配置
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
 
@@ -28,6 +85,10 @@ LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
 DATA_RAW_PATH = PROJECT_ROOT / "data" / "raw"
 DATA_CLEAN_PATH = PROJECT_ROOT / "data" / "clean"
 DATA_SERVE_PATH = PROJECT_ROOT / "data" / "serve"
+CACHE_PATH = DATA_RAW_PATH / "_cache"
+SNAPSHOT_PATH = DATA_SERVE_PATH / "snapshots"
+# 面板快照目录：版本文件 + LATEST 指针
+PANEL_SNAPSHOT_PATH = DATA_SERVE_PATH / "panel_snapshots"
 
 # 接口注册表
 ENDPOINT_REGISTRY_PATH = PROJECT_ROOT / "config" / "endpoint_registry.yaml"
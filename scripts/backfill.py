@@ -0,0 +1,44 @@
+"""断点续传回填：只拉取完成台账中缺失的 (接口, 交易日)
+
+中途中断后直接重跑同一命令即可从断点继续：
+    python scripts/backfill.py 20210101 20231231
+    python scripts/backfill.py 20240101 20240131 --apis daily adj_factor
+    python scripts/backfill.py 20240101 20240131 --no-resume
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from loguru import logger
+from src.etl.backfill import DEFAULT_BACKFILL_APIS, backfill
+from src.etl.planner import BY_TRADE_DATE, apis_with_strategy
+
+
+def main():
+    parser = argparse.ArgumentParser(description="按交易日接口断点续传回填")
+    parser.add_argument("start_date", help="起始日期 YYYYMMDD")
+    parser.add_argument("end_date", help="结束日期 YYYYMMDD")
+    parser.add_argument("--apis", nargs="+", default=list(DEFAULT_BACKFILL_APIS),
+                        choices=apis_with_strategy(BY_TRADE_DATE), help="要回填的接口（注册表中按交易日拉取的接口）")
+    parser.add_argument("--no-resume", action="store_true", help="忽略完成台账，重新拉取区间内全部交易日")
+    args = parser.parse_args()
+    
+    start = time.perf_counter()
+    try:
+        summary = backfill(args.apis, args.start_date, args.end_date, resume=not args.no_resume)
+    except Exception as e:
+        logger.error(f"回填失败: {e}")
+        sys.exit(1)
+    
+    for api_name, result in summary.items():
+        status = "✅" if result["remaining"] == 0 else "⚠️"
+        logger.info(f"{status} {api_name}: 本次拉取 {result['missing']} 天，仍缺 {result['remaining']} 天")
+    logger.info(f"耗时 {time.perf_counter() - start:.1f} 秒")
+    sys.exit(0 if all(result["remaining"] == 0 for result in summary.values()) else 2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""入库链路基准测试：pandas 路径 vs Arrow 路径（每个交易日的耗时与峰值内存）
+
+单个交易日的流程与 DailyPanelBuilder.build_for_date 一致（不含网络请求）：
+    拉取结果(pandas, 模拟 Tushare SDK 输出) -> 规范化 x3 -> 合并 -> upsert 到 daily_panel
+
+两种模式分别在独立子进程中运行，峰值内存取子进程的 ru_maxrss，互不干扰。
+
+用法：python scripts/benchmark_arrow_pipeline.py [--days 20] [--stocks 5500]
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+
+def make_responses(trade_date: str, n_stocks: int):
+    """构造与 Tushare SDK 返回结构一致的三张表（字符串为 object 列，日期为 YYYYMMDD）"""
+    import numpy as np
+    import pandas as pd
+    
+    rng = np.random.default_rng(int(trade_date))
+    codes = [f"{i:06d}.{'SH' if i % 2 else 'SZ'}" for i in range(n_stocks)]
+    close = rng.uniform(3, 300, n_stocks)
+    
+    daily = pd.DataFrame({
+        "ts_code": codes,
+        "trade_date": trade_date,
+        "open": close * rng.uniform(0.95, 1.05, n_stocks),
+        "high": close * 1.05,
+        "low": close * 0.95,
+        "close": close,
+        "pre_close": close * rng.uniform(0.9, 1.1, n_stocks),
+        "change": rng.normal(0, 1, n_stocks),
+        "pct_chg": rng.normal(0, 2, n_stocks),
+        "vol": rng.uniform(1e3, 1e7, n_stocks),
+        "amount": rng.uniform(1e4, 1e8, n_stocks),
+    })
+    basic = pd.DataFrame({"ts_code": codes, "trade_date": trade_date})
+    for col in ["turnover_rate", "turnover_rate_f", "volume_ratio", "pe", "pe_ttm", "pb", "ps", "ps_ttm",
+                "dv_ratio", "dv_ttm", "total_share", "float_share", "free_share", "total_mv", "circ_mv"]:
+        basic[col] = rng.uniform(0, 100, n_stocks)
+    adj = pd.DataFrame({"ts_code": codes, "trade_date": trade_date,
+                        "adj_factor": rng.uniform(1, 20, n_stocks)})
+    return daily, basic, adj
+
+
+def run_mode(mode: str, days: int, n_stocks: int) -> dict:
+    """子进程入口：用临时数据库跑完整入库链路"""
+    os.environ["DATABASE_PATH"] = str(Path(tempfile.mkdtemp(prefix="arrow_bench_")) / "bench.duckdb")
+    
+    from loguru import logger
+    logger.remove()
+    
+    import pandas as pd
+    from src.core import db
+    from src.etl import DataTransformer, ArrowTransformer, DataLoader
+    
+    db.create_daily_panel_table()
+    transformer = ArrowTransformer() if mode == "arrow" else DataTransformer()
+    loader = DataLoader()
+    dates = [d.strftime("%Y%m%d") for d in pd.bdate_range("2023-01-02", periods=days)]
+    
+    # 预先生成输入，不计入耗时
+    responses = [make_responses(d, n_stocks) for d in dates]
+    baseline_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    for daily, basic, adj in responses:
+        if mode == "arrow":
+            daily, basic, adj = (ArrowTransformer.to_arrow(df) for df in (daily, basic, adj))
+        daily = transformer.normalize_daily(daily)
+        basic = transformer.normalize_daily_basic(basic)
+        adj = transformer.normalize_adj_factor(adj)
+        panel = transformer.merge_daily_panel(daily, basic, adj)
+        loader.load_to_daily_panel(panel)
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+    
+    rows = db.query("SELECT COUNT(*) AS cnt FROM daily_panel").iloc[0]["cnt"]
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    db.close()
+    
+    return {
+        "mode": mode,
+        "rows": int(rows),
+        "wall_per_day_ms": wall / days * 1000,
+        "cpu_per_day_ms": cpu / days * 1000,
+        # Linux 下 ru_maxrss 单位为 KB
+        "peak_rss_delta_mb": (peak_rss - baseline_rss) / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="pandas / Arrow 入库链路基准测试")
+    parser.add_argument("--days", type=int, default=20, help="交易日数")
+    parser.add_argument("--stocks", type=int, default=5500, help="每日股票数")
+    parser.add_argument("--mode", choices=["pandas", "arrow"], help="（内部使用）只运行一种模式")
+    args = parser.parse_args()
+    
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, args.days, args.stocks)))
+        return
+    
+    results = []
+    for mode in ("pandas", "arrow"):
+        output = subprocess.run(
+            [sys.executable, __file__, "--mode", mode, "--days", str(args.days), "--stocks", str(args.stocks)],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    
+    print(f"{'模式':<8} | {'行数':>10} | {'墙钟/日(ms)':>12} | {'CPU/日(ms)':>11} | {'峰值内存增量(MB)':>16}")
+    print("-" * 72)
+    for r in results:
+        print(f"{r['mode']:<8} | {r['rows']:>10,} | {r['wall_per_day_ms']:>12.1f} | "
+              f"{r['cpu_per_day_ms']:>11.1f} | {r['peak_rss_delta_mb']:>16.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""daily_panel 物理布局基准测试：聚簇重写前后的单股票 / 单交易日查询延迟
+
+模拟逐日写入（每天的行按接口返回的乱序写入），再运行 DailyPanelBuilder.optimize_layout：
+- 单股票：query_panel(ts_codes=[一只股票], 一年日期范围)
+- 单交易日：query_panel(start_date=end_date=某一天)（有按日期副本时走副本）
+
+用法：python scripts/benchmark_panel_layout.py [--days 750] [--stocks 5000] [--repeat 20]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# 使用临时数据库，避免污染真实数据
+os.environ["DATABASE_PATH"] = str(Path(tempfile.mkdtemp(prefix="layout_bench_")) / "bench.duckdb")
+
+import statistics
+from loguru import logger
+from src.core import db
+from src.panel import DailyPanelBuilder
+
+
+def fill_panel(days: int, n_stocks: int):
+    """按交易日逐日写入随机顺序的行情"""
+    db.create_daily_panel_table()
+    db.execute(f"""
+        INSERT INTO daily_panel (ts_code, trade_date, open, high, low, close, vol, amount, pe, total_mv)
+        SELECT
+            printf('%06d.SZ', s) AS ts_code,
+            DATE '2020-01-01' + INTERVAL (d) DAY AS trade_date,
+            random() * 100, random() * 100, random() * 100, random() * 100,
+            random() * 1e6, random() * 1e8, random() * 50, random() * 1e10
+        FROM range({days}) t1(d), range({n_stocks}) t2(s)
+        ORDER BY d, hash(s, d)
+    """)
+    db.execute("CHECKPOINT")
+
+
+def timed_query(builder: DailyPanelBuilder, repeat: int, **kwargs) -> float:
+    """多次查询的中位延迟（毫秒）"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        builder.query_panel(**kwargs)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="daily_panel 聚簇前后查询延迟对比")
+    parser.add_argument("--days", type=int, default=750, help="交易日数")
+    parser.add_argument("--stocks", type=int, default=5000, help="股票数")
+    parser.add_argument("--repeat", type=int, default=20, help="每个查询重复次数")
+    args = parser.parse_args()
+    
+    logger.remove()
+    fill_panel(args.days, args.stocks)
+    
+    # query_panel 只读库，不需要 Tushare 客户端
+    builder = DailyPanelBuilder.__new__(DailyPanelBuilder)
+    stock = f"{args.stocks // 2:06d}.SZ"
+    day = "2021-06-01"
+    queries = {
+        "单股票一年": dict(ts_codes=[stock], start_date="2021-01-01", end_date="2021-12-31", limit=1000),
+        "单交易日截面": dict(start_date=day, end_date=day, limit=args.stocks),
+    }
+    
+    before = {name: timed_query(builder, args.repeat, **kw) for name, kw in queries.items()}
+    
+    start = time.perf_counter()
+    DailyPanelBuilder.optimize_layout(by_date_copy=True)
+    rewrite_seconds = time.perf_counter() - start
+    
+    after = {name: timed_query(builder, args.repeat, **kw) for name, kw in queries.items()}
+    
+    rows = db.query("SELECT COUNT(*) AS cnt FROM daily_panel").iloc[0]["cnt"]
+    print(f"daily_panel: {rows:,} 行，重写耗时 {rewrite_seconds:.1f} 秒")
+    print(f"{'查询':<10} | {'重写前(ms)':>10} | {'重写后(ms)':>10} | {'加速比':>6}")
+    print("-" * 48)
+    for name in queries:
+        print(f"{name:<10} | {before[name]:>10.2f} | {after[name]:>10.2f} | {before[name] / after[name]:>5.1f}x")
+    
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Upsert基准测试：表规模增长时单日upsert耗时对比
+
+对比两种写法（单日约5000行，写入已存在的交易日，即全部为主键冲突）：
+- legacy: DELETE ... WHERE EXISTS (SELECT 1 FROM df ...) + INSERT SELECT * FROM df
+- engine: Database.upsert_dataframe（临时表暂存 + ON CONFLICT，单事务）
+
+用法：python scripts/benchmark_upsert.py [--days 400] [--stocks 5000] [--step 100]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# 使用临时数据库，避免污染真实数据
+_tmp_dir = tempfile.mkdtemp(prefix="upsert_bench_")
+os.environ["DATABASE_PATH"] = str(Path(_tmp_dir) / "bench.duckdb")
+
+import numpy as np
+import pandas as pd
+from loguru import logger
+from src.core import db
+
+
+def make_day(trade_date: pd.Timestamp, n_stocks: int) -> pd.DataFrame:
+    """构造一个交易日的行情（列顺序故意与表定义不同）"""
+    rng = np.random.default_rng(int(trade_date.strftime("%Y%m%d")))
+    close = rng.uniform(5, 100, n_stocks)
+    return pd.DataFrame({
+        "close": close,
+        "trade_date": trade_date,
+        "ts_code": [f"{i:06d}.SZ" for i in range(n_stocks)],
+        "open": close * rng.uniform(0.95, 1.05, n_stocks),
+        "vol": rng.uniform(1e3, 1e6, n_stocks),
+        "amount": rng.uniform(1e4, 1e7, n_stocks),
+    })
+
+
+def legacy_upsert(df: pd.DataFrame, table_name: str):
+    """原实现（列顺序需与表一致）"""
+    conn = db.get_connection()
+    ordered = df[["ts_code", "trade_date", "open", "close", "vol", "amount"]]
+    conn.register("df", ordered)
+    conn.execute(f"""
+        DELETE FROM {table_name} AS t
+        WHERE EXISTS (
+            SELECT 1 FROM df AS s
+            WHERE t.ts_code = s.ts_code AND t.trade_date = s.trade_date
+        )
+    """)
+    conn.execute(f"INSERT INTO {table_name} SELECT * FROM df")
+    conn.unregister("df")
+
+
+def timed(fn, *args) -> float:
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="upsert耗时随表规模变化的基准测试")
+    parser.add_argument("--days", type=int, default=400, help="累计写入的交易日数")
+    parser.add_argument("--stocks", type=int, default=5000, help="每日股票数")
+    parser.add_argument("--step", type=int, default=100, help="每隔多少个交易日测一次")
+    args = parser.parse_args()
+    
+    columns = """
+        ts_code VARCHAR,
+        trade_date DATE,
+        open DOUBLE,
+        close DOUBLE,
+        vol DOUBLE,
+        amount DOUBLE
+    """
+    db.execute(f"CREATE TABLE bench_legacy ({columns})")
+    db.execute(f"CREATE TABLE bench_engine ({columns}, PRIMARY KEY (ts_code, trade_date))")
+    
+    dates = pd.bdate_range("2015-01-05", periods=args.days)
+    probe = make_day(dates[0], args.stocks)
+    
+    logger.remove()
+    print(f"{'表行数':>12} | {'legacy(秒)':>12} | {'engine(秒)':>12}")
+    print("-" * 44)
+    
+    for i, trade_date in enumerate(dates, 1):
+        day = make_day(trade_date, args.stocks)
+        legacy_upsert(day, "bench_legacy")
+        db.upsert_dataframe(day, "bench_engine", pk_fields=["ts_code", "trade_date"])
+        
+        if i % args.step == 0 or i == 1:
+            # 重写第一天：全部主键冲突
+            t_legacy = timed(legacy_upsert, probe, "bench_legacy")
+            t_engine = timed(db.upsert_dataframe, probe, "bench_engine", ["ts_code", "trade_date"])
+            rows = db.query("SELECT COUNT(*) AS cnt FROM bench_engine").iloc[0]["cnt"]
+            print(f"{rows:>12,} | {t_legacy:>12.4f} | {t_engine:>12.4f}")
+    
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
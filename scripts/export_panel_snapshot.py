@@ -0,0 +1,42 @@
+"""导出 daily_panel 的内存映射快照（Arrow IPC，[交易日 x 证券] 稠密布局）
+
+首次导出后，每次 DailyPanelBuilder.build_for_range 结束会自动增量刷新：
+    python scripts/export_panel_snapshot.py
+    python scripts/export_panel_snapshot.py --since 20240101
+
+分析进程中：
+    from src.panel import PanelSnapshot
+    close = PanelSnapshot.open().frame("close")
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from loguru import logger
+from config import PANEL_SNAPSHOT_PATH
+from src.panel import PanelSnapshot
+
+
+def main():
+    parser = argparse.ArgumentParser(description="daily_panel 面板快照导出")
+    parser.add_argument("--path", default=str(PANEL_SNAPSHOT_PATH), help="快照目录（版本文件 + LATEST 指针）")
+    parser.add_argument("--since", default=None, help="只重查该日期(YYYYMMDD)之后的交易日，默认全量导出")
+    args = parser.parse_args()
+    
+    start = time.perf_counter()
+    try:
+        snapshot = PanelSnapshot.refresh(args.since, path=Path(args.path))
+    except Exception as e:
+        logger.error(f"导出失败: {e}")
+        sys.exit(1)
+    
+    size = snapshot.path.stat().st_size / 1024 / 1024
+    logger.success(f"✅ {snapshot.path.name}: {snapshot.n_dates} 个交易日 x {snapshot.n_stocks} 只证券, {len(snapshot.fields)} 列, {size:.1f} MB")
+    logger.info(f"耗时 {time.perf_counter() - start:.1f} 秒")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""按接口注册表通用拉取：规划调用、并发拉取、写入类型化原始表
+
+未给日期时从水位续拉：
+    python scripts/extract.py moneyflow weekly index_daily
+    python scripts/extract.py fund_nav --start 20240101 --end 20240131
+    python scripts/extract.py index_daily --codes 000300.SH 000905.SH
+    python scripts/extract.py daily --start 20150101 --end 20241231 --codes 000001.SZ --plan
+    python scripts/extract.py --financials          # 四张财务报表按公告日回看窗口增量刷新
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from loguru import logger
+from src.etl import DataExtractor
+from src.etl.planner import BY_ANN_DATE_WITH_LOOKBACK, apis_with_strategy
+
+
+def main():
+    parser = argparse.ArgumentParser(description="按注册表 increment_strategy 通用拉取接口")
+    parser.add_argument("apis", nargs="*", help="接口名（需在注册表中配置 increment_strategy）")
+    parser.add_argument("--financials", action="store_true",
+                        help="加上所有 by_ann_date_with_lookback 的财务接口，一起并发拉取")
+    parser.add_argument("--start", default=None, help="起始日期 YYYYMMDD（默认从水位续拉）")
+    parser.add_argument("--end", default=None, help="结束日期 YYYYMMDD（默认今天）")
+    parser.add_argument("--codes", nargs="+", default=None,
+                        help="只拉这些代码（by_ts_code 接口，或 slice_by_code 的按交易日接口）")
+    parser.add_argument("--plan", action="store_true", help="只输出调用计划（切片方式、估计调用数与耗时），不拉取")
+    args = parser.parse_args()
+    
+    apis = list(args.apis)
+    if args.financials:
+        apis += [api_name for api_name in apis_with_strategy(BY_ANN_DATE_WITH_LOOKBACK) if api_name not in apis]
+    if not apis:
+        parser.error("请指定接口名或 --financials")
+    
+    extractor = DataExtractor()
+    if args.plan:
+        for api_name in apis:
+            logger.info(extractor.plan(api_name, args.start, args.end, codes=args.codes).describe())
+        sys.exit(0)
+    
+    start = time.perf_counter()
+    try:
+        summaries = extractor.extract_many(apis, args.start, args.end, codes=args.codes)
+    except Exception as e:
+        logger.error(f"拉取失败: {e}")
+        sys.exit(1)
+    
+    for api_name, summary in summaries.items():
+        status = "✅" if summary["failed"] == 0 else "⚠️"
+        logger.info(f"{status} {api_name}: {summary['calls']} 次调用，失败 {summary['failed']}，{summary['rows']} 行")
+    logger.info(f"耗时 {time.perf_counter() - start:.1f} 秒")
+    sys.exit(0 if all(summary["failed"] == 0 for summary in summaries.values()) else 1)
+
+
+if __name__ == "__main__":
+    main()
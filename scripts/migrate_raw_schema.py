@@ -0,0 +1,77 @@
+"""维护命令：把旧的原始表（CREATE TABLE AS 建的字符串日期、无主键表）迁移为类型化表
+
+按 config/endpoint_registry.yaml 的 columns / pk_fields 重建：YYYYMMDD 字符串转 DATE，
+加 PRIMARY KEY（upsert 走 ON CONFLICT）。已经是类型化的表、湖中的视图会跳过。
+    python scripts/migrate_raw_schema.py
+    python scripts/migrate_raw_schema.py --dry-run
+"""
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from loguru import logger
+from config import load_endpoint_registry
+from src.core import db
+from src.core.schema import registry_pk, table_columns, table_for_api
+
+
+def candidate_tables() -> list:
+    """注册表中的接口对应的、库内存在的实体表"""
+    tables = {table_for_api(api_name) for api_name in load_endpoint_registry()}
+    existing = db.query("""
+        SELECT table_name FROM information_schema.tables WHERE table_type = 'BASE TABLE'
+    """)["table_name"].tolist()
+    return sorted(table for table in tables if table in existing)
+
+
+def pending_changes(table_name: str) -> list:
+    """需要迁移的内容（空列表表示已是类型化表）"""
+    current = db.get_column_types(table_name)
+    changes = [
+        f"{col}: {current[col]} -> {target}"
+        for col, target in table_columns(table_name, current).items()
+        if col in current and target in ("DATE", "TIMESTAMP") and current[col] != target
+    ]
+    pk_fields = registry_pk(table_name)
+    if pk_fields and not db.get_primary_key(table_name):
+        changes.append(f"PRIMARY KEY ({', '.join(pk_fields)})")
+    return changes
+
+
+def used_bytes() -> int:
+    size = db.query("PRAGMA database_size").iloc[0]
+    return int(size["used_blocks"]) * int(size["block_size"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="原始表类型化迁移")
+    parser.add_argument("--dry-run", action="store_true", help="只列出需要迁移的表")
+    args = parser.parse_args()
+    
+    plan = {table: pending_changes(table) for table in candidate_tables()}
+    plan = {table: changes for table, changes in plan.items() if changes}
+    if not plan:
+        logger.success("✅ 所有原始表均已是类型化表")
+        return
+    
+    for table, changes in plan.items():
+        logger.info(f"{table}: {'; '.join(changes)}")
+    if args.dry_run:
+        return
+    
+    before = used_bytes()
+    for table in plan:
+        try:
+            rows = db.migrate_typed_table(table)
+            logger.success(f"✅ {table}: {rows:,} 行")
+        except Exception as e:
+            logger.error(f"{table} 迁移失败（已回滚）: {e}")
+    after = used_bytes()
+    
+    logger.info(f"库占用空间: {before / 1024 / 1024:.1f} MB -> {after / 1024 / 1024:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+"""维护命令：按 (ts_code, trade_date) 聚簇重写 daily_panel
+
+回填或大批量增量之后运行一次即可；可选生成按交易日排序的副本供截面查询使用：
+    python scripts/optimize_daily_panel.py
+    python scripts/optimize_daily_panel.py --by-date
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from loguru import logger
+from src.panel import DailyPanelBuilder
+
+
+def main():
+    parser = argparse.ArgumentParser(description="daily_panel 物理布局维护")
+    parser.add_argument("--by-date", action="store_true",
+                        help=f"同时生成按交易日排序的副本 {DailyPanelBuilder.BY_DATE_TABLE}")
+    args = parser.parse_args()
+    
+    start = time.perf_counter()
+    try:
+        result = DailyPanelBuilder.optimize_layout(by_date_copy=args.by_date)
+    except Exception as e:
+        logger.error(f"重写失败: {e}")
+        sys.exit(1)
+    
+    for table, rows in result.items():
+        logger.success(f"✅ {table}: {rows:,} 行")
+    logger.info(f"耗时 {time.perf_counter() - start:.1f} 秒")
+
+
+if __name__ == "__main__":
+    main()
@@ -31,17 +31,13 @@ def probe_all_endpoints():
             status, message = client.probe_endpoint(api_name)
             
             # 记录到数据库
-            db.execute("""
-                INSERT OR REPLACE INTO endpoint_capabilities 
-                (api_name, min_points, permission_mode, status, message, last_probe_at)
-                VALUES (?, ?, ?, ?, ?, datetime('now'))
-            """, (
+            db.record_capability(
                 api_name,
-                config.get('min_points'),
-                config.get('permission_mode'),
                 status,
-                message
-            ))
+                message,
+                min_points=config.get('min_points'),
+                permission_mode=config.get('permission_mode'),
+            )
             
             # 分类统计
             results[status].append(api_name)
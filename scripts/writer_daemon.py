@@ -0,0 +1,48 @@
+"""写入进程：独占 tushare.duckdb 的读写连接，接收其它进程的写入任务并定期导出只读快照
+
+启动后，其它进程设置 DATABASE_MODE=client 即可与写入进程并行运行：
+    python scripts/writer_daemon.py
+    DATABASE_MODE=client streamlit run ui/app.py
+    DATABASE_MODE=client python scripts/probe_capabilities.py
+"""
+import argparse
+import os
+import signal
+import sys
+from pathlib import Path
+
+# 写入进程本身必须直接读写数据库（覆盖 .env 中的 client 配置）
+os.environ["DATABASE_MODE"] = "direct"
+os.environ["DATABASE_READ_ONLY"] = "false"
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from loguru import logger
+from config import WRITER_ADDRESS, SNAPSHOT_INTERVAL
+from src.core.writer import WriterServer
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DuckDB 单写入进程")
+    parser.add_argument("--address", default=WRITER_ADDRESS, help="监听地址 host:port")
+    parser.add_argument("--snapshot-interval", type=float, default=SNAPSHOT_INTERVAL,
+                        help="有写入时导出快照的间隔秒数")
+    args = parser.parse_args()
+    
+    server = WriterServer(address=args.address, snapshot_interval=args.snapshot_interval)
+    
+    def stop(signum, frame):
+        logger.info("收到退出信号，正在停止写入进程...")
+        server.shutdown()
+    
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    logger.info("=" * 60)
+    logger.info("Tushare数据面板系统 - 写入进程")
+    logger.info("=" * 60)
+    main()
@@ -1,13 +1,38 @@
 """核心模块初始化"""
 from .database import Database, db
 from .tushare_client import TushareClient, get_client
+from .async_client import AsyncTushareClient
 from .rate_limiter import RateLimiter, rate_limiter
+from .writer import WriterServer, WriterClient, WriterError
+from .lake import ParquetLake, raw_lake
+from .errors import (
+    TushareAPIError,
+    ThrottleError,
+    PermissionDeniedError,
+    BadRequestError,
+    TransientError,
+    CircuitOpenError,
+    classify_error,
+)
 
 __all__ = [
     "Database",
     "db",
     "TushareClient",
     "get_client",
+    "AsyncTushareClient",
     "RateLimiter",
     "rate_limiter",
+    "WriterServer",
+    "WriterClient",
+    "WriterError",
+    "ParquetLake",
+    "raw_lake",
+    "TushareAPIError",
+    "ThrottleError",
+    "PermissionDeniedError",
+    "BadRequestError",
+    "TransientError",
+    "CircuitOpenError",
+    "classify_error",
 ]
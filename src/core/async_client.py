@@ -0,0 +1,195 @@
+"""Tushare异步客户端（asyncio + 连接池，直连HTTP接口）"""
+import asyncio
+import pandas as pd
+from typing import Optional, Dict, Any, List, Sequence, Tuple
+from loguru import logger
+from config import (
+    TUSHARE_TOKEN,
+    TUSHARE_HTTP_URL,
+    ASYNC_MAX_CONNECTIONS,
+    ASYNC_REQUEST_TIMEOUT,
+    RETRY_MAX_TRIES,
+    get_available_endpoints,
+)
+from .rate_limiter import rate_limiter
+from .tushare_client import check_permission
+from .errors import CircuitOpenError, ThrottleError, classify_error
+from .resilience import backoff_delay, circuit_breakers
+from .cache import request_key
+from .singleflight import AsyncSingleFlight
+
+try:
+    import aiohttp
+except ImportError:  # 可选依赖：只有异步调度场景需要
+    aiohttp = None
+
+
+class AsyncTushareClient:
+    """Tushare Pro异步客户端（与TushareClient共用权限检查与限频器）
+    
+    用法：
+        async with AsyncTushareClient() as client:
+            df = await client.fetch_by_trade_date("daily", "20240102")
+    """
+    
+    def __init__(self, token: str = None, http_url: str = None,
+                 max_connections: int = ASYNC_MAX_CONNECTIONS,
+                 timeout: float = ASYNC_REQUEST_TIMEOUT,
+                 tries: int = RETRY_MAX_TRIES):
+        if aiohttp is None:
+            raise ImportError("AsyncTushareClient 需要 aiohttp，请执行 pip install aiohttp")
+        
+        self.token = token or TUSHARE_TOKEN
+        if not self.token:
+            raise ValueError("Tushare token未配置！请在.env文件中设置TUSHARE_TOKEN")
+        
+        # http_url 可指向本地替身服务（测试用）
+        self.http_url = http_url or TUSHARE_HTTP_URL
+        self.max_connections = max_connections
+        self.timeout = timeout
+        
+        # 重试次数（退避策略与同步客户端一致）
+        self.tries = tries
+        
+        # 加载接口注册表
+        self.endpoints = get_available_endpoints()
+        
+        self._session: Optional["aiohttp.ClientSession"] = None
+        
+        # 在途请求合并（相同 api_name + 参数只调用一次）
+        self._inflight = AsyncSingleFlight()
+        
+        logger.info(f"Tushare异步客户端已初始化: {self.http_url}, 连接池: {max_connections}")
+    
+    async def __aenter__(self) -> "AsyncTushareClient":
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+    
+    def _get_session(self) -> "aiohttp.ClientSession":
+        """获取共享会话（延迟创建，需在事件循环内调用）"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_connections)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+        return self._session
+    
+    async def close(self):
+        """关闭连接池"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+    
+    def check_endpoint_permission(self, api_name: str) -> tuple[bool, str]:
+        """检查接口权限"""
+        return check_permission(self.endpoints, api_name)
+    
+    async def _request(self, api_name: str, fields: str = "", **kwargs) -> pd.DataFrame:
+        """发送一次HTTP请求并解析为DataFrame"""
+        payload = {
+            "api_name": api_name,
+            "token": self.token,
+            "params": kwargs,
+            "fields": fields,
+        }
+        
+        session = self._get_session()
+        async with session.post(self.http_url, json=payload) as resp:
+            resp.raise_for_status()
+            result = await resp.json(content_type=None)
+        
+        if result.get("code") != 0:
+            raise Exception(result.get("msg") or f"接口返回错误码: {result.get('code')}")
+        
+        data = result.get("data") or {}
+        return pd.DataFrame(data.get("items") or [], columns=data.get("fields") or [])
+    
+    async def _call_api(self, api_name: str, **kwargs) -> Optional[pd.DataFrame]:
+        """调用API（带分类重试、限频与熔断）"""
+        breaker = circuit_breakers.get(api_name)
+        if not breaker.allow():
+            raise CircuitOpenError(f"接口 {api_name} 熔断中，暂停调用", api_name)
+        
+        attempt = 0
+        while True:
+            attempt += 1
+            
+            # 限频（全局 + 接口级）
+            await rate_limiter.acquire_async(api_name)
+            
+            try:
+                df = await self._request(api_name, **kwargs)
+            except Exception as e:
+                error = classify_error(e, api_name)
+                if isinstance(error, ThrottleError):
+                    rate_limiter.report_throttle(api_name)
+                
+                if not error.retryable or attempt >= self.tries:
+                    breaker.record_failure(error)
+                    raise error from e
+                
+                delay = backoff_delay(attempt, error)
+                logger.warning(f"{api_name} 第{attempt}次调用失败[{error.category}]: {error}，{delay:.1f}秒后重试")
+                await asyncio.sleep(delay)
+                continue
+            
+            breaker.record_success()
+            logger.debug(f"{api_name} 返回 {len(df)} 行")
+            return df
+    
+    async def fetch(self, api_name: str, **kwargs) -> Optional[pd.DataFrame]:
+        """统一拉取接口（带权限检查与在途请求合并）"""
+        # 检查权限
+        has_permission, msg = self.check_endpoint_permission(api_name)
+        if not has_permission:
+            logger.error(f"接口 {api_name} 无权限: {msg}")
+            return None
+        
+        # 相同请求在途时等待同一结果，共享时各自拿副本
+        key = request_key(api_name, kwargs)
+        df, shared = await self._inflight.do(key, self._fetch_once, api_name, kwargs)
+        if shared and df is not None:
+            logger.debug(f"{api_name} 合并在途请求")
+            df = df.copy()
+        return df
+    
+    async def _fetch_once(self, api_name: str, kwargs: Dict[str, Any]) -> Optional[pd.DataFrame]:
+        """实际调用（由 fetch 保证同一请求同时只执行一次）"""
+        try:
+            return await self._call_api(api_name, **kwargs)
+        except Exception as e:
+            logger.error(f"调用 {api_name} 失败: {e}")
+            return None
+    
+    async def fetch_by_trade_date(self, api_name: str, trade_date: str, **kwargs) -> Optional[pd.DataFrame]:
+        """按交易日拉取（推荐模式）"""
+        return await self.fetch(api_name, trade_date=trade_date, **kwargs)
+    
+    async def fetch_by_ts_code(self, api_name: str, ts_code: str, start_date: str = None,
+                               end_date: str = None, **kwargs) -> Optional[pd.DataFrame]:
+        """按股票代码拉取"""
+        params = {"ts_code": ts_code, **kwargs}
+        if start_date:
+            params["start_date"] = start_date
+        if end_date:
+            params["end_date"] = end_date
+        return await self.fetch(api_name, **params)
+    
+    async def fetch_by_date_range(self, api_name: str, start_date: str, end_date: str,
+                                  **kwargs) -> Optional[pd.DataFrame]:
+        """按日期范围拉取"""
+        return await self.fetch(api_name, start_date=start_date, end_date=end_date, **kwargs)
+    
+    async def fetch_many(self, requests: Sequence[Tuple[str, Dict[str, Any]]],
+                         max_concurrency: int = None) -> List[Optional[pd.DataFrame]]:
+        """并发批量拉取（按提交顺序返回，单个失败返回 None）"""
+        semaphore = asyncio.Semaphore(max_concurrency or self.max_connections)
+        
+        async def _one(api_name: str, kwargs: Dict[str, Any]) -> Optional[pd.DataFrame]:
+            async with semaphore:
+                return await self.fetch(api_name, **(kwargs or {}))
+        
+        return await asyncio.gather(*(_one(api_name, kwargs) for api_name, kwargs in requests))
@@ -0,0 +1,184 @@
+"""接口响应缓存（内存LRU + 磁盘Parquet两级，按内容寻址）"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+import pandas as pd
+from loguru import logger
+from config import (
+    CACHE_ENABLED,
+    CACHE_MEMORY_ITEMS,
+    CACHE_DEFAULT_TTL,
+    CACHE_PATH,
+    load_endpoint_registry,
+)
+
+# 视为“日期”的请求参数
+DATE_PARAMS = ("trade_date", "start_date", "end_date", "cal_date", "nav_date", "ann_date")
+# 构成封闭上界的参数：有其一且全部日期早于今天时，结果不会再变化（只有 start_date 的区间仍在增长）
+END_BOUND_PARAMS = ("end_date", "trade_date", "cal_date", "nav_date", "ann_date")
+
+
+def request_key(api_name: str, kwargs: Dict[str, Any]) -> str:
+    """请求指纹：(api_name, 排序后的参数, 字段列表)"""
+    params = {k: v for k, v in kwargs.items() if k != "fields" and v is not None}
+    fields = kwargs.get("fields") or ""
+    if isinstance(fields, str):
+        fields = [f.strip() for f in fields.split(",") if f.strip()]
+    payload = json.dumps(
+        {"api_name": api_name, "params": params, "fields": sorted(fields)},
+        sort_keys=True, ensure_ascii=False, default=str,
+    )
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """接口响应缓存
+    
+    TTL策略（秒，None 表示永久）：
+    - 注册表显式配置 cache_ttl 的接口按配置（0 表示不缓存），如 stock_basic
+    - 有封闭上界（end_date 或单日参数）、所有日期参数都早于今天且未按 period 查询：永久
+    - 其它（含只有 start_date 的开放区间）：CACHE_DEFAULT_TTL
+    调用方需要最新数据时用 client.fetch(..., use_cache=False) 绕过缓存。
+    空结果不缓存，避免把“数据尚未发布”固化下来。
+    """
+    
+    def __init__(self, max_items: int = CACHE_MEMORY_ITEMS, disk_path: Path = CACHE_PATH,
+                 default_ttl: float = CACHE_DEFAULT_TTL, enabled: bool = CACHE_ENABLED):
+        self.max_items = max_items
+        self.disk_path = Path(disk_path)
+        self.default_ttl = default_ttl
+        self.enabled = enabled
+        self.registry = load_endpoint_registry()
+        
+        # key -> (DataFrame, 写入时间)
+        self._memory: "OrderedDict[str, Tuple[pd.DataFrame, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0}
+    
+    def ttl_for(self, api_name: str, kwargs: Dict[str, Any]) -> Optional[float]:
+        """计算请求结果的有效期"""
+        config = self.registry.get(api_name, {})
+        if "cache_ttl" in config:
+            return config["cache_ttl"]
+        
+        today = datetime.now().strftime("%Y%m%d")
+        dates = [str(kwargs[k]) for k in DATE_PARAMS if kwargs.get(k)]
+        closed = any(kwargs.get(k) for k in END_BOUND_PARAMS)
+        if closed and "period" not in kwargs and all(d < today for d in dates):
+            return None
+        
+        return self.default_ttl
+    
+    def _disk_file(self, api_name: str, key: str) -> Path:
+        return self.disk_path / api_name / f"{key}.parquet"
+    
+    @staticmethod
+    def _expired(written_at: float, ttl: Optional[float]) -> bool:
+        return ttl is not None and time.time() - written_at > ttl
+    
+    def get(self, api_name: str, kwargs: Dict[str, Any]) -> Optional[pd.DataFrame]:
+        """读取缓存（返回副本，调用方可随意修改）"""
+        if not self.enabled:
+            return None
+        
+        ttl = self.ttl_for(api_name, kwargs)
+        if ttl == 0:
+            return None
+        
+        key = request_key(api_name, kwargs)
+        
+        # 1. 内存LRU
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                df, written_at = entry
+                if not self._expired(written_at, ttl):
+                    self._memory.move_to_end(key)
+                    self.stats["memory_hits"] += 1
+                    return df.copy()
+                del self._memory[key]
+        
+        # 2. 磁盘Parquet
+        path = self._disk_file(api_name, key)
+        if path.exists():
+            written_at = path.stat().st_mtime
+            if not self._expired(written_at, ttl):
+                try:
+                    df = pd.read_parquet(path)
+                except Exception as e:
+                    logger.warning(f"读取缓存失败 {path}: {e}")
+                else:
+                    self._remember(key, df, written_at)
+                    with self._lock:
+                        self.stats["disk_hits"] += 1
+                    logger.debug(f"{api_name} 命中磁盘缓存")
+                    return df.copy()
+        
+        with self._lock:
+            self.stats["misses"] += 1
+        return None
+    
+    def put(self, api_name: str, kwargs: Dict[str, Any], df: pd.DataFrame):
+        """写入缓存（空结果不缓存）"""
+        if not self.enabled or df is None or len(df) == 0:
+            return
+        
+        ttl = self.ttl_for(api_name, kwargs)
+        if ttl == 0:
+            return
+        
+        key = request_key(api_name, kwargs)
+        df = df.copy()
+        self._remember(key, df, time.time())
+        
+        # 先写临时文件再原子替换，避免并发读到半个文件
+        path = self._disk_file(api_name, key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            df.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"写入缓存失败 {path}: {e}")
+        
+        with self._lock:
+            self.stats["writes"] += 1
+    
+    def _remember(self, key: str, df: pd.DataFrame, written_at: float):
+        """放入内存LRU并淘汰最久未用的条目"""
+        with self._lock:
+            self._memory[key] = (df, written_at)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_items:
+                self._memory.popitem(last=False)
+    
+    def clear(self, api_name: str = None):
+        """清空缓存（可只清某个接口）"""
+        with self._lock:
+            self._memory.clear()
+        
+        target = self.disk_path / api_name if api_name else self.disk_path
+        if target.exists():
+            for path in target.rglob("*.parquet"):
+                path.unlink(missing_ok=True)
+        logger.info(f"缓存已清空: {api_name or '全部'}")
+    
+    def get_stats(self) -> dict:
+        """命中统计"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats["memory_items"] = len(self._memory)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        return stats
+
+
+# 全局单例
+response_cache = ResponseCache()
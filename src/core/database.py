@@ -1,13 +1,48 @@
 """DuckDB数据库管理"""
+import functools
+import threading
+import time
+import uuid
+from datetime import datetime
+from contextlib import contextmanager
 import duckdb
+import numpy as np
+import pyarrow as pa
 from pathlib import Path
 from typing import Optional
 from loguru import logger
-from config import DATABASE_PATH
+from config import DATABASE_PATH, DATABASE_READ_ONLY, DATABASE_MODE, SNAPSHOT_PATH, COMPACT_STORAGE
+from .schema import (build_table_ddl, cast_expression, registry_pk, uses_row_hash,
+                     COMPACT_FLOAT_COLUMNS, ROW_HASH_COLUMN)
+
+# 客户端模式下检查是否有更新快照的间隔（秒）
+SNAPSHOT_CHECK_INTERVAL = 2.0
+
+
+def _writes(method):
+    """写方法：客户端模式下转发给写入进程执行"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self.mode == "client":
+            return self._writer_client().call(method.__name__, *args, **kwargs)
+        return method(self, *args, **kwargs)
+    return wrapper
 
 
 class Database:
-    """DuckDB数据库管理器（单例模式）"""
+    """DuckDB数据库管理器（单例模式）
+    
+    进程内只有一个根连接，每个线程通过 conn.cursor() 拿到独立游标（DuckDB 中游标即同库的
+    独立连接，各自拥有事务与临时对象）。读在各自游标上按 MVCC 快照执行，不会排在其它线程的
+    写事务后面；Streamlit 多会话、fetch_many 线程池可以安全共用 db。
+    
+    DATABASE_READ_ONLY=true 时以只读方式打开（只跑看板的进程），写操作由 DuckDB 直接拒绝。
+    
+    DATABASE_MODE=client 时只读打开写入进程导出的最新快照（有新快照自动切换），
+    写方法（标注 @_writes）转发给 scripts/writer_daemon.py 执行，见 src/core/writer.py。
+    
+    首次执行查询时才连接：只导入模块、不碰数据库的进程（如映射面板快照的分析进程）不占用库文件。
+    """
     
     _instance: Optional['Database'] = None
     _conn: Optional[duckdb.DuckDBPyConnection] = None
@@ -15,27 +50,95 @@ class Database:
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super().__new__(cls)
+            cls._instance._local = threading.local()
+            cls._instance._generation = 0
+            cls._instance.mode = DATABASE_MODE
+            cls._instance.read_only = DATABASE_READ_ONLY or DATABASE_MODE == "client"
+            cls._instance._writer = None
+            cls._instance._snapshot_file = None
+            cls._instance._snapshot_checked_at = 0.0
         return cls._instance
     
-    def __init__(self):
-        if self._conn is None:
-            self.connect()
-    
-    def connect(self):
-        """连接数据库"""
+    def connect(self, read_only: bool = None):
+        """连接数据库（read_only 为 None 时取 DATABASE_READ_ONLY）"""
+        if self.mode == "client":
+            self._connect_snapshot()
+            return
+        
+        if read_only is not None:
+            self.read_only = read_only
+        
         db_path = Path(DATABASE_PATH)
         db_path.parent.mkdir(parents=True, exist_ok=True)
         
-        self._conn = duckdb.connect(str(db_path))
-        logger.info(f"数据库已连接: {db_path}")
+        self._conn = duckdb.connect(str(db_path), read_only=self.read_only)
+        # 旧连接上的线程游标全部作废
+        self._generation += 1
+        logger.info(f"数据库已连接: {db_path}{' (只读)' if self.read_only else ''}")
+        
+        # 初始化系统表（只读连接跳过，由写入进程负责建表）
+        if not self.read_only:
+            self._init_system_tables()
+    
+    def _connect_snapshot(self):
+        """客户端模式：只读打开最新快照（还没有快照时请写入进程先导出一份）"""
+        from .writer import SnapshotManager
+        
+        snapshot = SnapshotManager.latest(SNAPSHOT_PATH)
+        if snapshot is None:
+            snapshot = Path(self._writer_client().snapshot())
+        
+        # 旧连接不主动关闭：其它线程可能仍在上面执行查询，游标切换后自然释放
+        self._conn = duckdb.connect(str(snapshot), read_only=True)
+        self._snapshot_file = snapshot
+        self._snapshot_checked_at = time.time()
+        self._generation += 1
+        logger.info(f"已打开只读快照: {snapshot.name}")
+    
+    def _refresh_snapshot(self):
+        """客户端模式：有更新的快照时切换过去"""
+        now = time.time()
+        if now - self._snapshot_checked_at < SNAPSHOT_CHECK_INTERVAL:
+            return
+        self._snapshot_checked_at = now
         
-        # 初始化系统表
-        self._init_system_tables()
+        from .writer import SnapshotManager
+        latest = SnapshotManager.latest(SNAPSHOT_PATH)
+        if latest is not None and latest != self._snapshot_file:
+            self._connect_snapshot()
+    
+    def sync_snapshot(self):
+        """客户端模式：让写入进程立即导出快照并切换过去（需要马上读到刚提交的写入时调用）"""
+        if self.mode != "client":
+            return
+        self._writer_client().snapshot()
+        self._connect_snapshot()
+    
+    def _writer_client(self):
+        """写入进程客户端（客户端模式下懒加载）"""
+        if self._writer is None:
+            from .writer import WriterClient
+            self._writer = WriterClient()
+        return self._writer
+    
+    def _cursor(self) -> duckdb.DuckDBPyConnection:
+        """当前线程的游标（首次使用时从根连接派生）"""
+        if self._conn is None:
+            self.connect()
+        elif self.mode == "client":
+            self._refresh_snapshot()
+        
+        local = self._local
+        if getattr(local, "generation", None) != self._generation:
+            local.cursor = self._conn.cursor()
+            local.generation = self._generation
+            local.tx_depth = 0
+        return local.cursor
     
     def _init_system_tables(self):
         """初始化系统表（元数据管理）"""
         # ETL状态表：记录每个接口的增量水位
-        self._conn.execute("""
+        self._cursor().execute("""
             CREATE TABLE IF NOT EXISTS etl_state (
                 api_name VARCHAR PRIMARY KEY,
                 watermark_value VARCHAR,
@@ -47,7 +150,7 @@ class Database:
         """)
         
         # 接口能力表：记录探测结果
-        self._conn.execute("""
+        self._cursor().execute("""
             CREATE TABLE IF NOT EXISTS endpoint_capabilities (
                 api_name VARCHAR PRIMARY KEY,
                 min_points INTEGER,
@@ -60,7 +163,7 @@ class Database:
         """)
         
         # 运行历史表：记录每次拉取任务
-        self._conn.execute("""
+        self._cursor().execute("""
             CREATE TABLE IF NOT EXISTS run_history (
                 id INTEGER PRIMARY KEY,
                 api_name VARCHAR,
@@ -74,11 +177,33 @@ class Database:
             )
         """)
         
+        # 完成台账：按 (接口, 交易日) 记录已成功入库的日期，断点续传回填据此计算缺口
+        self._cursor().execute("""
+            CREATE TABLE IF NOT EXISTS etl_ledger (
+                api_name VARCHAR,
+                trade_date DATE,
+                row_count INTEGER,
+                completed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (api_name, trade_date)
+            )
+        """)
+        
+        # 证券主表：ts_code -> 从0开始的连续整数编号（只增不改，紧凑存储与 category 编码用）
+        self._cursor().execute("""
+            CREATE TABLE IF NOT EXISTS security_master (
+                security_id INTEGER PRIMARY KEY,
+                ts_code VARCHAR NOT NULL UNIQUE,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        
         logger.info("系统表初始化完成")
     
+    @_writes
     def create_daily_panel_table(self):
-        """创建交易日面板表（核心面板1）"""
-        self._conn.execute("""
+        """创建交易日面板表（核心面板1，COMPACT_STORAGE 时量额/股本/市值列用 FLOAT）"""
+        compact = {col: "FLOAT" if COMPACT_STORAGE else "DOUBLE" for col in COMPACT_FLOAT_COLUMNS}
+        self._cursor().execute(f"""
             CREATE TABLE IF NOT EXISTS daily_panel (
                 ts_code VARCHAR,
                 trade_date DATE,
@@ -90,8 +215,8 @@ class Database:
                 pre_close DOUBLE,
                 change DOUBLE,
                 pct_chg DOUBLE,
-                vol DOUBLE,
-                amount DOUBLE,
+                vol {compact['vol']},
+                amount {compact['amount']},
                 -- 复权价格
                 adj_factor DOUBLE,
                 adj_close DOUBLE,
@@ -106,11 +231,11 @@ class Database:
                 ps_ttm DOUBLE,
                 dv_ratio DOUBLE,
                 dv_ttm DOUBLE,
-                total_share DOUBLE,
-                float_share DOUBLE,
-                free_share DOUBLE,
-                total_mv DOUBLE,
-                circ_mv DOUBLE,
+                total_share {compact['total_share']},
+                float_share {compact['float_share']},
+                free_share {compact['free_share']},
+                total_mv {compact['total_mv']},
+                circ_mv {compact['circ_mv']},
                 -- 元数据
                 updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 PRIMARY KEY (ts_code, trade_date)
@@ -118,9 +243,10 @@ class Database:
         """)
         logger.info("daily_panel表已创建")
     
+    @_writes
     def create_funda_panel_table(self):
         """创建财务面板表（核心面板2）"""
-        self._conn.execute("""
+        self._cursor().execute("""
             CREATE TABLE IF NOT EXISTS funda_panel (
                 ts_code VARCHAR,
                 end_date DATE,
@@ -166,57 +292,418 @@ class Database:
         logger.info("funda_panel表已创建")
     
     def get_connection(self) -> duckdb.DuckDBPyConnection:
-        """获取数据库连接"""
-        if self._conn is None:
-            self.connect()
-        return self._conn
+        """获取当前线程的数据库游标"""
+        return self._cursor()
+    
+    @contextmanager
+    def transaction(self):
+        """事务上下文（当前线程游标上 BEGIN / COMMIT，异常时 ROLLBACK）
+        
+        可嵌套：内层直接加入外层事务，由最外层统一提交。
+        客户端模式下写入在写入进程执行，不支持跨调用事务（多表原子写入用 upsert_tables）。
+        """
+        if self.mode == "client":
+            raise RuntimeError("客户端模式不支持 db.transaction()，请使用 upsert_tables 单事务写入")
+        
+        cursor = self._cursor()
+        local = self._local
+        if local.tx_depth > 0:
+            local.tx_depth += 1
+            try:
+                yield cursor
+            finally:
+                local.tx_depth -= 1
+            return
+        
+        cursor.execute("BEGIN TRANSACTION")
+        local.tx_depth = 1
+        try:
+            yield cursor
+            cursor.execute("COMMIT")
+        except BaseException:
+            # COMMIT 冲突失败时 DuckDB 已自行中止事务，ROLLBACK 会再报错；始终抛出原始异常
+            try:
+                cursor.execute("ROLLBACK")
+            except Exception as e:
+                logger.debug(f"ROLLBACK 跳过: {e}")
+            raise
+        finally:
+            local.tx_depth = 0
     
     def execute(self, query: str, params: tuple = None):
-        """执行SQL"""
+        """执行SQL（在本进程的连接上执行；客户端模式下连接的是只读快照，写入请用 @_writes 的具名方法）"""
         if params:
-            return self._conn.execute(query, params)
-        return self._conn.execute(query)
+            return self._cursor().execute(query, params)
+        return self._cursor().execute(query)
+    
+    @_writes
+    def advance_watermark(self, api_name: str, watermark: str, row_count: int):
+        """推进接口水位（只前进不后退：回填更早的日期不会把水位拉回去）"""
+        self._cursor().execute("""
+            INSERT INTO etl_state (api_name, watermark_value, last_success_at, last_row_count)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (api_name) DO UPDATE SET
+                watermark_value = GREATEST(etl_state.watermark_value, EXCLUDED.watermark_value),
+                last_success_at = EXCLUDED.last_success_at,
+                last_row_count = EXCLUDED.last_row_count,
+                updated_at = now()
+        """, (api_name, watermark, datetime.now(), row_count))
+    
+    @_writes
+    def record_capability(self, api_name: str, status: str, message: str,
+                          min_points: int = None, permission_mode: str = None):
+        """记录接口探测结果"""
+        self._cursor().execute("""
+            INSERT OR REPLACE INTO endpoint_capabilities
+            (api_name, min_points, permission_mode, status, message, last_probe_at)
+            VALUES (?, ?, ?, ?, ?, now())
+        """, (api_name, min_points, permission_mode, status, message))
+    
+    @_writes
+    def drop_table(self, table_name: str):
+        """删除表（不存在时忽略）"""
+        self._cursor().execute(f'DROP TABLE IF EXISTS "{table_name}"')
+    
+    @_writes
+    def create_lake_view(self, table_name: str):
+        """创建（或替换）Parquet 湖中原始表的视图（按文件中的实际列决定哪些日期列要转换）"""
+        from .lake import raw_lake
+        cursor = self._cursor()
+        column_types = {name: col_type for name, col_type, *_ in
+                        cursor.execute(f"DESCRIBE SELECT * FROM {raw_lake.source_sql(table_name)}").fetchall()}
+        cursor.execute(raw_lake.view_sql(table_name, column_types))
     
     def query(self, query: str, params: tuple = None):
         """查询并返回DataFrame"""
         if params:
-            return self._conn.execute(query, params).df()
-        return self._conn.execute(query).df()
+            return self._cursor().execute(query, params).df()
+        return self._cursor().execute(query).df()
     
+    @contextmanager
+    def registered(self, df, prefix: str = "_df"):
+        """把 DataFrame / Arrow Table 注册为临时视图（Arrow 零拷贝扫描），退出时注销"""
+        view_name = f"{prefix}_{uuid.uuid4().hex}"
+        self._cursor().register(view_name, df)
+        try:
+            yield view_name
+        finally:
+            self._cursor().unregister(view_name)
+    
+    @_writes
     def insert_dataframe(self, df, table_name: str, if_exists: str = "append"):
-        """插入DataFrame（幂等写入）"""
+        """插入DataFrame（幂等写入，df 可为 Arrow Table）"""
         if if_exists == "replace":
-            self._conn.execute(f"DROP TABLE IF EXISTS {table_name}")
-        
-        self._conn.execute(f"CREATE TABLE IF NOT EXISTS {table_name} AS SELECT * FROM df")
+            self._cursor().execute(f"DROP TABLE IF EXISTS {table_name}")
         
-        if if_exists == "append":
-            self._conn.execute(f"INSERT INTO {table_name} SELECT * FROM df")
+        with self.registered(df) as view_name:
+            self._cursor().execute(f"CREATE TABLE IF NOT EXISTS {table_name} AS SELECT * FROM {view_name}")
+            
+            if if_exists == "append":
+                self._cursor().execute(f"INSERT INTO {table_name} SELECT * FROM {view_name}")
         
         logger.info(f"已插入 {len(df)} 行到 {table_name}")
     
+    def get_table_columns(self, table_name: str) -> list:
+        """获取表的列名（按表定义顺序）"""
+        result = self._cursor().execute("""
+            SELECT column_name FROM information_schema.columns
+            WHERE table_name = ?
+            ORDER BY ordinal_position
+        """, (table_name,)).fetchall()
+        return [row[0] for row in result]
+    
+    def get_primary_key(self, table_name: str) -> list:
+        """获取表的主键列（无主键返回空列表）"""
+        result = self._cursor().execute("""
+            SELECT constraint_column_names FROM duckdb_constraints()
+            WHERE table_name = ? AND constraint_type = 'PRIMARY KEY'
+        """, (table_name,)).fetchone()
+        return list(result[0]) if result else []
+    
+    @_writes
+    def create_table_like(self, df, table_name: str):
+        """按DataFrame结构建空表（表已存在则跳过）"""
+        with self.registered(df, prefix="_schema") as view_name:
+            self._cursor().execute(f"CREATE TABLE IF NOT EXISTS {table_name} AS SELECT * FROM {view_name} WHERE 1=0")
+    
+    def get_column_types(self, relation: str) -> dict:
+        """表/视图的列类型 {列名: 类型}"""
+        return {row[0]: row[1] for row in self._cursor().execute(f"DESCRIBE {relation}").fetchall()}
+    
+    @_writes
+    def create_typed_table(self, df, table_name: str, pk_fields: list = None):
+        """按接口注册表建类型化表（DATE列 + PRIMARY KEY，表已存在则跳过）
+        
+        注册表 columns 声明的列按声明类型建列，其余列按 df 推断（见 src/core/schema.py）；
+        pk_fields 为空时取注册表 pk_fields。
+        """
+        if self.table_exists(table_name):
+            # 注册表后来开启了行哈希：补上哈希列（旧行为空，下次写入时视为已变化）
+            if uses_row_hash(table_name) and ROW_HASH_COLUMN not in self.get_table_columns(table_name):
+                self._cursor().execute(f'ALTER TABLE {table_name} ADD COLUMN "{ROW_HASH_COLUMN}" UBIGINT')
+                logger.info(f"{table_name} 已添加行哈希列")
+            return
+        with self.registered(df, prefix="_schema") as view_name:
+            ddl = build_table_ddl(table_name, self.get_column_types(view_name), pk_fields)
+        self._cursor().execute(ddl)
+        logger.info(f"{table_name} 表已创建（类型化）")
+    
+    @_writes
+    def migrate_typed_table(self, table_name: str, pk_fields: list = None) -> int:
+        """把旧表（CREATE TABLE AS 建的全 VARCHAR、无主键表）重建为类型化表，返回行数
+        
+        YYYYMMDD 字符串转 DATE；主键为空的行丢弃，主键重复时保留最后写入的一行。
+        """
+        old_types = self.get_column_types(table_name)
+        ddl = build_table_ddl(table_name, old_types, pk_fields)
+        pk_fields = [col for col in (pk_fields or registry_pk(table_name)) if col in old_types]
+        temp_name = f"_migrate_{uuid.uuid4().hex}"
+        
+        with self.transaction() as cursor:
+            cursor.execute(f'CREATE TEMP TABLE {temp_name} AS SELECT *, rowid AS "__rowid" FROM {table_name}')
+            cursor.execute(f"DROP TABLE {table_name}")
+            cursor.execute(ddl)
+            
+            new_types = self.get_column_types(table_name)
+            columns = [col for col in new_types if col in old_types]
+            col_list = ", ".join(f'"{col}"' for col in columns)
+            select_list = ", ".join(cast_expression(col, old_types[col], new_types[col]) for col in columns)
+            
+            if pk_fields:
+                # 先转换再判断主键是否为空；重复主键按原表行号保留最后一行
+                partition = ", ".join(f'"{col}"' for col in pk_fields)
+                not_null = " AND ".join(f'"{col}" IS NOT NULL' for col in pk_fields)
+                cursor.execute(f"""
+                    INSERT INTO {table_name} ({col_list})
+                    SELECT {col_list} FROM (SELECT {select_list}, "__rowid" FROM {temp_name})
+                    WHERE {not_null}
+                    QUALIFY row_number() OVER (PARTITION BY {partition} ORDER BY "__rowid" DESC) = 1
+                """)
+            else:
+                cursor.execute(f"INSERT INTO {table_name} ({col_list}) SELECT {select_list} FROM {temp_name}")
+            cursor.execute(f"DROP TABLE {temp_name}")
+        
+        self._cursor().execute("CHECKPOINT")
+        rows = self._cursor().execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
+        logger.info(f"{table_name} 已迁移为类型化表: {rows} 行")
+        return rows
+    
+    @_writes
+    def register_securities(self, ts_codes: list) -> int:
+        """把新出现的 ts_code 登记进证券主表（编号接在现有最大编号之后），返回新增数量"""
+        codes = pa.table({"ts_code": pa.array([str(code) for code in ts_codes if code], pa.string())})
+        if codes.num_rows == 0:
+            return 0
+        
+        with self.transaction() as cursor, self.registered(codes, prefix="_securities") as view_name:
+            before = cursor.execute("SELECT COUNT(*) FROM security_master").fetchone()[0]
+            cursor.execute(f"""
+                INSERT INTO security_master (security_id, ts_code)
+                SELECT (SELECT COALESCE(MAX(security_id), -1) FROM security_master)
+                       + row_number() OVER (ORDER BY ts_code), ts_code
+                FROM (
+                    SELECT DISTINCT ts_code FROM {view_name}
+                    WHERE ts_code NOT IN (SELECT ts_code FROM security_master)
+                )
+            """)
+            added = cursor.execute("SELECT COUNT(*) FROM security_master").fetchone()[0] - before
+        
+        if added:
+            logger.info(f"证券主表新增 {added} 只证券")
+        return added
+    
+    def security_codes(self) -> list:
+        """按编号排列的 ts_code（下标即 security_id，用作 category 的类别）"""
+        if not self.table_exists("security_master"):
+            return []
+        rows = self._cursor().execute("SELECT ts_code FROM security_master ORDER BY security_id").fetchall()
+        return [row[0] for row in rows]
+    
+    @staticmethod
+    def _drop_duplicate_keys(df, pk_fields: list):
+        """同一批内主键重复时保留最后一条（支持 DataFrame 与 Arrow Table）"""
+        if isinstance(df, pa.Table):
+            indexed = df.append_column("__row", pa.array(np.arange(df.num_rows)))
+            last = indexed.group_by(pk_fields).aggregate([("__row", "max")])["__row_max"]
+            if len(last) == df.num_rows:
+                return df
+            return df.take(np.sort(last.to_numpy()))
+        
+        if df.duplicated(subset=pk_fields, keep='last').any():
+            return df.drop_duplicates(subset=pk_fields, keep='last')
+        return df
+    
+    @_writes
     def upsert_dataframe(self, df, table_name: str, pk_fields: list):
-        """Upsert操作（按主键去重覆盖）"""
-        # 先删除主键冲突的记录
-        pk_condition = " AND ".join([f"t.{field} = s.{field}" for field in pk_fields])
-        
-        self._conn.execute(f"""
-            DELETE FROM {table_name} AS t
-            WHERE EXISTS (
-                SELECT 1 FROM df AS s
-                WHERE {pk_condition}
-            )
-        """)
+        """Upsert操作（暂存临时表 + 单事务 + 按列名对齐写入，df 可为 Arrow Table）"""
+        if df is None or len(df) == 0:
+            return
+        
+        with self.transaction():
+            rows = self._upsert_in_transaction(df, table_name, pk_fields)
         
-        # 再插入新数据
-        self._conn.execute(f"INSERT INTO {table_name} SELECT * FROM df")
-        logger.info(f"已upsert {len(df)} 行到 {table_name}")
+        logger.info(f"已upsert {rows} 行到 {table_name}")
+    
+    @_writes
+    def upsert_tables(self, batches: list) -> dict:
+        """多表upsert（单事务，任一失败整体回滚）
+        
+        batches: [(table_name, df, pk_fields), ...]，表不存在时按注册表建类型化表
+        返回 {table_name: 写入行数}
+        """
+        written = {}
+        with self.transaction():
+            for table_name, df, pk_fields in batches:
+                if df is None or len(df) == 0:
+                    continue
+                self.create_typed_table(df, table_name, pk_fields)
+                written[table_name] = written.get(table_name, 0) + self._upsert_in_transaction(df, table_name, pk_fields)
+        
+        for table_name, rows in written.items():
+            logger.info(f"已upsert {rows} 行到 {table_name}")
+        return written
+    
+    def _upsert_in_transaction(self, df, table_name: str, pk_fields: list) -> int:
+        """在当前事务内执行upsert，返回写入行数
+        
+        1. 按主键去重后注册为视图，按目标列类型转换后物化到临时表（只含表中存在的列）
+        2. 表有真实主键：INSERT ... ON CONFLICT DO UPDATE（走ART索引，耗时与表大小无关）
+        3. 旧表无主键：DELETE ... USING 临时表 + INSERT（兼容 CREATE TABLE AS 建的表）
+        表有行哈希列时先在临时表中算出哈希，删掉与库内同主键行哈希相同（内容未变）的行，
+        返回值为实际写入（新增或变化）的行数。
+        """
+        # 只写入表中存在的列（字段投影后 df 可能只是表的子集）
+        table_cols = self.get_table_columns(table_name)
+        df_cols = df.column_names if isinstance(df, pa.Table) else list(df.columns)
+        columns = [col for col in df_cols if col in table_cols]
+        skipped = [col for col in df_cols if col not in table_cols]
+        if skipped:
+            logger.debug(f"{table_name} 忽略表中不存在的列: {skipped}")
+        
+        missing_pk = [field for field in pk_fields if field not in columns]
+        if missing_pk:
+            raise ValueError(f"{table_name} upsert 缺少主键列: {missing_pk}")
+        
+        # ON CONFLICT 不允许同一语句更新同一行两次
+        df = self._drop_duplicate_keys(df, pk_fields)
+        
+        stage_name = f"_upsert_stage_{uuid.uuid4().hex}"
+        col_list = ", ".join(f'"{col}"' for col in columns)
+        
+        table_pk = self.get_primary_key(table_name)
+        target_types = self.get_column_types(table_name)
+        
+        # 行哈希：按列名排序的非主键列（转换后的值）
+        key_fields = table_pk or pk_fields
+        hashed = sorted(col for col in columns if col not in key_fields)
+        row_hash = ROW_HASH_COLUMN in table_cols and ROW_HASH_COLUMN not in columns and bool(hashed)
+        hash_select = ""
+        if row_hash:
+            hash_args = ", ".join(f'"{col}"' for col in hashed)
+            hash_select = f', hash({hash_args}) AS "{ROW_HASH_COLUMN}"'
+        
+        with self.registered(df, prefix="_upsert_src") as view_name:
+            # 按目标表类型转换（YYYYMMDD 字符串 -> DATE 等），主键列不允许为空
+            source_types = self.get_column_types(view_name)
+            select_list = ", ".join(cast_expression(col, source_types[col], target_types[col]) for col in columns)
+            not_null = [f'"{col}" IS NOT NULL' for col in table_pk if col in columns]
+            where = f"WHERE {' AND '.join(not_null)}" if not_null else ""
+            self._cursor().execute(f"""
+                CREATE TEMP TABLE {stage_name} AS
+                SELECT *{hash_select} FROM (SELECT {select_list} FROM {view_name}) {where}
+            """)
+        
+        try:
+            rows = self._cursor().execute(f"SELECT COUNT(*) FROM {stage_name}").fetchone()[0]
+            if rows < len(df):
+                logger.warning(f"{table_name} 丢弃主键为空的行: {len(df) - rows}")
+            
+            if row_hash:
+                # 与库内同主键行哈希相同：内容未变，不写入
+                key_condition = " AND ".join(f't."{col}" = s."{col}"' for col in key_fields)
+                self._cursor().execute(f"""
+                    DELETE FROM {stage_name} AS s USING {table_name} AS t
+                    WHERE {key_condition} AND t."{ROW_HASH_COLUMN}" = s."{ROW_HASH_COLUMN}"
+                """)
+                changed = self._cursor().execute(f"SELECT COUNT(*) FROM {stage_name}").fetchone()[0]
+                if changed < rows:
+                    logger.info(f"{table_name} 行哈希未变化，跳过 {rows - changed} 行，写入 {changed} 行")
+                rows = changed
+                columns = columns + [ROW_HASH_COLUMN]
+                col_list = ", ".join(f'"{col}"' for col in columns)
+            if table_pk and set(table_pk) <= set(columns):
+                conflict_cols = ", ".join(f'"{col}"' for col in table_pk)
+                assignments = [f'"{col}" = EXCLUDED."{col}"' for col in columns if col not in table_pk]
+                if 'updated_at' in table_cols and 'updated_at' not in columns:
+                    assignments.append('"updated_at" = now()')
+                action = f"DO UPDATE SET {', '.join(assignments)}" if assignments else "DO NOTHING"
+                
+                self._cursor().execute(f"""
+                    INSERT INTO {table_name} ({col_list})
+                    SELECT {col_list} FROM {stage_name}
+                    ON CONFLICT ({conflict_cols}) {action}
+                """)
+            else:
+                pk_condition = " AND ".join(f't."{field}" = s."{field}"' for field in pk_fields)
+                self._cursor().execute(f"DELETE FROM {table_name} AS t USING {stage_name} AS s WHERE {pk_condition}")
+                self._cursor().execute(f"INSERT INTO {table_name} ({col_list}) SELECT {col_list} FROM {stage_name}")
+        finally:
+            self._cursor().execute(f"DROP TABLE IF EXISTS {stage_name}")
+        
+        return rows
+    
+    def table_exists(self, table_name: str) -> bool:
+        """表或视图是否存在"""
+        result = self._cursor().execute("""
+            SELECT 1 FROM information_schema.tables WHERE table_name = ?
+        """, (table_name,)).fetchone()
+        return result is not None
+    
+    @_writes
+    def rewrite_sorted(self, table_name: str, order_by: list) -> int:
+        """按 order_by 重写整张表（保留原表定义与主键），返回行数
+        
+        行按排序键连续存放后，每个行组的 min/max（zonemap）范围很窄，
+        按排序键过滤的查询可以跳过绝大多数行组。
+        """
+        ddl = self._cursor().execute("""
+            SELECT sql FROM duckdb_tables() WHERE table_name = ? AND NOT temporary
+        """, (table_name,)).fetchone()
+        if ddl is None:
+            raise ValueError(f"表不存在: {table_name}")
+        
+        order = ", ".join(f'"{col}"' for col in order_by)
+        temp_name = f"_rewrite_{uuid.uuid4().hex}"
+        
+        with self.transaction() as cursor:
+            cursor.execute(f"CREATE TEMP TABLE {temp_name} AS SELECT * FROM {table_name}")
+            cursor.execute(f"DROP TABLE {table_name}")
+            cursor.execute(ddl[0])
+            cursor.execute(f"INSERT INTO {table_name} SELECT * FROM {temp_name} ORDER BY {order}")
+            cursor.execute(f"DROP TABLE {temp_name}")
+        
+        # 回收旧行组占用的空间
+        self._cursor().execute("CHECKPOINT")
+        rows = self._cursor().execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
+        logger.info(f"{table_name} 已按 ({order}) 重写: {rows} 行")
+        return rows
+    
+    @_writes
+    def create_sorted_copy(self, source_table: str, target_table: str, order_by: list) -> int:
+        """按 order_by 生成整表副本（只读用途，不带主键），返回行数"""
+        order = ", ".join(f'"{col}"' for col in order_by)
+        self._cursor().execute(f"CREATE OR REPLACE TABLE {target_table} AS SELECT * FROM {source_table} ORDER BY {order}")
+        self._cursor().execute("CHECKPOINT")
+        rows = self._cursor().execute(f"SELECT COUNT(*) FROM {target_table}").fetchone()[0]
+        logger.info(f"{target_table} 已由 {source_table} 按 ({order}) 生成: {rows} 行")
+        return rows
     
     def close(self):
-        """关闭连接"""
+        """关闭连接（各线程游标随根连接一起失效）"""
         if self._conn:
             self._conn.close()
             self._conn = None
+            self._generation += 1
             logger.info("数据库连接已关闭")
 
 
@@ -0,0 +1,110 @@
+"""Tushare调用错误分类（决定是否重试、是否降速、是否熔断）"""
+import asyncio
+import socket
+from typing import Optional
+
+
+class TushareAPIError(Exception):
+    """Tushare调用错误基类"""
+    
+    category = "unknown"
+    retryable = True
+    
+    def __init__(self, message: str, api_name: str = None):
+        super().__init__(message)
+        self.api_name = api_name
+
+
+class ThrottleError(TushareAPIError):
+    """服务端限频（需降速后重试）"""
+    
+    category = "throttle"
+    retryable = True
+
+
+class PermissionDeniedError(TushareAPIError):
+    """无权限 / 积分不足 / token无效（重试无意义）"""
+    
+    category = "permission"
+    retryable = False
+
+
+class BadRequestError(TushareAPIError):
+    """参数错误 / 接口不存在（重试无意义）"""
+    
+    category = "bad_request"
+    retryable = False
+
+
+class TransientError(TushareAPIError):
+    """网络抖动 / 超时 / 服务端5xx（可重试）"""
+    
+    category = "transient"
+    retryable = True
+
+
+class CircuitOpenError(TushareAPIError):
+    """接口熔断中（冷却期内直接拒绝，不消耗配额）"""
+    
+    category = "circuit_open"
+    retryable = False
+
+
+# 错误消息关键字（Tushare服务端返回的中文提示）
+THROTTLE_KEYWORDS = ("最多访问", "访问频率", "频繁", "rate limit", "too many requests")
+PERMISSION_KEYWORDS = ("没有权限", "权限不足", "没有访问", "积分不足", "token不对", "token无效", "请设置token")
+BAD_REQUEST_KEYWORDS = ("参数", "必填", "接口不存在", "不支持", "格式错误", "invalid")
+TRANSIENT_KEYWORDS = ("timed out", "timeout", "connection", "502", "503", "504", "系统繁忙", "服务器")
+
+# 网络层异常类名（requests / urllib3 / aiohttp，避免直接依赖这些库）
+TRANSIENT_EXCEPTION_NAMES = {
+    "ConnectionError", "Timeout", "ReadTimeout", "ConnectTimeout",
+    "ChunkedEncodingError", "ProtocolError", "ClientError",
+    "ClientConnectionError", "ServerDisconnectedError", "ClientPayloadError",
+}
+
+
+def _http_status(exc: BaseException) -> Optional[int]:
+    """提取HTTP状态码（aiohttp.ClientResponseError / requests.HTTPError）"""
+    status = getattr(exc, "status", None)
+    if status is None:
+        response = getattr(exc, "response", None)
+        status = getattr(response, "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def classify_error(exc: BaseException, api_name: str = None) -> TushareAPIError:
+    """把任意异常归类为 TushareAPIError 子类（保留原始消息）"""
+    if isinstance(exc, TushareAPIError):
+        return exc
+    
+    message = str(exc) or exc.__class__.__name__
+    lowered = message.lower()
+    
+    status = _http_status(exc)
+    if status == 429:
+        return ThrottleError(message, api_name)
+    if status in (401, 403):
+        return PermissionDeniedError(message, api_name)
+    if status is not None and status >= 500:
+        return TransientError(message, api_name)
+    if status is not None and status >= 400:
+        return BadRequestError(message, api_name)
+    
+    if any(k in lowered for k in THROTTLE_KEYWORDS):
+        return ThrottleError(message, api_name)
+    if any(k in lowered for k in PERMISSION_KEYWORDS):
+        return PermissionDeniedError(message, api_name)
+    
+    exc_names = {cls.__name__ for cls in type(exc).__mro__}
+    if (isinstance(exc, (asyncio.TimeoutError, socket.timeout, ConnectionError))
+            or exc_names & TRANSIENT_EXCEPTION_NAMES):
+        return TransientError(message, api_name)
+    
+    if isinstance(exc, (ValueError, TypeError)) or any(k in lowered for k in BAD_REQUEST_KEYWORDS):
+        return BadRequestError(message, api_name)
+    if any(k in lowered for k in TRANSIENT_KEYWORDS):
+        return TransientError(message, api_name)
+    
+    # 无法识别的错误：保守地视为可重试
+    return TushareAPIError(message, api_name)
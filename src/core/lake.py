@@ -0,0 +1,239 @@
+"""原始层Parquet湖：按交易日拉取的 raw_* 表按日期分区存放在 data/raw，库内以视图暴露
+
+注册表中 increment_strategy 为 by_trade_date 的接口都存入湖中，分区列为该接口的 date_param
+（默认 trade_date）。目录结构（hive分区，DuckDB 按分区列过滤时只读命中的文件）：
+    data/raw/daily/year=2024/month=01/trade_date=20240102/part-0.parquet
+
+目录中的分区值与文件内的日期列都存 YYYYMMDD，视图中转为 DATE（日期列的判定同类型化原始表：
+注册表 columns 声明为 DATE 或列名以 _date 结尾），与库内类型化原始表一致。
+重建某一天只重写该日的一个小文件；历史分区不再变动，zstd 压缩率高。
+
+同一分区的读改写在进程内外都串行：线程锁之外另加分区目录下的文件锁，多个 ETL 进程同时写同一天不会互相覆盖。
+"""
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from loguru import logger
+from config import RAW_STORAGE, PARQUET_COMPRESSION, DATA_RAW_PATH, load_endpoint_registry
+from .schema import infer_type, registry_columns, table_for_api
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# 存入湖中的接口规划方式（同 src.etl.planner.BY_TRADE_DATE）
+LAKE_STRATEGY = "by_trade_date"
+
+# 默认分区列
+PARTITION_COLUMN = "trade_date"
+
+
+def _lake_tables() -> Dict[str, Dict[str, str]]:
+    """注册表中按交易日拉取的接口：原始表名 -> {"directory": 接口目录, "partition": 分区列}"""
+    tables = {}
+    for api_name, config in load_endpoint_registry().items():
+        config = config or {}
+        if config.get("increment_strategy") == LAKE_STRATEGY:
+            tables[table_for_api(api_name)] = {
+                "directory": api_name,
+                "partition": config.get("date_param", PARTITION_COLUMN),
+            }
+    return tables
+
+
+# 存入湖中的原始表 -> 接口目录与分区列
+LAKE_TABLES = _lake_tables()
+
+# 分区目录下的锁文件名（不匹配 *.parquet，不会被视图读到）
+LOCK_FILE = ".lock"
+
+
+@contextmanager
+def _file_lock(path: Path):
+    """跨进程排他锁（阻塞等待，进程退出时由系统释放）"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a+b") as handle:
+        if fcntl is not None:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+        else:
+            handle.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+            else:
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class ParquetLake:
+    """按交易日分区的 Parquet 存储"""
+    
+    def __init__(self, root: Path = DATA_RAW_PATH, compression: str = PARQUET_COMPRESSION,
+                 enabled: bool = RAW_STORAGE == "parquet"):
+        self.root = Path(root)
+        self.compression = compression
+        self.enabled = enabled
+        
+        self._views: set = set()
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+    
+    def manages(self, table_name: str) -> bool:
+        """该表是否存放在湖中"""
+        return self.enabled and table_name in LAKE_TABLES
+    
+    def table_path(self, table_name: str) -> Path:
+        return self.root / LAKE_TABLES[table_name]["directory"]
+    
+    @staticmethod
+    def partition_column(table_name: str) -> str:
+        return LAKE_TABLES[table_name]["partition"]
+    
+    def partition_path(self, table_name: str, value: str) -> Path:
+        return (self.table_path(table_name) / f"year={value[:4]}" / f"month={value[4:6]}"
+                / f"{self.partition_column(table_name)}={value}")
+    
+    def _lock_for(self, key: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(key, threading.Lock())
+    
+    @staticmethod
+    def _partition_value(value) -> str:
+        """分区值统一为 YYYYMMDD"""
+        return str(value).replace("-", "")[:8]
+    
+    @staticmethod
+    def date_columns(table_name: str, columns: List[str]) -> List[str]:
+        """columns 中的日期列（注册表声明为 DATE，或按列名规则推断为 DATE）"""
+        declared = {col for col, col_type in registry_columns(table_name).items() if str(col_type).upper() == "DATE"}
+        return [col for col in columns if col in declared or infer_type(col, "VARCHAR") == "DATE"]
+    
+    def write(self, table_name: str, df, pk_fields: List[str] = None) -> int:
+        """按交易日分区写入（已有分区按主键合并，新数据覆盖旧数据），返回写入行数"""
+        from .database import Database
+        
+        if df is None or len(df) == 0:
+            return 0
+        
+        table = df if isinstance(df, pa.Table) else pa.Table.from_pandas(df, preserve_index=False)
+        column = self.partition_column(table_name)
+        if column not in table.column_names:
+            raise ValueError(f"{table_name} 缺少分区列 {column}")
+        # 文件内的日期列统一存 YYYYMMDD 字符串（分区列与目录一致，视图中再转为 DATE）
+        for name in self.date_columns(table_name, table.column_names):
+            if not pa.types.is_string(table.schema.field(name).type):
+                values = [None if v is None else self._partition_value(v) for v in table[name].to_pylist()]
+                table = table.set_column(table.schema.get_field_index(name), name, pa.array(values, pa.string()))
+        
+        for value in pc.unique(table[column]).to_pylist():
+            part = table.filter(pc.equal(table[column], value))
+            directory = self.partition_path(table_name, value)
+            path = directory / "part-0.parquet"
+            
+            with self._lock_for(str(directory)), _file_lock(directory / LOCK_FILE):
+                if pk_fields and path.exists():
+                    existing = pq.read_table(path)
+                    part = pa.concat_tables([existing, part], promote_options="permissive")
+                    part = Database._drop_duplicate_keys(part, pk_fields)
+                
+                directory.mkdir(parents=True, exist_ok=True)
+                tmp_path = directory / f"part-0.parquet.{os.getpid()}.{threading.get_ident()}.tmp"
+                pq.write_table(part, tmp_path, compression=self.compression)
+                os.replace(tmp_path, path)
+        
+        self.ensure_view(table_name)
+        logger.debug(f"{table_name} 已写入湖: {table.num_rows} 行")
+        return table.num_rows
+    
+    def source_sql(self, table_name: str) -> str:
+        """读取该表全部分区文件的 read_parquet 表达式（分区列 year/month 为整数，日期分区列为字符串）"""
+        pattern = (self.table_path(table_name) / "*" / "*" / "*" / "*.parquet").as_posix()
+        column = self.partition_column(table_name)
+        return f"""read_parquet(
+                '{pattern}',
+                hive_partitioning = true,
+                hive_types = {{'year': INTEGER, 'month': INTEGER, '{column}': VARCHAR}},
+                union_by_name = true
+            )"""
+    
+    def view_sql(self, table_name: str, column_types: Dict[str, str]) -> str:
+        """读取整张表的视图定义（分区列 year/month 只用于裁剪，不暴露；日期列转为 DATE）
+        
+        column_types 为 source_sql 读出的列类型。DuckDB 对只引用分区列的过滤条件逐个目录求值，
+        经 strptime 转换后按日期过滤仍能裁剪分区。其它日期列用 try_strptime 转换：空值与无法解析的值为 NULL，
+        兼容迁移前以 DATE 写入、被合并为 YYYY-MM-DD 字符串的旧文件。
+        """
+        column = self.partition_column(table_name)
+        replaces = [f"CAST(strptime({column}, '%Y%m%d') AS DATE) AS {column}"]
+        for name in self.date_columns(table_name, list(column_types)):
+            if name == column or column_types[name].upper() == "DATE":
+                continue
+            replaces.append(f"CAST(try_strptime(CAST(\"{name}\" AS VARCHAR), ['%Y%m%d', '%Y-%m-%d']) AS DATE) AS \"{name}\"")
+        return f"""
+            CREATE OR REPLACE VIEW {table_name} AS
+            SELECT * EXCLUDE (year, month) REPLACE ({", ".join(replaces)})
+            FROM {self.source_sql(table_name)}
+        """
+    
+    def ensure_view(self, table_name: str):
+        """在库内创建（或替换）该表的视图；库内已有同名实体表时先迁移进湖"""
+        from .database import db
+        
+        if table_name in self._views:
+            return
+        
+        with self._lock_for(f"view:{table_name}"):
+            if table_name in self._views:
+                return
+            
+            existing = db.query("""
+                SELECT table_type FROM information_schema.tables WHERE table_name = ?
+            """, (table_name,))
+            if len(existing) > 0 and existing.iloc[0]["table_type"] == "BASE TABLE":
+                self.migrate_table(table_name)
+            
+            if any(self.table_path(table_name).rglob("*.parquet")):
+                db.create_lake_view(table_name)
+                self._views.add(table_name)
+    
+    def migrate_table(self, table_name: str):
+        """把库内的原始表整体导出到湖中并删除原表"""
+        from .database import db
+        
+        logger.info(f"迁移 {table_name} 到 Parquet 湖: {self.table_path(table_name)}")
+        table = db.get_connection().execute(f"SELECT * FROM {table_name}").arrow()
+        # 新版 DuckDB 的 .arrow() 返回 RecordBatchReader
+        if isinstance(table, pa.RecordBatchReader):
+            table = table.read_all()
+        if table.num_rows > 0:
+            self._views.add(table_name)  # 避免 write() 递归调用 ensure_view
+            try:
+                self.write(table_name, table)
+            finally:
+                self._views.discard(table_name)
+        db.drop_table(table_name)
+        logger.info(f"{table_name} 已迁移: {table.num_rows} 行")
+    
+    def refresh_views(self):
+        """为湖中已有的全部表建视图（新进程启动时调用）"""
+        for table_name in LAKE_TABLES:
+            self.ensure_view(table_name)
+
+
+# 全局单例
+raw_lake = ParquetLake()
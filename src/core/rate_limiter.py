@@ -1,79 +1,435 @@
 """限频器：防止触碰Tushare API限制"""
+import asyncio
+import hashlib
+import math
+import os
+import sqlite3
 import time
-from collections import deque
-from typing import Optional
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
 from loguru import logger
-from config import RATE_LIMIT_PER_MINUTE, RATE_LIMIT_DAILY
+from config import (
+    TUSHARE_TOKEN,
+    load_endpoint_registry,
+    RATE_LIMIT_PER_MINUTE,
+    RATE_LIMIT_DAILY,
+    RATE_LIMIT_BACKEND,
+    RATE_LIMIT_STATE_PATH,
+    THROTTLE_PENALTY_SECONDS,
+)
+
+
+def _gcra_reserve(tat: Dict[str, float], buckets: List[Tuple[str, float, int]],
+                  now: float, usage: Dict[str, Dict[int, int]] = None
+                  ) -> Tuple[float, Optional[str], Dict[str, float]]:
+    """GCRA判定：返回 (等待秒数, 阻塞的桶, 放行时需写回的TAT)
+    
+    GCRA 允许先突发满配额再匀速，任意一个周期内最多可放行约两倍配额；
+    因此另按已登记的实际用量做滑动窗口判定，保证任意一个周期内不超过配额。
+    """
+    usage = usage or {}
+    wait = 0.0
+    blocking = None
+    for name, period, limit in buckets:
+        interval = period / limit
+        allow_at = max(tat.get(name, now), now) - (period - interval)
+        bucket_wait = max(allow_at - now, _window_wait(usage.get(name, {}), period, limit, now))
+        if bucket_wait > wait:
+            wait = bucket_wait
+            blocking = name
+    
+    if blocking is not None:
+        return wait, blocking, {}
+    
+    updates = {
+        name: max(tat.get(name, now), now) + period / limit
+        for name, period, limit in buckets
+    }
+    return 0.0, None, updates
+
+
+def _slot_size(period: float) -> float:
+    """用量计数的时间片（秒）：每个周期最多约 1440 片，分钟桶 1 秒、日桶 60 秒"""
+    return max(1.0, period / 1440)
+
+
+def _window_start(period: float, now: float) -> int:
+    """周期窗口内最早的时间片序号（含跨越窗口起点的那一片，宁多计不少计）"""
+    size = _slot_size(period)
+    return int((now - period) // size)
+
+
+def _window_wait(slots: Dict[int, int], period: float, limit: int, now: float) -> float:
+    """按实际用量判定：窗口内已满配额时，返回足够多的旧时间片滑出窗口所需的秒数"""
+    oldest = _window_start(period, now)
+    active = sorted((slot, calls) for slot, calls in slots.items() if slot >= oldest)
+    excess = sum(calls for _, calls in active) - limit + 1
+    if excess <= 0:
+        return 0.0
+    
+    size = _slot_size(period)
+    for slot, calls in active:
+        excess -= calls
+        if excess <= 0:
+            # 该片序号小于窗口起点时即滑出窗口
+            return max(0.0, (slot + 1) * size + period - now)
+    return period
+
+
+class LocalStateBackend:
+    """进程内限频状态（默认）"""
+    
+    name = "local"
+    
+    def __init__(self):
+        self._tat: Dict[str, float] = {}
+        # 实际用量：桶名 -> {时间片序号: 调用次数}
+        self._usage: Dict[str, Dict[int, int]] = {}
+        self._lock = threading.Lock()
+        
+        # fork出的子进程重建锁，避免继承父进程中被占用的锁
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reset_lock)
+    
+    def _reset_lock(self):
+        """重建锁（fork后在子进程中调用）"""
+        self._lock = threading.Lock()
+    
+    def reserve(self, buckets: List[Tuple[str, float, int]], now: float) -> Tuple[float, Optional[str]]:
+        """原子地判定并登记一次调用"""
+        with self._lock:
+            wait, blocking, updates = _gcra_reserve(self._tat, buckets, now, self._usage)
+            self._tat.update(updates)
+            if updates:
+                for name, period, _ in buckets:
+                    slots = self._usage.setdefault(name, {})
+                    slot = int(now // _slot_size(period))
+                    slots[slot] = slots.get(slot, 0) + 1
+                    oldest = _window_start(period, now)
+                    for expired in [key for key in slots if key < oldest]:
+                        del slots[expired]
+        return wait, blocking
+    
+    def seed(self, name: str, tat: float):
+        """把桶的 TAT 推后到不早于 tat（只推后不提前）"""
+        with self._lock:
+            self._tat[name] = max(self._tat.get(name, tat), tat)
+    
+    def snapshot(self, names: List[str]) -> Dict[str, float]:
+        """读取桶状态"""
+        with self._lock:
+            return {name: self._tat[name] for name in names if name in self._tat}
+    
+    def usage(self, buckets: List[Tuple[str, float]], now: float) -> Dict[str, int]:
+        """各桶最近一个周期内的实际调用次数"""
+        with self._lock:
+            return {
+                name: sum(calls for slot, calls in self._usage.get(name, {}).items()
+                          if slot >= _window_start(period, now))
+                for name, period in buckets
+            }
+
+
+class SqliteStateBackend:
+    """跨进程限频状态（本机SQLite旁路库，同一token的所有进程共享配额）
+    
+    BEGIN IMMEDIATE 取得写锁后再读改写，保证多进程下判定与登记是原子的。
+    """
+    
+    name = "sqlite"
+    
+    def __init__(self, path: Path, namespace: str = ""):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.namespace = namespace
+        self._local = threading.local()
+        
+        conn = self._connect()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS rate_limit_state (
+                bucket TEXT PRIMARY KEY,
+                tat REAL NOT NULL
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS rate_limit_usage (
+                bucket TEXT NOT NULL,
+                slot INTEGER NOT NULL,
+                calls INTEGER NOT NULL,
+                PRIMARY KEY (bucket, slot)
+            )
+        """)
+    
+    def _connect(self) -> sqlite3.Connection:
+        """每个线程（及fork后的每个进程）使用独立连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+    
+    def _key(self, name: str) -> str:
+        return f"{self.namespace}:{name}"
+    
+    def reserve(self, buckets: List[Tuple[str, float, int]], now: float) -> Tuple[float, Optional[str]]:
+        """原子地判定并登记一次调用"""
+        conn = self._connect()
+        keys = [self._key(name) for name, _, _ in buckets]
+        placeholders = ",".join("?" for _ in keys)
+        
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                f"SELECT bucket, tat FROM rate_limit_state WHERE bucket IN ({placeholders})", keys
+            ).fetchall()
+            stored = dict(rows)
+            tat = {name: stored[self._key(name)] for name, _, _ in buckets if self._key(name) in stored}
+            
+            usage: Dict[str, Dict[int, int]] = {}
+            names = {self._key(name): name for name, _, _ in buckets}
+            for key, slot, calls in conn.execute(
+                f"SELECT bucket, slot, calls FROM rate_limit_usage WHERE bucket IN ({placeholders})", keys
+            ):
+                usage.setdefault(names[key], {})[slot] = calls
+            
+            wait, blocking, updates = _gcra_reserve(tat, buckets, now, usage)
+            if updates:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO rate_limit_state (bucket, tat) VALUES (?, ?)",
+                    [(self._key(name), value) for name, value in updates.items()],
+                )
+                # 实际用量与 TAT 在同一事务内登记
+                conn.executemany("""
+                    INSERT INTO rate_limit_usage (bucket, slot, calls) VALUES (?, ?, 1)
+                    ON CONFLICT (bucket, slot) DO UPDATE SET calls = calls + 1
+                """, [(self._key(name), int(now // _slot_size(period))) for name, period, _ in buckets])
+                conn.executemany(
+                    "DELETE FROM rate_limit_usage WHERE bucket = ? AND slot < ?",
+                    [(self._key(name), _window_start(period, now)) for name, period, _ in buckets],
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return wait, blocking
+    
+    def seed(self, name: str, tat: float):
+        """把桶的 TAT 推后到不早于 tat（只推后不提前）"""
+        self._connect().execute("""
+            INSERT INTO rate_limit_state (bucket, tat) VALUES (?, ?)
+            ON CONFLICT (bucket) DO UPDATE SET tat = MAX(tat, excluded.tat)
+        """, (self._key(name), tat))
+    
+    def snapshot(self, names: List[str]) -> Dict[str, float]:
+        """读取桶状态（全局视角）"""
+        conn = self._connect()
+        keys = [self._key(name) for name in names]
+        placeholders = ",".join("?" for _ in keys)
+        rows = conn.execute(
+            f"SELECT bucket, tat FROM rate_limit_state WHERE bucket IN ({placeholders})", keys
+        ).fetchall()
+        stored = dict(rows)
+        return {name: stored[self._key(name)] for name in names if self._key(name) in stored}
+    
+    def usage(self, buckets: List[Tuple[str, float]], now: float) -> Dict[str, int]:
+        """各桶最近一个周期内的实际调用次数（本机所有进程合计）"""
+        conn = self._connect()
+        result = {}
+        for name, period in buckets:
+            row = conn.execute(
+                "SELECT COALESCE(SUM(calls), 0) FROM rate_limit_usage WHERE bucket = ? AND slot >= ?",
+                (self._key(name), _window_start(period, now)),
+            ).fetchone()
+            result[name] = int(row[0])
+        return result
+
+
+def create_state_backend(backend: str = RATE_LIMIT_BACKEND):
+    """按配置创建限频状态后端"""
+    if backend == "local":
+        return LocalStateBackend()
+    if backend == "sqlite":
+        # 按token区分命名空间：不同token的配额互不影响
+        namespace = hashlib.sha1(TUSHARE_TOKEN.encode("utf-8")).hexdigest()[:12]
+        return SqliteStateBackend(RATE_LIMIT_STATE_PATH, namespace=namespace)
+    raise ValueError(f"未知限频后端: {backend}（可选 local / sqlite）")
 
 
 class RateLimiter:
-    """速率限制器（基于滑动窗口）"""
+    """速率限制器（GCRA令牌桶：允许突发至配额上限，之后按配额精确匀速）
+    
+    每个桶只保存一个“理论到达时间”(TAT)：
+    - 发放间隔 T = 周期 / 配额
+    - 容忍度 tau = 周期 - T（即一次最多突发 配额 次调用）
+    - 当 now >= TAT - tau 时放行，并将 TAT 推进 T
+    
+    单靠 GCRA 时突发之后紧接着匀速放行，一个周期内可放行近两倍配额；
+    因此放行前还须满足滑动窗口：最近一个周期内的实际调用次数低于配额。
+    
+    TAT 存放在可替换的状态后端中：local 为进程内，sqlite 为本机多进程共享。
+    
+    分层限频：全局桶之外，注册表中配置了 rate_limit_per_minute / daily_quota 的接口
+    另有独立的接口桶，一次调用须同时满足全局桶与接口桶。
+    
+    服务端限频反馈：report_throttle() 临时降低该接口的分钟配额（每次减半，最低10%），
+    并把接口分钟桶置为已用满，之后按降低后的配额匀速放行；
+    THROTTLE_PENALTY_SECONDS 内无新的限频错误则恢复。
+    """
     
     def __init__(self, calls_per_minute: int = RATE_LIMIT_PER_MINUTE, 
-                 calls_per_day: int = RATE_LIMIT_DAILY):
+                 calls_per_day: int = RATE_LIMIT_DAILY, backend=None,
+                 registry: dict = None):
         self.calls_per_minute = calls_per_minute
         self.calls_per_day = calls_per_day
         
-        # 分钟窗口（60秒）
-        self.minute_window = deque()
+        # 分钟桶（60秒）与日桶（24小时）
         self.minute_duration = 60
-        
-        # 日窗口（24小时）
-        self.day_window = deque()
         self.day_duration = 86400
         
-        logger.info(f"限频器初始化: {calls_per_minute}次/分钟, {calls_per_day}次/天")
+        # 桶状态后端
+        self.backend = backend or create_state_backend()
+        
+        # 接口级配额：api_name -> (每分钟, 每天)，None 表示不单独限制
+        self.endpoint_limits: Dict[str, Tuple[Optional[int], Optional[int]]] = {}
+        self.configure_endpoints(load_endpoint_registry() if registry is None else registry)
+        
+        # 限频反馈：api_name -> (降速系数, 截止时间)
+        self._penalties: Dict[str, Tuple[float, float]] = {}
+        self._penalty_lock = threading.Lock()
+        
+        logger.info(f"限频器初始化: {calls_per_minute}次/分钟, {calls_per_day}次/天, 后端: {self.backend.name}")
+    
+    def configure_endpoints(self, registry: dict):
+        """从接口注册表读取 rate_limit_per_minute / daily_quota"""
+        for api_name, config in registry.items():
+            per_minute = config.get('rate_limit_per_minute')
+            per_day = config.get('daily_quota')
+            if per_minute or per_day:
+                self.set_endpoint_limits(api_name, per_minute, per_day)
+    
+    def set_endpoint_limits(self, api_name: str, calls_per_minute: int = None,
+                            calls_per_day: int = None):
+        """设置单个接口的配额"""
+        self.endpoint_limits[api_name] = (calls_per_minute, calls_per_day)
+        logger.debug(f"接口限频: {api_name} {calls_per_minute}次/分钟, {calls_per_day}次/天")
     
-    def _clean_old_calls(self, window: deque, duration: int):
-        """清理过期的调用记录"""
+    def report_throttle(self, api_name: str):
+        """收到服务端限频错误：临时减半该接口的分钟配额"""
         now = time.time()
-        while window and now - window[0] > duration:
-            window.popleft()
+        with self._penalty_lock:
+            factor, until = self._penalties.get(api_name, (1.0, 0.0))
+            if until <= now:
+                factor = 1.0
+            factor = max(0.1, factor * 0.5)
+            self._penalties[api_name] = (factor, now + THROTTLE_PENALTY_SECONDS)
+        # 接口桶视为已用满：降速后按新配额匀速放行，不会先突发一批（未单独配置配额的接口此前没有桶状态）
+        self.backend.seed(f"{api_name}:minute", now + self.minute_duration)
+        logger.warning(f"接口 {api_name} 触发服务端限频，吞吐降至 {factor:.0%}，持续 {THROTTLE_PENALTY_SECONDS:.0f} 秒")
+    
+    def _penalty_factor(self, api_name: str, now: float) -> float:
+        """当前降速系数（1.0 表示未降速）"""
+        with self._penalty_lock:
+            factor, until = self._penalties.get(api_name, (1.0, 0.0))
+            if until <= now:
+                self._penalties.pop(api_name, None)
+                return 1.0
+            return factor
+    
+    def _buckets(self, api_name: str = None) -> List[Tuple[str, float, int]]:
+        """返回需同时满足的桶：(名称, 周期秒数, 配额)"""
+        buckets = [
+            ("minute", self.minute_duration, self.calls_per_minute),
+            ("day", self.day_duration, self.calls_per_day),
+        ]
+        
+        per_minute, per_day = self.endpoint_limits.get(api_name, (None, None))
+        
+        factor = self._penalty_factor(api_name, time.time()) if api_name else 1.0
+        if factor < 1.0:
+            per_minute = max(1, int((per_minute or self.calls_per_minute) * factor))
+        
+        if per_minute:
+            buckets.append((f"{api_name}:minute", self.minute_duration, per_minute))
+        if per_day:
+            buckets.append((f"{api_name}:day", self.day_duration, per_day))
+        
+        return buckets
     
-    def acquire(self):
-        """获取调用许可（阻塞等待）"""
+    def _reserve(self, api_name: str = None) -> float:
+        """尝试登记一次调用：成功返回0，否则返回需等待的秒数"""
+        wait, blocking = self.backend.reserve(self._buckets(api_name), time.time())
+        
+        if blocking is not None and blocking.endswith("day"):
+            logger.error(f"达到日限制({blocking})，等待 {wait:.1f} 秒")
+        elif blocking is not None and wait >= 1:
+            logger.warning(f"达到分钟限制({blocking})，等待 {wait:.1f} 秒")
+        return wait
+    
+    def acquire(self, api_name: str = None):
+        """获取调用许可（阻塞等待，线程安全）"""
         while True:
-            now = time.time()
-            
-            # 清理过期记录
-            self._clean_old_calls(self.minute_window, self.minute_duration)
-            self._clean_old_calls(self.day_window, self.day_duration)
-            
-            # 检查分钟限制
-            if len(self.minute_window) >= self.calls_per_minute:
-                sleep_time = self.minute_duration - (now - self.minute_window[0]) + 0.1
-                logger.warning(f"达到分钟限制，等待 {sleep_time:.1f} 秒")
-                time.sleep(sleep_time)
-                continue
-            
-            # 检查日限制
-            if len(self.day_window) >= self.calls_per_day:
-                sleep_time = self.day_duration - (now - self.day_window[0]) + 1
-                logger.error(f"达到日限制，等待 {sleep_time:.1f} 秒")
-                time.sleep(sleep_time)
-                continue
-            
-            # 记录本次调用
-            self.minute_window.append(now)
-            self.day_window.append(now)
-            
-            # 添加小延迟防止瞬间突发
-            time.sleep(0.12)  # 500次/分钟 = 120ms间隔
-            break
+            wait = self._reserve(api_name)
+            if wait <= 0:
+                return
+            time.sleep(wait)
     
-    def get_stats(self) -> dict:
-        """获取限频统计"""
+    async def acquire_async(self, api_name: str = None):
+        """获取调用许可（异步等待，不阻塞事件循环）"""
+        while True:
+            wait = self._reserve(api_name)
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+    
+    def estimate_seconds(self, calls: int, api_name: str = None) -> float:
+        """按当前剩余配额估算 calls 次调用至少需要的秒数（先用完突发余量，之后按发放间隔匀速）"""
         now = time.time()
-        self._clean_old_calls(self.minute_window, self.minute_duration)
-        self._clean_old_calls(self.day_window, self.day_duration)
+        buckets = self._buckets(api_name)
+        tat = self.backend.snapshot([name for name, _, _ in buckets])
+        
+        seconds = 0.0
+        for name, period, limit in buckets:
+            available = limit - self._used(tat, name, period, limit, now)
+            seconds = max(seconds, max(0, calls - available) * period / limit)
+        return seconds
+    
+    @staticmethod
+    def _used(tat: Dict[str, float], name: str, period: float, limit: int, now: float) -> int:
+        """根据TAT估算已占用的突发余量（只用于估算等待时间，实际调用次数见 usage）"""
+        interval = period / limit
+        backlog = max(0.0, tat.get(name, now) - now)
+        return min(limit, math.ceil(backlog / interval - 1e-9))
+    
+    def get_stats(self) -> dict:
+        """获取限频统计（最近60秒/24小时的实际调用次数；sqlite后端下为本机所有进程的合计用量）"""
+        buckets = [("minute", self.minute_duration), ("day", self.day_duration)]
+        for api_name in self.endpoint_limits:
+            buckets.extend([(f"{api_name}:minute", self.minute_duration), (f"{api_name}:day", self.day_duration)])
+        used = self.backend.usage(buckets, time.time())
+        
+        calls_minute = used["minute"]
+        calls_day = used["day"]
+        
+        endpoints = {}
+        for api_name, (per_minute, per_day) in self.endpoint_limits.items():
+            endpoints[api_name] = {
+                "calls_last_minute": used[f"{api_name}:minute"] if per_minute else None,
+                "calls_today": used[f"{api_name}:day"] if per_day else None,
+                "minute_limit": per_minute,
+                "day_limit": per_day,
+            }
         
         return {
-            "calls_last_minute": len(self.minute_window),
-            "calls_today": len(self.day_window),
+            "calls_last_minute": calls_minute,
+            "calls_today": calls_day,
             "minute_limit": self.calls_per_minute,
             "day_limit": self.calls_per_day,
-            "minute_remaining": self.calls_per_minute - len(self.minute_window),
-            "day_remaining": self.calls_per_day - len(self.day_window),
+            "minute_remaining": max(0, self.calls_per_minute - calls_minute),
+            "day_remaining": max(0, self.calls_per_day - calls_day),
+            "backend": self.backend.name,
+            "endpoints": endpoints,
         }
 
 
@@ -0,0 +1,96 @@
+"""调用韧性：抖动退避与接口级熔断"""
+import random
+import threading
+import time
+from typing import Dict
+from loguru import logger
+from config import (
+    RETRY_BASE_DELAY,
+    RETRY_MAX_DELAY,
+    RETRY_THROTTLE_DELAY,
+    CIRCUIT_FAILURE_THRESHOLD,
+    CIRCUIT_RESET_SECONDS,
+)
+from .errors import TushareAPIError
+
+
+def backoff_delay(attempt: int, error: TushareAPIError) -> float:
+    """计算第 attempt 次失败后的等待秒数（指数退避 + 全抖动）
+    
+    限频错误以更长的基准等待，给服务端窗口留出恢复时间。
+    """
+    base = RETRY_THROTTLE_DELAY if error.category == "throttle" else RETRY_BASE_DELAY
+    ceiling = min(RETRY_MAX_DELAY, base * (2 ** (attempt - 1)))
+    return random.uniform(ceiling / 2, ceiling)
+
+
+class CircuitBreaker:
+    """单接口熔断器（closed -> open -> half_open -> closed）
+    
+    连续 failure_threshold 次可重试类错误耗尽重试后打开，reset_seconds 内直接拒绝；
+    冷却后放行一次试探调用，成功则关闭，失败则重新打开。
+    """
+    
+    def __init__(self, api_name: str, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+                 reset_seconds: float = CIRCUIT_RESET_SECONDS):
+        self.api_name = api_name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+    
+    def allow(self) -> bool:
+        """当前是否允许调用"""
+        with self._lock:
+            if self.state == "open":
+                if time.time() - self.opened_at < self.reset_seconds:
+                    return False
+                self.state = "half_open"
+                logger.info(f"接口 {self.api_name} 熔断冷却结束，放行试探调用")
+            return True
+    
+    def record_success(self):
+        """记录成功调用"""
+        with self._lock:
+            if self.state != "closed":
+                logger.info(f"接口 {self.api_name} 熔断恢复")
+            self.state = "closed"
+            self.failures = 0
+    
+    def record_failure(self, error: TushareAPIError):
+        """记录失败调用（只统计网络/服务端类错误）"""
+        if not error.retryable:
+            return
+        
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                self.state = "open"
+                self.opened_at = time.time()
+                logger.error(f"接口 {self.api_name} 连续失败 {self.failures} 次，熔断 {self.reset_seconds:.0f} 秒")
+
+
+class CircuitBreakerRegistry:
+    """按接口名维护熔断器"""
+    
+    def __init__(self):
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+    
+    def get(self, api_name: str) -> CircuitBreaker:
+        with self._lock:
+            if api_name not in self._breakers:
+                self._breakers[api_name] = CircuitBreaker(api_name)
+            return self._breakers[api_name]
+    
+    def get_states(self) -> Dict[str, str]:
+        """各接口熔断状态"""
+        with self._lock:
+            return {name: breaker.state for name, breaker in self._breakers.items()}
+
+
+# 全局单例（同步与异步客户端共享）
+circuit_breakers = CircuitBreakerRegistry()
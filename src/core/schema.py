@@ -0,0 +1,123 @@
+"""原始表结构：按接口注册表生成类型化DDL（DATE列、主键）"""
+from functools import lru_cache
+from typing import Dict, List, Optional
+from config import load_endpoint_registry
+
+# 按列名推断的时间类型（注册表 columns 未列出的列）
+DATE_SUFFIX = "_date"
+TIMESTAMP_COLUMNS = {"trade_time", "datetime"}
+
+# 数据推断类型 -> 库内类型（整数统一 BIGINT，其余数值统一 DOUBLE）
+NUMERIC_TYPES = {"TINYINT", "SMALLINT", "INTEGER", "BIGINT", "HUGEINT",
+                 "UTINYINT", "USMALLINT", "UINTEGER", "UBIGINT"}
+FLOAT_TYPES = {"FLOAT", "DOUBLE", "REAL"}
+
+# 注册表 row_hash: true 的表额外存一列行哈希（非主键列的哈希），upsert 时跳过内容未变化的行
+ROW_HASH_COLUMN = "row_hash"
+
+# 紧凑存储（COMPACT_STORAGE）时改存 FLOAT 的列：量级大、只需约7位有效数字的量额/股本/市值
+COMPACT_FLOAT_COLUMNS = ("vol", "amount", "total_share", "float_share", "free_share", "total_mv", "circ_mv")
+
+
+@lru_cache(maxsize=1)
+def _registry() -> dict:
+    return load_endpoint_registry()
+
+
+def table_for_api(api_name: str) -> str:
+    """接口对应的库内表名（注册表 table 字段，默认 raw_<api_name>）"""
+    config = _registry().get(api_name) or {}
+    return config.get("table") or f"raw_{api_name}"
+
+
+def api_for_table(table_name: str) -> Optional[str]:
+    """库内表名 -> 接口名（不是原始表返回 None）"""
+    for api_name in _registry():
+        if table_for_api(api_name) == table_name:
+            return api_name
+    return None
+
+
+def registry_columns(table_name: str) -> Dict[str, str]:
+    """注册表中声明的列类型"""
+    api_name = api_for_table(table_name)
+    if api_name is None:
+        return {}
+    return dict(_registry()[api_name].get("columns") or {})
+
+
+def registry_pk(table_name: str) -> List[str]:
+    """注册表中声明的主键"""
+    api_name = api_for_table(table_name)
+    if api_name is None:
+        return []
+    return list(_registry()[api_name].get("pk_fields") or [])
+
+
+def uses_row_hash(table_name: str) -> bool:
+    """注册表中该表是否开启行哈希"""
+    api_name = api_for_table(table_name)
+    return bool(api_name and _registry()[api_name].get("row_hash"))
+
+
+def infer_type(column: str, source_type: str) -> str:
+    """按列名规则与数据类型推断库内类型"""
+    if column.endswith(DATE_SUFFIX):
+        return "DATE"
+    if column in TIMESTAMP_COLUMNS:
+        return "TIMESTAMP"
+    
+    source_type = source_type.upper()
+    if source_type in NUMERIC_TYPES:
+        return "BIGINT"
+    if source_type in FLOAT_TYPES or source_type.startswith("DECIMAL"):
+        return "DOUBLE"
+    if source_type in ("DATE", "BOOLEAN") or source_type.startswith("TIMESTAMP"):
+        return "TIMESTAMP" if source_type.startswith("TIMESTAMP") else source_type
+    # 全空列在 pandas 中是 object，按字符串建列
+    return "VARCHAR"
+
+
+def table_columns(table_name: str, source_types: Dict[str, str]) -> Dict[str, str]:
+    """建表列定义：注册表声明的列优先，数据中多出的列按规则推断"""
+    declared = registry_columns(table_name)
+    columns = {col: declared[col] for col in declared}
+    for col, source_type in source_types.items():
+        if col not in columns:
+            columns[col] = infer_type(col, source_type)
+    if uses_row_hash(table_name):
+        columns.setdefault(ROW_HASH_COLUMN, "UBIGINT")
+    return columns
+
+
+def build_table_ddl(table_name: str, source_types: Dict[str, str], pk_fields: List[str] = None) -> str:
+    """生成 CREATE TABLE 语句（pk_fields 为空时取注册表主键）"""
+    columns = table_columns(table_name, source_types)
+    pk_fields = [col for col in (pk_fields or registry_pk(table_name)) if col in columns]
+    
+    lines = [f'"{col}" {col_type}' for col, col_type in columns.items()]
+    if pk_fields:
+        lines.append(f"PRIMARY KEY ({', '.join(f'{chr(34)}{col}{chr(34)}' for col in pk_fields)})")
+    body = ",\n    ".join(lines)
+    return f"CREATE TABLE IF NOT EXISTS {table_name} (\n    {body}\n)"
+
+
+def cast_expression(column: str, source_type: str, target_type: str) -> str:
+    """写入时的类型转换表达式（YYYYMMDD 字符串 -> DATE/TIMESTAMP）"""
+    quoted = f'"{column}"'
+    source_type = source_type.upper()
+    target_type = target_type.upper()
+    if source_type == "VARCHAR" and target_type in ("DATE", "TIMESTAMP"):
+        parsed = f"COALESCE(TRY_STRPTIME({quoted}, '%Y%m%d'), TRY_CAST({quoted} AS TIMESTAMP))"
+        return f"CAST({parsed} AS {target_type}) AS {quoted}"
+    if target_type == "DATE" and source_type.startswith("TIMESTAMP"):
+        return f"CAST({quoted} AS DATE) AS {quoted}"
+    return quoted
+
+
+def to_iso_date(value: str) -> str:
+    """YYYYMMDD -> YYYY-MM-DD（已是 ISO 格式原样返回）"""
+    value = str(value)
+    if len(value) == 8 and value.isdigit():
+        return f"{value[:4]}-{value[4:6]}-{value[6:]}"
+    return value
@@ -0,0 +1,89 @@
+"""请求合并（single-flight）：相同请求在途时只发一次，其余调用方共享结果"""
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+
+class SingleFlight:
+    """线程版请求合并（fetch / fetch_many 线程池共用）
+    
+    do() 返回 (结果, 是否与其它调用方共享)。结果被共享时，调用方应自行复制后再修改。
+    """
+    
+    def __init__(self):
+        # key -> [Future, 跟随者数量]
+        self._calls: Dict[str, list] = {}
+        self._lock = threading.Lock()
+    
+    def do(self, key: str, fn: Callable[..., Any], *args, **kwargs) -> Tuple[Any, bool]:
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call[1] += 1
+                leader = False
+            else:
+                call = [Future(), 0]
+                self._calls[key] = call
+                leader = True
+        
+        future = call[0]
+        if not leader:
+            return future.result(), True
+        
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+        
+        return result, call[1] > 0
+    
+    def in_flight(self) -> int:
+        """当前在途的不同请求数"""
+        with self._lock:
+            return len(self._calls)
+
+
+class AsyncSingleFlight:
+    """协程版请求合并（同一事件循环内使用）"""
+    
+    def __init__(self):
+        # key -> [asyncio.Future, 跟随者数量]
+        self._calls: Dict[str, list] = {}
+    
+    async def do(self, key: str, fn: Callable[..., Awaitable[Any]], *args, **kwargs) -> Tuple[Any, bool]:
+        call = self._calls.get(key)
+        if call is not None:
+            call[1] += 1
+            return await asyncio.shield(call[0]), True
+        
+        call = [asyncio.get_running_loop().create_future(), 0]
+        self._calls[key] = call
+        future = call[0]
+        
+        try:
+            result = await fn(*args, **kwargs)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # 无跟随者时标记异常已读取，避免 "exception was never retrieved" 警告
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+        finally:
+            self._calls.pop(key, None)
+        
+        return result, call[1] > 0
+    
+    def in_flight(self) -> int:
+        """当前在途的不同请求数"""
+        return len(self._calls)
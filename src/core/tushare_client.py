@@ -1,11 +1,36 @@
 """Tushare客户端封装（带权限探测与错误处理）"""
+import time
+from datetime import datetime, timedelta
 import tushare as ts
 import pandas as pd
-from typing import Optional, Dict, Any
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Optional, Dict, Any, Iterator, List, Sequence, Tuple
 from loguru import logger
-from retry import retry
-from config import TUSHARE_TOKEN, get_available_endpoints
+from config import TUSHARE_TOKEN, FETCH_MAX_WORKERS, RETRY_MAX_TRIES, get_available_endpoints
 from .rate_limiter import rate_limiter
+from .errors import CircuitOpenError, PermissionDeniedError, ThrottleError, classify_error
+from .resilience import backoff_delay, circuit_breakers
+from .cache import request_key, response_cache
+from .singleflight import SingleFlight
+
+# 自动分页的页数上限（max_rows=5000 时约 100 万行），防止服务端异常时无限翻页
+PAGINATION_MAX_PAGES = 200
+
+
+def check_permission(endpoints: Dict[str, dict], api_name: str) -> tuple[bool, str]:
+    """按接口注册表检查权限（同步/异步客户端共用）"""
+    if api_name not in endpoints:
+        return False, f"未知接口: {api_name}"
+    
+    config = endpoints[api_name]
+    
+    if config['permission_mode'] == 'independent':
+        return False, f"需要独立开通权限"
+    
+    if not config.get('user_can_access', False):
+        return False, f"需要 {config['min_points']} 积分"
+    
+    return True, "OK"
 
 
 class TushareClient:
@@ -24,6 +49,9 @@ class TushareClient:
         # 加载接口注册表
         self.endpoints = get_available_endpoints()
         
+        # 在途请求合并（相同 api_name + 参数只调用一次）
+        self._inflight = SingleFlight()
+        
         logger.info(f"Tushare客户端已初始化，token: {self.token[:10]}...")
     
     def get_user_info(self) -> Optional[Dict[str, Any]]:
@@ -41,31 +69,49 @@ class TushareClient:
     
     def check_endpoint_permission(self, api_name: str) -> tuple[bool, str]:
         """检查接口权限"""
-        if api_name not in self.endpoints:
-            return False, f"未知接口: {api_name}"
-        
-        config = self.endpoints[api_name]
-        
-        if config['permission_mode'] == 'independent':
-            return False, f"需要独立开通权限"
-        
-        if not config.get('user_can_access', False):
-            return False, f"需要 {config['min_points']} 积分"
-        
-        return True, "OK"
+        return check_permission(self.endpoints, api_name)
     
-    @retry(tries=3, delay=2, backoff=2, logger=logger)
     def _call_api(self, api_name: str, **kwargs) -> Optional[pd.DataFrame]:
-        """调用API（带重试与限频）"""
-        # 限频
-        rate_limiter.acquire()
+        """调用API（带分类重试、限频与熔断）
+        
+        - 限频/网络类错误：抖动指数退避后重试，限频错误同时反馈给限频器降速
+        - 权限/参数类错误：立即抛出，不浪费配额
+        - 接口熔断期间：直接抛出 CircuitOpenError
+        """
+        breaker = circuit_breakers.get(api_name)
+        if not breaker.allow():
+            raise CircuitOpenError(f"接口 {api_name} 熔断中，暂停调用", api_name)
         
         # 调用接口
         api_func = getattr(self.pro, api_name, None)
         if api_func is None:
             raise ValueError(f"接口不存在: {api_name}")
         
-        df = api_func(**kwargs)
+        attempt = 0
+        while True:
+            attempt += 1
+            
+            # 限频（全局 + 接口级）
+            rate_limiter.acquire(api_name)
+            
+            try:
+                df = api_func(**kwargs)
+            except Exception as e:
+                error = classify_error(e, api_name)
+                if isinstance(error, ThrottleError):
+                    rate_limiter.report_throttle(api_name)
+                
+                if not error.retryable or attempt >= RETRY_MAX_TRIES:
+                    breaker.record_failure(error)
+                    raise error from e
+                
+                delay = backoff_delay(attempt, error)
+                logger.warning(f"{api_name} 第{attempt}次调用失败[{error.category}]: {error}，{delay:.1f}秒后重试")
+                time.sleep(delay)
+                continue
+            
+            breaker.record_success()
+            break
         
         if df is not None:
             logger.debug(f"{api_name} 返回 {len(df)} 行")
@@ -74,17 +120,119 @@ class TushareClient:
         
         return df
     
-    def fetch(self, api_name: str, **kwargs) -> Optional[pd.DataFrame]:
-        """统一拉取接口（带权限检查）"""
+    def _call_paginated(self, api_name: str, **kwargs) -> Optional[pd.DataFrame]:
+        """调用API并补齐被 max_rows 截断的结果
+        
+        单次返回行数达到注册表 max_rows 时按 offset/limit 继续翻页：
+        当前页一旦确认满页就立即预取下一页，再处理当前页；最后按 pk_fields 去重。
+        服务端忽略 offset 时，退化为二分 start_date~end_date 逐段拉取。
+        显式传入 limit/offset 的调用视为调用方自行分页，不做处理。
+        """
+        config = self.endpoints.get(api_name, {})
+        max_rows = config.get('max_rows')
+        
+        first = self._call_api(api_name, **kwargs)
+        if (first is None or not max_rows or len(first) < max_rows
+                or 'limit' in kwargs or 'offset' in kwargs):
+            return first
+        
+        page_size = len(first)
+        pk_fields = [f for f in config.get('pk_fields', []) if f in first.columns]
+        logger.info(f"{api_name} 返回 {page_size} 行达到上限 {max_rows}，自动分页")
+        
+        pages = [first]
+        offset = page_size
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="tushare-page") as executor:
+            future = executor.submit(self._call_api, api_name, offset=offset, limit=page_size, **kwargs)
+            while future is not None:
+                page = future.result()
+                future = None
+                
+                if page is None or len(page) == 0:
+                    break
+                
+                # 服务端忽略 offset：返回内容与首页（或上一页）相同；字段投影去掉主键时直接比较整页
+                if self._same_page(page, first, pk_fields) or self._same_page(page, pages[-1], pk_fields):
+                    logger.warning(f"{api_name} 不支持 offset 分页，改为按日期区间拆分")
+                    return self._call_split(api_name, first, **kwargs)
+                
+                if len(pages) + 1 >= PAGINATION_MAX_PAGES:
+                    pages.append(page)
+                    logger.error(f"{api_name} 分页超过 {PAGINATION_MAX_PAGES} 页仍未结束，停止翻页，结果可能被截断: {kwargs}")
+                    break
+                
+                # 满页：先预取下一页，再处理当前页
+                if len(page) >= page_size:
+                    offset += len(page)
+                    future = executor.submit(self._call_api, api_name, offset=offset, limit=page_size, **kwargs)
+                
+                pages.append(page)
+        
+        df = pd.concat(pages, ignore_index=True)
+        if pk_fields:
+            df = df.drop_duplicates(subset=pk_fields, keep='last').reset_index(drop=True)
+        
+        logger.info(f"{api_name} 分页完成: {len(pages)} 页, {len(df)} 行")
+        return df
+    
+    @staticmethod
+    def _same_page(page: pd.DataFrame, other: pd.DataFrame, pk_fields: List[str]) -> bool:
+        """两页是否为同一批数据（有主键比较首行主键，否则比较整页内容）"""
+        if pk_fields:
+            return page[pk_fields].head(1).reset_index(drop=True).equals(
+                other[pk_fields].head(1).reset_index(drop=True))
+        return len(page) == len(other) and page.reset_index(drop=True).equals(other.reset_index(drop=True))
+    
+    def _call_split(self, api_name: str, first: pd.DataFrame, **kwargs) -> pd.DataFrame:
+        """按 start_date~end_date 二分拉取（offset 不可用时的兜底）"""
+        start_date, end_date = kwargs.get('start_date'), kwargs.get('end_date')
+        if not start_date or not end_date or start_date >= end_date:
+            logger.warning(f"{api_name} 结果可能被截断（{len(first)} 行），且无法按日期拆分: {kwargs}")
+            return first
+        
+        start = datetime.strptime(start_date, "%Y%m%d")
+        end = datetime.strptime(end_date, "%Y%m%d")
+        mid = start + (end - start) / 2
+        
+        left = self._call_paginated(api_name, **{**kwargs, 'end_date': mid.strftime("%Y%m%d")})
+        right = self._call_paginated(api_name, **{**kwargs, 'start_date': (mid + timedelta(days=1)).strftime("%Y%m%d")})
+        
+        df = pd.concat([part for part in (left, right) if part is not None], ignore_index=True)
+        pk_fields = [f for f in self.endpoints.get(api_name, {}).get('pk_fields', []) if f in df.columns]
+        if pk_fields:
+            df = df.drop_duplicates(subset=pk_fields, keep='last').reset_index(drop=True)
+        return df
+    
+    def fetch(self, api_name: str, use_cache: bool = True, **kwargs) -> Optional[pd.DataFrame]:
+        """统一拉取接口（带权限检查、响应缓存与在途请求合并）"""
         # 检查权限
         has_permission, msg = self.check_endpoint_permission(api_name)
         if not has_permission:
             logger.error(f"接口 {api_name} 无权限: {msg}")
             return None
         
-        # 调用API
+        # 相同请求在途时等待同一结果，共享时各自拿副本（绕过缓存的请求不与走缓存的请求合并）
+        key = request_key(api_name, kwargs if use_cache else {**kwargs, "__no_cache": True})
+        df, shared = self._inflight.do(key, self._fetch_once, api_name, use_cache, kwargs)
+        if shared and df is not None:
+            logger.debug(f"{api_name} 合并在途请求")
+            df = df.copy()
+        return df
+    
+    def _fetch_once(self, api_name: str, use_cache: bool, kwargs: Dict[str, Any]) -> Optional[pd.DataFrame]:
+        """缓存查找 + 实际调用（由 fetch 保证同一请求同时只执行一次）"""
+        # 命中缓存则不消耗配额
+        if use_cache:
+            cached = response_cache.get(api_name, kwargs)
+            if cached is not None:
+                logger.debug(f"{api_name} 命中缓存: {len(cached)} 行")
+                return cached
+        
+        # 调用API（超过 max_rows 时自动分页）
         try:
-            df = self._call_api(api_name, **kwargs)
+            df = self._call_paginated(api_name, **kwargs)
+            if use_cache:
+                response_cache.put(api_name, kwargs, df)
             return df
         except Exception as e:
             logger.error(f"调用 {api_name} 失败: {e}")
@@ -109,6 +257,42 @@ class TushareClient:
         """按日期范围拉取"""
         return self.fetch(api_name, start_date=start_date, end_date=end_date, **kwargs)
     
+    def fetch_many(self, requests: Sequence[Tuple[str, Dict[str, Any]]],
+                   max_workers: int = None) -> List[Optional[pd.DataFrame]]:
+        """并发批量拉取（按提交顺序返回）
+        
+        requests: [(api_name, kwargs), ...]，所有线程共享全局限频器；
+        单个请求失败只在对应位置返回 None，不影响其它请求。
+        """
+        results: List[Optional[pd.DataFrame]] = [None] * len(requests)
+        for index, df in self.fetch_many_as_completed(requests, max_workers=max_workers):
+            results[index] = df
+        return results
+    
+    def fetch_many_as_completed(self, requests: Sequence[Tuple[str, Dict[str, Any]]],
+                                max_workers: int = None) -> Iterator[Tuple[int, Optional[pd.DataFrame]]]:
+        """并发批量拉取（按完成顺序产出 (序号, DataFrame)）"""
+        if not requests:
+            return
+        
+        workers = min(max_workers or FETCH_MAX_WORKERS, len(requests))
+        logger.info(f"并发拉取 {len(requests)} 个请求，线程数: {workers}")
+        
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tushare-fetch") as executor:
+            futures = {
+                executor.submit(self.fetch, api_name, **(kwargs or {})): index
+                for index, (api_name, kwargs) in enumerate(requests)
+            }
+            for future in as_completed(futures):
+                index = futures[future]
+                try:
+                    df = future.result()
+                except Exception as e:
+                    api_name = requests[index][0]
+                    logger.error(f"并发请求 #{index} ({api_name}) 失败: {e}")
+                    df = None
+                yield index, df
+    
     def probe_endpoint(self, api_name: str) -> tuple[str, str]:
         """探测接口可用性（轻量请求）"""
         try:
@@ -137,14 +321,18 @@ class TushareClient:
                 return "error", "返回空数据"
         
         except Exception as e:
-            error_msg = str(e)
-            if "没有权限" in error_msg or "权限不足" in error_msg:
-                return "no_permission", error_msg
-            return "error", error_msg
+            error = classify_error(e, api_name)
+            if isinstance(error, PermissionDeniedError):
+                return "no_permission", str(error)
+            return "error", str(error)
+    
+    def get_cache_stats(self) -> dict:
+        """获取响应缓存命中统计"""
+        return response_cache.get_stats()
     
     def get_rate_stats(self) -> dict:
-        """获取限频统计"""
-        return rate_limiter.get_stats()
+        """获取限频统计（附各接口熔断状态）"""
+        return {**rate_limiter.get_stats(), "circuit_breakers": circuit_breakers.get_states()}
 
 
 # 全局单例（延迟初始化，避免启动时token未配置）
@@ -0,0 +1,333 @@
+"""单写入进程：独占读写连接，经本地socket接收写入任务，定期导出只读快照
+
+DuckDB 同一个库文件只允许一个读写进程。写入进程（scripts/writer_daemon.py）持有唯一的
+读写连接；UI、探测脚本、定时回填以 DATABASE_MODE=client 运行：读最新快照（只读打开，
+多个进程可同时打开），写操作经 WriterClient 发给写入进程执行。
+
+连接用 WRITER_AUTHKEY 认证（留空时使用写入进程首次启动生成的随机密钥文件）；
+客户端只能调用 WRITE_OPS 中的具名写方法，不能执行任意SQL。
+"""
+import os
+import secrets
+import threading
+import time
+from datetime import datetime
+from multiprocessing.connection import Client, Listener
+from pathlib import Path
+from typing import Optional, Tuple
+from loguru import logger
+from config import (
+    WRITER_ADDRESS,
+    WRITER_AUTHKEY,
+    WRITER_KEY_PATH,
+    SNAPSHOT_INTERVAL,
+    SNAPSHOT_KEEP,
+    SNAPSHOT_PATH,
+)
+
+# 允许客户端远程调用的 Database 写方法
+WRITE_OPS = (
+    "advance_watermark",
+    "record_capability",
+    "drop_table",
+    "create_lake_view",
+    "insert_dataframe",
+    "upsert_dataframe",
+    "upsert_tables",
+    "create_table_like",
+    "create_typed_table",
+    "migrate_typed_table",
+    "register_securities",
+    "create_daily_panel_table",
+    "create_funda_panel_table",
+    "rewrite_sorted",
+    "create_sorted_copy",
+)
+
+# 快照目录下记录最新快照文件名的指针文件
+LATEST_POINTER = "LATEST"
+
+# 旧版的默认口令（公开已知，拒绝使用）
+INSECURE_AUTHKEYS = ("tushare-writer",)
+
+
+class WriterError(Exception):
+    """写入进程返回的错误（或写入进程不可达）"""
+
+
+def load_authkey(authkey: str = WRITER_AUTHKEY, create: bool = False,
+                 key_path: Path = WRITER_KEY_PATH) -> bytes:
+    """写入进程的连接密钥
+    
+    配置了 authkey 时直接使用（旧版公开默认值拒绝使用）；否则读取密钥文件，
+    文件不存在时由写入进程（create=True）生成随机密钥，权限仅限当前用户读写。
+    """
+    if authkey:
+        if authkey in INSECURE_AUTHKEYS:
+            raise WriterError("WRITER_AUTHKEY 仍是公开的默认值，请清空该配置（自动生成密钥）或改为随机字符串")
+        return authkey.encode("utf-8")
+    
+    key_path = Path(key_path)
+    if not key_path.exists():
+        if not create:
+            raise WriterError(f"写入进程密钥不存在: {key_path}（请先启动 scripts/writer_daemon.py）")
+        key_path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            fd = os.open(key_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        except FileExistsError:
+            pass
+        else:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(secrets.token_hex(32))
+            logger.info(f"已生成写入进程密钥: {key_path}")
+    return key_path.read_text(encoding="utf-8").strip().encode("utf-8")
+
+
+def parse_address(address: str) -> Tuple[str, int]:
+    """'host:port' -> (host, port)"""
+    host, _, port = address.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+def read_latest(path: Path) -> Optional[Path]:
+    """目录下 LATEST 指针指向的文件（没有指针或文件已不存在时返回 None）"""
+    pointer = Path(path) / LATEST_POINTER
+    try:
+        name = pointer.read_text(encoding="utf-8").strip()
+    except FileNotFoundError:
+        return None
+    target = Path(path) / name
+    return target if name and target.exists() else None
+
+
+def switch_latest(path: Path, name: str):
+    """原子替换目录下的 LATEST 指针，指向已完整写好的文件 name
+    
+    只替换指针本身：已打开（含内存映射）旧文件的读者不受影响，Windows 上也不会因文件被占用而失败。
+    """
+    pointer = Path(path) / LATEST_POINTER
+    tmp_pointer = pointer.with_suffix(f".{os.getpid()}.tmp")
+    tmp_pointer.write_text(name, encoding="utf-8")
+    os.replace(tmp_pointer, pointer)
+
+
+class SnapshotManager:
+    """只读快照：COPY FROM DATABASE 导出到新文件，再原子替换 LATEST 指针
+    
+    读者只会打开已经完整写好的快照文件；旧快照保留 keep 份，给还没切换的读者留出时间。
+    导出在一个事务内读取（MVCC 一致视图），写操作不必停下来等待导出。
+    """
+    
+    def __init__(self, path: Path = SNAPSHOT_PATH, keep: int = SNAPSHOT_KEEP):
+        self.path = Path(path)
+        self.keep = keep
+    
+    @staticmethod
+    def latest(path: Path = SNAPSHOT_PATH) -> Optional[Path]:
+        """最新快照文件（尚未导出过返回 None）"""
+        return read_latest(path)
+    
+    def export(self, db) -> Path:
+        """把当前库导出为新快照并切换 LATEST（快照为事务开始时刻的已提交状态）"""
+        self.path.mkdir(parents=True, exist_ok=True)
+        name = f"snapshot_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.duckdb"
+        target = self.path / name
+        
+        source = db.query("SELECT current_database() AS name").iloc[0]["name"]
+        alias = "_snapshot_export"
+        db.execute(f"ATTACH '{target.as_posix()}' AS {alias}")
+        try:
+            with db.transaction() as cursor:
+                cursor.execute(f"COPY FROM DATABASE {source} TO {alias}")
+        finally:
+            db.execute(f"DETACH {alias}")
+        
+        switch_latest(self.path, name)
+        
+        self._prune()
+        logger.info(f"快照已导出: {target}")
+        return target
+    
+    def _prune(self):
+        """只保留最近 keep 份快照"""
+        snapshots = sorted(self.path.glob("snapshot_*.duckdb"))
+        for old in snapshots[:-self.keep]:
+            try:
+                old.unlink()
+                Path(f"{old}.wal").unlink(missing_ok=True)
+            except OSError as e:
+                logger.debug(f"删除旧快照失败 {old}: {e}")
+
+
+class WriterServer:
+    """写入进程服务端（每个客户端连接一个线程，写操作串行执行）"""
+    
+    def __init__(self, address: str = WRITER_ADDRESS, authkey: str = WRITER_AUTHKEY,
+                 snapshot_interval: float = SNAPSHOT_INTERVAL, snapshots: SnapshotManager = None):
+        from .database import db
+        if db.mode != "direct" or db.read_only:
+            raise WriterError("写入进程必须以 DATABASE_MODE=direct 读写打开数据库")
+        
+        self.db = db
+        self.address = parse_address(address)
+        self.authkey = load_authkey(authkey, create=True)
+        self.snapshot_interval = snapshot_interval
+        self.snapshots = snapshots or SnapshotManager()
+        
+        self._write_lock = threading.Lock()
+        # 写操作计数与最近一次导出时的计数：相同表示快照已是最新
+        self._version = 0
+        self._exported_version = -1
+        self._export_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._listener: Optional[Listener] = None
+        
+        self.stats = {"jobs": 0, "errors": 0, "snapshots": 0}
+    
+    @property
+    def dirty(self) -> bool:
+        """上次导出之后是否有写入"""
+        return self._version != self._exported_version
+    
+    def snapshot(self) -> Path:
+        """导出快照（上次导出之后没有写入时直接返回最新快照）
+        
+        不持有写锁：导出期间写任务照常执行，并发的导出请求排队后复用同一份快照。
+        """
+        with self._export_lock:
+            version = self._version
+            latest = self.snapshots.latest(self.snapshots.path)
+            if version == self._exported_version and latest is not None:
+                return latest
+            
+            path = self.snapshots.export(self.db)
+            # 导出期间又有写入时仍标记为过期，下次继续导出
+            self._exported_version = version
+            self.stats["snapshots"] += 1
+        return path
+    
+    def _dispatch(self, op: str, args: tuple, kwargs: dict):
+        if op == "ping":
+            return "pong"
+        if op == "snapshot":
+            return str(self.snapshot())
+        if op == "stats":
+            return dict(self.stats)
+        if op not in WRITE_OPS:
+            raise WriterError(f"不支持的操作: {op}")
+        
+        with self._write_lock:
+            result = getattr(self.db, op)(*args, **kwargs)
+            self._version += 1
+            self.stats["jobs"] += 1
+        return result
+    
+    def _handle(self, conn):
+        """处理单个客户端的请求序列"""
+        with conn:
+            while not self._stop.is_set():
+                try:
+                    op, args, kwargs = conn.recv()
+                except (EOFError, OSError):
+                    break
+                
+                try:
+                    conn.send(("ok", self._dispatch(op, args, kwargs)))
+                except Exception as e:
+                    self.stats["errors"] += 1
+                    logger.error(f"写入任务失败 {op}: {e}")
+                    conn.send(("error", f"{type(e).__name__}: {e}"))
+    
+    def _snapshot_loop(self):
+        """有写入时按间隔导出快照"""
+        while not self._stop.wait(self.snapshot_interval):
+            if self.dirty:
+                try:
+                    self.snapshot()
+                except Exception as e:
+                    logger.error(f"快照导出失败: {e}")
+    
+    def serve_forever(self):
+        """启动监听（阻塞，直到 shutdown）"""
+        self.snapshot()
+        threading.Thread(target=self._snapshot_loop, name="snapshot", daemon=True).start()
+        
+        self._listener = Listener(self.address, authkey=self.authkey)
+        logger.info(f"写入进程已启动: {self.address[0]}:{self.address[1]}")
+        
+        while not self._stop.is_set():
+            try:
+                conn = self._listener.accept()
+            except OSError:
+                break
+            except Exception as e:
+                logger.warning(f"拒绝连接: {e}")
+                continue
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+        
+        logger.info("写入进程已停止")
+    
+    def shutdown(self):
+        """停止监听并导出最后一份快照"""
+        self._stop.set()
+        if self._listener is not None:
+            self._listener.close()
+        if self.dirty:
+            self.snapshot()
+
+
+class WriterClient:
+    """写入进程客户端（每个线程一条连接，断线自动重连一次）"""
+    
+    def __init__(self, address: str = WRITER_ADDRESS, authkey: str = WRITER_AUTHKEY):
+        self.address = parse_address(address)
+        self.authkey = load_authkey(authkey)
+        self._local = threading.local()
+    
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            try:
+                conn = Client(self.address, authkey=self.authkey)
+            except OSError as e:
+                raise WriterError(f"无法连接写入进程 {self.address[0]}:{self.address[1]}: {e}") from e
+            self._local.conn = conn
+        return conn
+    
+    def call(self, op: str, *args, **kwargs):
+        """执行一个远程操作并返回结果"""
+        for attempt in range(2):
+            conn = self._connection()
+            try:
+                conn.send((op, args, kwargs))
+                status, result = conn.recv()
+                break
+            except (EOFError, OSError):
+                # 写入进程重启过：丢弃旧连接重试一次
+                self._local.conn = None
+                if attempt == 1:
+                    raise WriterError("写入进程连接中断")
+        
+        if status == "error":
+            raise WriterError(result)
+        return result
+    
+    def ping(self) -> bool:
+        """写入进程是否在线"""
+        try:
+            return self.call("ping") == "pong"
+        except WriterError:
+            return False
+    
+    def snapshot(self) -> str:
+        """请求立即导出快照（需要马上读到刚写入的数据时使用）"""
+        return self.call("snapshot")
+    
+    def wait_until_ready(self, timeout: float = 10.0) -> bool:
+        """等待写入进程上线"""
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if self.ping():
+                return True
+            time.sleep(0.2)
+        return False
@@ -1,6 +1,11 @@
 """ETL模块初始化"""
 from .extractors import DataExtractor
-from .transformers import DataTransformer
-from .loaders import DataLoader
+from .transformers import DataTransformer, ArrowTransformer
+from .loaders import DataLoader, BatchLoader
+from .pipeline import TaskGraph, PipelineExecutor, TaskError
+from .planner import ApiCall, CallPlan, plan_slicing
+from .backfill import backfill, missing_dates
 
-__all__ = ["DataExtractor", "DataTransformer", "DataLoader"]
+__all__ = ["DataExtractor", "DataTransformer", "ArrowTransformer", "DataLoader", "BatchLoader",
+           "TaskGraph", "PipelineExecutor", "TaskError", "ApiCall", "CallPlan", "plan_slicing",
+           "backfill", "missing_dates"]
@@ -0,0 +1,67 @@
+"""断点续传回填：按完成台账（etl_ledger）计算缺口，只并发拉取缺失的 (接口, 交易日)
+
+每个 (接口, 交易日) 入库提交时在同一事务内登记台账；中途崩溃后重跑 backfill，
+只会拉取 trade_cal 开市日中台账里还没有的部分。
+    backfill(["daily", "daily_basic", "adj_factor"], "20210101", "20231231")
+"""
+from typing import Dict, List
+from loguru import logger
+from src.core import db
+from .extractors import DataExtractor
+from .loaders import BatchLoader
+from .pipeline import PipelineExecutor, TaskGraph
+from .planner import BY_TRADE_DATE, apis_with_strategy, missing_dates
+
+# 默认回填的接口（日线面板的三个来源）；注册表中 by_trade_date 的接口都可以回填
+DEFAULT_BACKFILL_APIS = ("daily", "daily_basic", "adj_factor")
+
+
+def backfill(api_names: List[str], start_date: str, end_date: str, resume: bool = True,
+             extractor: DataExtractor = None) -> Dict[str, dict]:
+    """回填区间内的按交易日接口，返回 {api_name: {"missing": 待拉取天数, "remaining": 仍缺失天数}}
+    
+    同一交易日的各接口并行拉取，多个交易日流水线执行（见 pipeline.PipelineExecutor），
+    结果攒批单事务写入并登记台账。拉取失败的日期不登记，下次 resume 时自动补拉。
+    """
+    supported = apis_with_strategy(BY_TRADE_DATE)
+    unknown = [api_name for api_name in api_names if api_name not in supported]
+    if unknown:
+        raise ValueError(f"不支持按交易日回填的接口: {unknown}")
+    
+    extractor = extractor or DataExtractor()
+    missing = missing_dates(api_names, start_date, end_date, resume=resume)
+    
+    # 交易日 -> 需要拉取的接口
+    by_date: Dict[str, List[str]] = {}
+    for api_name, trade_dates in missing.items():
+        for trade_date in trade_dates:
+            by_date.setdefault(trade_date, []).append(api_name)
+    
+    total = sum(len(trade_dates) for trade_dates in missing.values())
+    logger.info(f"回填 {start_date}~{end_date}: 待拉取 {total} 个(接口, 交易日)，涉及 {len(by_date)} 个交易日")
+    
+    def graphs(batch: BatchLoader):
+        for trade_date in sorted(by_date):
+            graph = TaskGraph(trade_date)
+            for api_name in by_date[trade_date]:
+                # 拉取失败时节点抛出异常，该交易日计入失败（不会当作无数据登记台账）
+                graph.add(api_name, extractor.fetch_date, args=(api_name, trade_date), kwargs={"loader": batch})
+            yield graph
+    
+    failed = 0
+    with BatchLoader() as batch, PipelineExecutor() as executor:
+        for graph, _, error in executor.stream(graphs(batch)):
+            if error is not None:
+                failed += 1
+                logger.error(f"回填 {graph.name} 失败: {error.cause}")
+    if failed:
+        logger.warning(f"回填有 {failed} 个交易日失败，重跑 backfill 时补拉")
+    
+    db.sync_snapshot()
+    remaining = missing_dates(api_names, start_date, end_date)
+    summary = {
+        api_name: {"missing": len(missing[api_name]), "remaining": len(remaining[api_name])}
+        for api_name in api_names
+    }
+    logger.info(f"回填完成: {summary}")
+    return summary
@@ -1,10 +1,30 @@
-"""数据提取器（按接口注册表批量拉取）"""
+"""数据提取器（按接口注册表批量拉取）
+
+extract(api_name, start_date, end_date) 按注册表 increment_strategy 规划调用，
+并发拉取后攒批写入类型化原始表（表名与主键同样取自注册表），新接口只需补注册表配置：
+    extractor.extract("moneyflow", "20240101", "20240131")   # 每个开市日一次调用
+    extractor.extract("index_daily")                          # 从水位续拉，每个指数一次调用
+    extractor.extract("daily", "20200101", "20241231", codes=["000001.SZ"])  # 按成本改为按代码切片
+"""
 import pandas as pd
-from datetime import datetime, timedelta
-from typing import List, Optional
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
 from loguru import logger
-from config import load_endpoint_registry
+from config import (COMPACT_STORAGE, FETCH_MAX_WORKERS, PIPELINE_FORMAT, PIPELINE_MAX_IN_FLIGHT,
+                    load_endpoint_registry)
 from src.core import get_client, db
+from src.core.lake import raw_lake
+from src.core.schema import table_for_api, to_iso_date
+from .transformers import ArrowTransformer
+from .loaders import BatchLoader, advance_watermark, record_completion
+from .pipeline import PipelineExecutor, TaskGraph
+from .planner import (BY_ANN_DATE_WITH_LOOKBACK, BY_TRADE_DATE, BY_TS_CODE, SNAPSHOT, STRATEGIES,
+                      ApiCall, CallPlan, apis_with_strategy, date_windows, first_completed_date,
+                      missing_dates, plan_slicing, shift_date)
+
+# 没有水位时的默认起始日期、日期区间切片天数
+DEFAULT_START_DATE = "20100101"
+DEFAULT_WINDOW_DAYS = 30
 
 
 class DataExtractor:
@@ -13,6 +33,7 @@ class DataExtractor:
     def __init__(self):
         self.client = get_client()
         self.registry = load_endpoint_registry()
+        self.pipeline_format = PIPELINE_FORMAT
     
     def get_last_watermark(self, api_name: str) -> Optional[str]:
         """获取上次成功的水位值"""
@@ -25,11 +46,48 @@ class DataExtractor:
         return None
     
     def update_watermark(self, api_name: str, watermark: str, row_count: int):
-        """更新水位记录"""
-        db.execute("""
-            INSERT OR REPLACE INTO etl_state (api_name, watermark_value, last_success_at, last_row_count)
-            VALUES (?, ?, ?, ?)
-        """, (api_name, watermark, datetime.now(), row_count))
+        """更新水位记录（只前进不后退）"""
+        advance_watermark(api_name, watermark, row_count)
+    
+    def _to_pipeline_format(self, df):
+        """按 PIPELINE_FORMAT 转换拉取结果（arrow 模式下此后全程为 pyarrow.Table）"""
+        if self.pipeline_format == "arrow":
+            return ArrowTransformer.to_arrow(df)
+        return df
+    
+    def _store(self, df: pd.DataFrame, table_name: str, pk_fields: List[str],
+               api_name: str, watermark: Optional[str], loader=None):
+        """写入原始表（库内表或Parquet湖），推进水位并登记完成台账（传入 BatchLoader 时只缓冲，提交时一并写入）
+        
+        watermark 为空（不是按交易日切片的调用）时只写数据，水位由调用方推进。
+        """
+        if loader is not None:
+            loader.add(table_name, df, pk_fields, api_name=api_name, watermark=watermark)
+            return
+        
+        if raw_lake.manages(table_name):
+            raw_lake.write(table_name, df, pk_fields=pk_fields)
+        else:
+            db.create_typed_table(df, table_name, pk_fields)
+            db.upsert_dataframe(df, table_name, pk_fields=pk_fields)
+        if watermark:
+            self.update_watermark(api_name, watermark, len(df))
+            record_completion([(api_name, watermark, len(df))])
+    
+    @staticmethod
+    def _mark_empty(api_name: str, trade_date: str, loader=None):
+        """接口正常返回但当天无数据：同样登记完成台账，断点续传时不再重复拉取"""
+        if loader is not None:
+            loader.complete(api_name, trade_date)
+            return
+        record_completion([(api_name, trade_date, 0)])
+    
+    @staticmethod
+    def _fields_param(fields: Optional[List[str]]) -> dict:
+        """字段投影 -> Tushare fields 参数（None 表示拉取全部列）"""
+        if not fields:
+            return {}
+        return {"fields": ",".join(fields)}
     
     def extract_trade_calendar(self, start_date: str = None, end_date: str = None) -> pd.DataFrame:
         """提取交易日历（基础数据）"""
@@ -43,7 +101,7 @@ class DataExtractor:
         
         if df is not None and len(df) > 0:
             # 存入数据库
-            db.execute("CREATE TABLE IF NOT EXISTS trade_cal AS SELECT * FROM df WHERE 1=0")
+            db.create_typed_table(df, "trade_cal", ["exchange", "cal_date"])
             db.upsert_dataframe(df, "trade_cal", pk_fields=["exchange", "cal_date"])
             logger.info(f"交易日历已更新: {len(df)} 条")
         
@@ -58,74 +116,244 @@ class DataExtractor:
             # 添加快照日期
             df['snapshot_date'] = datetime.now().strftime("%Y%m%d")
             
-            db.execute("CREATE TABLE IF NOT EXISTS stock_basic AS SELECT * FROM df WHERE 1=0")
+            db.create_typed_table(df, "stock_basic", ["ts_code"])
             db.upsert_dataframe(df, "stock_basic", pk_fields=["ts_code"])
+            if COMPACT_STORAGE:
+                db.register_securities(df["ts_code"].tolist())
             logger.info(f"股票列表已更新: {len(df)} 只")
         
         return df
     
-    def extract_daily_by_date(self, trade_date: str) -> pd.DataFrame:
-        """按交易日提取日线行情（推荐模式）"""
-        logger.info(f"提取日线行情: {trade_date}")
-        df = self.client.fetch_by_trade_date("daily", trade_date=trade_date)
+    def _config(self, api_name: str) -> dict:
+        """注册表中的接口配置"""
+        config = self.registry.get(api_name)
+        if not config:
+            raise ValueError(f"未知接口: {api_name}")
+        return config
+    
+    def fetch_call(self, call: ApiCall, fields: List[str] = None, loader=None, store: bool = True):
+        """执行一次调用并写入该接口的类型化原始表（拉取失败返回 None）
         
-        if df is not None and len(df) > 0:
-            db.execute("CREATE TABLE IF NOT EXISTS raw_daily AS SELECT * FROM df WHERE 1=0")
-            db.upsert_dataframe(df, "raw_daily", pk_fields=["ts_code", "trade_date"])
-            self.update_watermark("daily", trade_date, len(df))
-            logger.info(f"日线行情已存储: {len(df)} 条")
+        store=False 时只返回数据、不写原始表：列投影拉到的窄表只供面板使用，
+        不能用它建原始表（之后完整拉取的多余列会被忽略）。
+        """
+        config = self._config(call.api_name)
+        description = config.get("description", call.api_name)
+        logger.info(f"提取{description}: {call.label}")
         
-        return df
-    
-    def extract_daily_basic_by_date(self, trade_date: str) -> pd.DataFrame:
-        """按交易日提取每日指标"""
-        logger.info(f"提取每日指标: {trade_date}")
-        df = self.client.fetch_by_trade_date("daily_basic", trade_date=trade_date)
+        df = self.client.fetch(call.api_name, use_cache=call.use_cache, **call.params, **self._fields_param(fields))
+        df = self._to_pipeline_format(df)
         
+        if not store:
+            return df
         if df is not None and len(df) > 0:
-            db.execute("CREATE TABLE IF NOT EXISTS raw_daily_basic AS SELECT * FROM df WHERE 1=0")
-            db.upsert_dataframe(df, "raw_daily_basic", pk_fields=["ts_code", "trade_date"])
-            self.update_watermark("daily_basic", trade_date, len(df))
-            logger.info(f"每日指标已存储: {len(df)} 条")
+            self._store(df, table_for_api(call.api_name), list(config.get("pk_fields") or []),
+                        call.api_name, call.trade_date, loader)
+            logger.info(f"{description}已存储: {len(df)} 条")
+        elif df is not None and call.trade_date:
+            self._mark_empty(call.api_name, call.trade_date, loader)
         
         return df
     
-    def extract_adj_factor_by_date(self, trade_date: str) -> pd.DataFrame:
-        """按交易日提取复权因子"""
-        logger.info(f"提取复权因子: {trade_date}")
-        df = self.client.fetch_by_trade_date("adj_factor", trade_date=trade_date)
+    def extract_date(self, api_name: str, trade_date: str, fields: List[str] = None,
+                     loader=None) -> pd.DataFrame:
+        """按交易日提取一个接口（日期参数名取注册表 date_param，fields 为列投影，loader 为批量加载器）"""
+        return self.fetch_call(self._date_call(api_name, trade_date), fields, loader)
+    
+    def _date_call(self, api_name: str, trade_date: str) -> ApiCall:
+        """按交易日的一次调用（日期参数名取注册表 date_param）"""
+        param = self._config(api_name).get("date_param", "trade_date")
+        return ApiCall(api_name, {param: trade_date}, trade_date)
+    
+    def extract_daily_by_date(self, trade_date: str, fields: List[str] = None,
+                              loader=None) -> pd.DataFrame:
+        """按交易日提取日线行情（推荐模式，fields 为列投影，loader 为批量加载器）"""
+        return self.extract_date("daily", trade_date, fields, loader)
+    
+    def extract_daily_basic_by_date(self, trade_date: str, fields: List[str] = None,
+                                    loader=None) -> pd.DataFrame:
+        """按交易日提取每日指标（fields 为列投影）"""
+        return self.extract_date("daily_basic", trade_date, fields, loader)
+    
+    def extract_adj_factor_by_date(self, trade_date: str, fields: List[str] = None,
+                                   loader=None) -> pd.DataFrame:
+        """按交易日提取复权因子（fields 为列投影）"""
+        return self.extract_date("adj_factor", trade_date, fields, loader)
+    
+    def extract_income_by_period(self, period: str, start_date: str = None, end_date: str = None,
+                                 fields: List[str] = None, store: bool = True) -> pd.DataFrame:
+        """提取利润表（按报告期或公告日，fields 为列投影，store=False 时不写原始表）"""
+        if period == 'ann_date' and start_date and end_date:
+            params = {"start_date": start_date, "end_date": end_date}
+        else:
+            params = {"period": period}
+        return self.fetch_call(ApiCall("income", params), fields, store=store)
+    
+    def _window(self, api_name: str, start_date: str = None, end_date: str = None) -> Tuple[str, str]:
+        """拉取区间：未给 start_date 时从水位的下一天续拉（公告日接口从水位回看 lookback_days 天）
         
-        if df is not None and len(df) > 0:
-            db.execute("CREATE TABLE IF NOT EXISTS raw_adj_factor AS SELECT * FROM df WHERE 1=0")
-            db.upsert_dataframe(df, "raw_adj_factor", pk_fields=["ts_code", "trade_date"])
-            self.update_watermark("adj_factor", trade_date, len(df))
-            logger.info(f"复权因子已存储: {len(df)} 条")
+        按交易日的接口从完成台账中最早的交易日起算，plan 再按台账只取其中缺失的交易日，
+        水位之前失败过的日期也会补拉。
+        """
+        config = self._config(api_name)
+        end_date = end_date or datetime.now().strftime("%Y%m%d")
+        if start_date is None:
+            watermark = self.get_last_watermark(api_name)
+            first_completed = (first_completed_date(api_name)
+                               if config.get("increment_strategy") == BY_TRADE_DATE else None)
+            if first_completed is not None:
+                start_date = first_completed
+            elif watermark is None:
+                start_date = DEFAULT_START_DATE
+            elif config.get("increment_strategy") == BY_ANN_DATE_WITH_LOOKBACK:
+                start_date = shift_date(watermark, -int(config.get("lookback_days", 0)))
+            else:
+                start_date = shift_date(watermark, 1)
+        return start_date, end_date
+    
+    @staticmethod
+    def _universe(source_api: str) -> List[str]:
+        """by_ts_code 的代码全集（code_source 接口表中的 ts_code）"""
+        table_name = table_for_api(source_api)
+        if not db.table_exists(table_name):
+            raise ValueError(f"{table_name} 不存在，请先拉取 {source_api}")
+        return db.query(f"SELECT DISTINCT ts_code FROM {table_name} ORDER BY ts_code")["ts_code"].tolist()
+    
+    def plan(self, api_name: str, start_date: str = None, end_date: str = None,
+             codes: List[str] = None) -> CallPlan:
+        """按注册表 increment_strategy 规划区间内的调用，附估计调用数与耗时
+        
+        codes 对 by_ts_code 接口限定代码（默认取 code_source 全集）；对 slice_by_code 的按交易日接口，
+        由 planner 比较按交易日与按代码两种切法的调用数后选择。未给 start_date 时按交易日的接口
+        只规划完成台账中缺失的交易日。
+        """
+        config = self._config(api_name)
+        resume = start_date is None
+        strategy = config.get("increment_strategy")
+        if strategy not in STRATEGIES:
+            raise ValueError(f"接口 {api_name} 未配置可用的 increment_strategy: {strategy}")
+        if strategy == SNAPSHOT:
+            return CallPlan(api_name, SNAPSHOT, [ApiCall(api_name)], 1)
+        
+        start_date, end_date = self._window(api_name, start_date, end_date)
+        if start_date > end_date:
+            return CallPlan(api_name, strategy, [], 0)
         
+        if strategy == BY_TRADE_DATE:
+            if resume and db.table_exists("trade_cal"):
+                trade_dates = missing_dates([api_name], start_date, end_date)[api_name]
+            else:
+                trade_dates = self.get_trading_dates(start_date, end_date)
+            if codes is not None and config.get("slice_by_code"):
+                return plan_slicing(api_name, config, trade_dates, codes)
+            param = config.get("date_param", "trade_date")
+            calls = [ApiCall(api_name, {param: trade_date}, trade_date) for trade_date in trade_dates]
+        elif strategy == BY_TS_CODE:
+            codes = codes if codes is not None else self._universe(config.get("code_source", "stock_basic"))
+            calls = [ApiCall(api_name, {"ts_code": ts_code, "start_date": start_date, "end_date": end_date})
+                     for ts_code in codes]
+        else:
+            windows = date_windows(start_date, end_date, int(config.get("window_days", DEFAULT_WINDOW_DAYS)))
+            # 公告日回看窗口每次都要重新拉取，不能读到缓存中更正前的结果
+            use_cache = strategy != BY_ANN_DATE_WITH_LOOKBACK
+            calls = [ApiCall(api_name, {"start_date": window_start, "end_date": window_end}, use_cache=use_cache)
+                     for window_start, window_end in windows]
+        return CallPlan(api_name, strategy, calls, len(calls))
+    
+    def _fetch_frame(self, call: ApiCall, fields: List[str], loader) -> pd.DataFrame:
+        """任务图节点：拉取失败时抛出异常，使该调用记为失败（而不是把 None 当作无数据交给下游）"""
+        df = self.fetch_call(call, fields, loader)
+        if df is None:
+            raise RuntimeError(f"{call.label} 拉取失败")
         return df
     
-    def extract_income_by_period(self, period: str, start_date: str = None, end_date: str = None) -> pd.DataFrame:
-        """提取利润表（按报告期或公告日）"""
-        logger.info(f"提取利润表: period={period}, {start_date}~{end_date}")
+    def _fetch_rows(self, call: ApiCall, fields: List[str], loader) -> int:
+        """任务图节点：返回拉取的行数"""
+        return len(self._fetch_frame(call, fields, loader))
+    
+    def fetch_date(self, api_name: str, trade_date: str, fields: List[str] = None,
+                   loader=None) -> pd.DataFrame:
+        """任务图节点：按交易日提取一个接口，拉取失败时抛出异常（该交易日的任务图随之失败）"""
+        return self._fetch_frame(self._date_call(api_name, trade_date), fields, loader)
+    
+    def extract(self, api_name: str, start_date: str = None, end_date: str = None,
+                fields: List[str] = None, codes: List[str] = None) -> Dict[str, int]:
+        """按注册表通用拉取一个接口，返回 {"calls": 调用数, "failed": 失败数, "rows": 行数}
         
-        if period == 'ann_date' and start_date and end_date:
-            df = self.client.fetch("income", start_date=start_date, end_date=end_date)
-        else:
-            df = self.client.fetch("income", period=period)
+        调用经 PipelineExecutor 并发执行（共享全局限频器），结果由 BatchLoader 攒批单事务写入。
+        按交易日的调用逐日推进水位并登记完成台账；其它规划方式只在全部调用成功后把水位推进到
+        end_date，中间有窗口失败时下次仍从原水位续拉，不会留下缺口。拉取前日志输出计划
+        （切片方式、估计调用数与当前限频下的耗时），只看计划不拉取用 plan()。
+        """
+        return self.extract_many([api_name], start_date, end_date, fields, codes)[api_name]
+    
+    def extract_many(self, api_names: List[str], start_date: str = None, end_date: str = None,
+                     fields: List[str] = None, codes: List[str] = None) -> Dict[str, Dict[str, int]]:
+        """多个接口的调用放进同一个执行器并发拉取，返回 {api_name: extract 的结果}
         
-        if df is not None and len(df) > 0:
-            db.execute("CREATE TABLE IF NOT EXISTS raw_income AS SELECT * FROM df WHERE 1=0")
-            db.upsert_dataframe(df, "raw_income", pk_fields=["ts_code", "end_date", "ann_date"])
-            logger.info(f"利润表已存储: {len(df)} 条")
+        未给 start_date 时各接口分别从自己的水位续拉（按交易日的接口按完成台账补拉缺失的交易日）。
+        """
+        windows = {api_name: self._window(api_name, start_date, end_date) for api_name in api_names}
+        plans = {api_name: self.plan(api_name, start_date, end_date, codes) for api_name in api_names}
+        for api_name, plan in plans.items():
+            logger.info(f"{windows[api_name][0]}~{windows[api_name][1]} {plan.describe()}")
         
-        return df
+        owners: Dict[TaskGraph, str] = {}
+        
+        def graphs(batch: BatchLoader):
+            for api_name, plan in plans.items():
+                for call in plan.calls:
+                    graph = TaskGraph(call.label).add("fetch", self._fetch_rows, args=(call, fields, batch))
+                    owners[graph] = api_name
+                    yield graph
+        
+        summaries = {api_name: {"calls": len(plan.calls), "failed": 0, "rows": 0}
+                     for api_name, plan in plans.items()}
+        # 每个任务图只有一次调用：在途数放宽到线程数，否则并发度受 PIPELINE_MAX_IN_FLIGHT 限制
+        executor = PipelineExecutor(max_in_flight=max(PIPELINE_MAX_IN_FLIGHT, FETCH_MAX_WORKERS))
+        with BatchLoader() as batch, executor:
+            for graph, results, error in executor.stream(graphs(batch)):
+                summary = summaries[owners.pop(graph)]
+                if error is not None:
+                    summary["failed"] += 1
+                    logger.error(f"{graph.name} 失败: {error.cause}")
+                else:
+                    summary["rows"] += results["fetch"]
+        
+        for api_name, plan in plans.items():
+            summary = summaries[api_name]
+            # 只拉了部分代码时不推进水位（水位表示全集已拉到 end_date）
+            incremental = codes is None and plan.slicing not in (BY_TRADE_DATE, SNAPSHOT)
+            if plan.calls and not summary["failed"] and incremental:
+                advance_watermark(api_name, windows[api_name][1], summary["rows"])
+            logger.info(f"{api_name} 拉取完成: {summary}")
+        
+        db.sync_snapshot()
+        return summaries
+    
+    def extract_financials(self, start_date: str = None, end_date: str = None) -> Dict[str, Dict[str, int]]:
+        """财务报表增量刷新：by_ann_date_with_lookback 的接口从水位回看 lookback_days 天的公告日，
+        各接口的窗口一起并发拉取；库内行哈希未变化的行不重写，只写入新公告与更正的行"""
+        return self.extract_many(apis_with_strategy(BY_ANN_DATE_WITH_LOOKBACK), start_date, end_date)
     
     def get_trading_dates(self, start_date: str, end_date: str) -> List[str]:
-        """获取日期范围内的所有交易日"""
-        df = db.query("""
-            SELECT cal_date FROM trade_cal
-            WHERE cal_date >= ? AND cal_date <= ? AND is_open = 1
-            ORDER BY cal_date
-        """, (start_date, end_date))
+        """获取日期范围内的所有交易日（YYYYMMDD 字符串）"""
+        if not db.table_exists("trade_cal"):
+            return []
+        
+        if db.get_column_types("trade_cal").get("cal_date") == "DATE":
+            df = db.query("""
+                SELECT strftime(cal_date, '%Y%m%d') AS cal_date FROM trade_cal
+                WHERE cal_date >= CAST(? AS DATE) AND cal_date <= CAST(? AS DATE) AND is_open = 1
+                ORDER BY 1
+            """, (to_iso_date(start_date), to_iso_date(end_date)))
+        else:
+            # 迁移前的旧表（cal_date 为 YYYYMMDD 字符串）
+            df = db.query("""
+                SELECT cal_date FROM trade_cal
+                WHERE cal_date >= ? AND cal_date <= ? AND is_open = 1
+                ORDER BY cal_date
+            """, (start_date, end_date))
         
         if len(df) > 0:
             return df['cal_date'].tolist()
@@ -1,6 +1,32 @@
 """数据加载器（写入服务层）"""
+import threading
+from datetime import datetime
+from typing import Dict, List, Set, Tuple
+import pandas as pd
+import pyarrow as pa
 from loguru import logger
+from config import BATCH_MAX_ROWS, BATCH_MAX_BYTES
 from src.core import db
+from src.core.lake import raw_lake
+
+
+def advance_watermark(api_name: str, watermark: str, row_count: int):
+    """推进水位（只前进不后退：回填更早的日期不会把水位拉回去）"""
+    db.advance_watermark(api_name, watermark, row_count)
+
+
+def ledger_batch(entries: List[Tuple[str, str, int]]) -> tuple:
+    """完成台账的写入批次 (表名, DataFrame, 主键)，entries: [(api_name, trade_date, 行数), ...]"""
+    df = pd.DataFrame(entries, columns=["api_name", "trade_date", "row_count"])
+    df["completed_at"] = datetime.now()
+    return "etl_ledger", df, ["api_name", "trade_date"]
+
+
+def record_completion(entries: List[Tuple[str, str, int]]):
+    """登记完成台账（数据提交之后调用）"""
+    if entries:
+        table_name, df, pk_fields = ledger_batch(entries)
+        db.upsert_dataframe(df, table_name, pk_fields=pk_fields)
 
 
 class DataLoader:
@@ -33,3 +59,159 @@ class DataLoader:
             db.insert_dataframe(df, "funda_panel", if_exists="append")
         
         logger.info(f"已加载 {len(df)} 行到 funda_panel")
+
+
+class BatchLoader:
+    """批量加载器（多日回填时攒批，单事务写入）
+    
+    add() 把每个交易日的结果转成 Arrow Table 放进缓冲区；累计行数或字节数达到阈值时
+    flush()：同一张表的多个分片 concat 成一张表（只拼接 chunk，不复制数据），
+    所有表在一个事务内 upsert（RAW_STORAGE=parquet 时原始表改为按分区写入湖中）。
+    完成台账（etl_ledger）与数据在同一事务内写入；水位在提交成功后推进。
+    失败则整批回滚、台账与水位都不动，断点续传回填时会重新拉取这些日期。
+    
+    一个交易日还有下游步骤（如面板加载）时，先 hold(trade_date)：该日的台账与水位暂存，
+    下游成功后 release(trade_date) 随下一批提交，失败则 discard(trade_date) 丢弃。
+    register_securities() 缓冲的证券在 flush 时串行登记进证券主表，避免并发写冲突。
+    
+    用法：
+        with BatchLoader() as batch:
+            for trade_date in trade_dates:
+                extractor.extract_daily_by_date(trade_date, loader=batch)
+    """
+    
+    def __init__(self, max_rows: int = BATCH_MAX_ROWS, max_bytes: int = BATCH_MAX_BYTES):
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        
+        # table_name -> [Arrow Table, ...]
+        self._tables: Dict[str, List[pa.Table]] = {}
+        self._pk_fields: Dict[str, List[str]] = {}
+        # api_name -> (最大水位值, 累计行数)
+        self._watermarks: Dict[str, Tuple[str, int]] = {}
+        # (api_name, trade_date) -> 行数（完成台账）
+        self._completed: Dict[Tuple[str, str], int] = {}
+        # 暂缓提交的交易日 -> [(api_name, 行数), ...]
+        self._held: Dict[str, List[Tuple[str, int]]] = {}
+        # 待登记进证券主表的 ts_code
+        self._securities: Set[str] = set()
+        self._rows = 0
+        self._bytes = 0
+        self._lock = threading.RLock()
+        
+        self.stats = {"batches": 0, "rows": 0}
+    
+    def add(self, table_name: str, df, pk_fields: List[str],
+            api_name: str = None, watermark: str = None):
+        """缓冲一个分片（api_name + watermark 表示写入成功后要推进的水位与登记的台账日期）"""
+        if df is None or len(df) == 0:
+            return
+        
+        table = df if isinstance(df, pa.Table) else pa.Table.from_pandas(df, preserve_index=False)
+        
+        with self._lock:
+            self._tables.setdefault(table_name, []).append(table)
+            self._pk_fields[table_name] = pk_fields
+            self._rows += table.num_rows
+            self._bytes += table.nbytes
+            
+            if api_name and watermark:
+                self.complete(api_name, watermark, table.num_rows)
+            
+            if self._rows >= self.max_rows or self._bytes >= self.max_bytes:
+                self.flush()
+    
+    def complete(self, api_name: str, trade_date: str, row_count: int = 0):
+        """登记一个交易日的完成台账（row_count > 0 时同时推进水位；暂缓中的交易日先暂存）"""
+        with self._lock:
+            if trade_date in self._held:
+                self._held[trade_date].append((api_name, row_count))
+                return
+            
+            key = (api_name, trade_date)
+            self._completed[key] = self._completed.get(key, 0) + row_count
+            if row_count > 0:
+                current, rows = self._watermarks.get(api_name, (trade_date, 0))
+                self._watermarks[api_name] = (max(current, trade_date), rows + row_count)
+    
+    def hold(self, trade_date: str):
+        """暂缓提交该交易日的台账与水位，直到 release / discard"""
+        with self._lock:
+            self._held.setdefault(trade_date, [])
+    
+    def release(self, trade_date: str):
+        """该交易日的下游步骤已成功：暂存的台账与水位随下一批提交"""
+        with self._lock:
+            for api_name, row_count in self._held.pop(trade_date, []):
+                self.complete(api_name, trade_date, row_count)
+    
+    def discard(self, trade_date: str):
+        """该交易日的下游步骤失败：丢弃暂存的台账与水位（数据照常写入，断点续传时重新拉取）"""
+        with self._lock:
+            if self._held.pop(trade_date, None):
+                logger.warning(f"{trade_date} 未完成，完成台账与水位不推进")
+    
+    def register_securities(self, ts_codes: list):
+        """缓冲待登记进证券主表的 ts_code（flush 时统一登记）"""
+        with self._lock:
+            self._securities.update(code for code in ts_codes if code)
+    
+    def pending_rows(self) -> int:
+        """缓冲区中尚未写入的行数"""
+        with self._lock:
+            return self._rows
+    
+    def flush(self) -> Dict[str, int]:
+        """单事务写入缓冲区全部数据，提交后推进水位，返回 {表名: 行数}"""
+        with self._lock:
+            if not self._tables and not self._completed and not self._securities:
+                return {}
+            
+            tables, self._tables = self._tables, {}
+            watermarks, self._watermarks = self._watermarks, {}
+            completed, self._completed = self._completed, {}
+            securities, self._securities = self._securities, set()
+            rows, self._rows, self._bytes = self._rows, 0, 0
+            
+            batches = [
+                (name, pa.concat_tables(parts, promote_options="permissive"), self._pk_fields[name])
+                for name, parts in tables.items()
+            ]
+            
+            try:
+                # 证券主表只在这里登记：同一时刻只有一个写入者
+                if securities:
+                    db.register_securities(sorted(securities))
+                
+                # 湖中的原始表按分区原子替换（幂等），先于库内事务写入
+                written = {}
+                for name, table, pk_fields in batches:
+                    if raw_lake.manages(name):
+                        written[name] = raw_lake.write(name, table, pk_fields=pk_fields)
+                db_batches = [b for b in batches if not raw_lake.manages(b[0])]
+                if completed:
+                    db_batches.append(ledger_batch([(api, date, count) for (api, date), count in completed.items()]))
+                written.update(db.upsert_tables(db_batches))
+            except Exception as e:
+                logger.error(f"批量写入失败，已回滚 {rows} 行（水位未推进）: {e}")
+                raise
+            
+            for api_name, (watermark, row_count) in watermarks.items():
+                advance_watermark(api_name, watermark, row_count)
+            
+            self.stats["batches"] += 1
+            self.stats["rows"] += rows
+            logger.info(f"批量提交完成: {rows} 行, {len(batches)} 张表")
+            return written
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        # 已成功拉取的分片照常提交；异常由调用方继续处理
+        with self._lock:
+            for trade_date in [d for d, entries in self._held.items() if entries]:
+                logger.warning(f"{trade_date} 未确认完成，完成台账与水位不推进")
+            self._held.clear()
+        self.flush()
+        return False
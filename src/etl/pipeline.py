@@ -0,0 +1,206 @@
+"""ETL任务图执行器（提取/转换/加载/面板构建作为声明了依赖的节点）
+
+节点分两类：
+- io：接口拉取、写库，走线程池（线程数 FETCH_MAX_WORKERS，共享全局限频器）
+- cpu：规范化、合并等计算，走进程池（PIPELINE_CPU_WORKERS，为 0 时与 io 共用线程池）
+
+多个任务图（如每个交易日一个）流水线执行：同时在途的任务图最多 PIPELINE_MAX_IN_FLIGHT 个，
+第 N 天的转换/加载与第 N+1 天的拉取重叠；在途数达到上限时不再接入新图（背压）。
+
+    graph = TaskGraph("20240102")
+    graph.add("daily", extractor.extract_daily_by_date, args=("20240102",))
+    graph.add("normalize", DataTransformer.normalize_daily, deps=["daily"], kind=CPU)
+    graph.add("load", DataLoader.load_to_daily_panel, deps=["normalize"])
+    PipelineExecutor().run(graph)
+
+节点函数的位置参数为 args 之后依次跟上各依赖节点的结果（按 deps 顺序）；
+cpu 节点的函数与参数需要可以 pickle（模块级函数、类的静态/类方法）。
+"""
+import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from config import FETCH_MAX_WORKERS, PIPELINE_CPU_WORKERS, PIPELINE_MAX_IN_FLIGHT
+
+IO = "io"
+CPU = "cpu"
+
+
+class TaskError(Exception):
+    """任务图中有节点失败（其下游节点不再执行）"""
+    
+    def __init__(self, graph: str, task: str, cause: Exception):
+        super().__init__(f"{graph or '任务图'} 节点 {task} 失败: {cause}")
+        self.graph = graph
+        self.task = task
+        self.cause = cause
+
+
+@dataclass
+class Task:
+    """任务图节点"""
+    name: str
+    func: Callable
+    deps: Tuple[str, ...] = ()
+    args: tuple = ()
+    kwargs: Dict[str, Any] = field(default_factory=dict)
+    kind: str = IO
+
+
+class TaskGraph:
+    """有向无环任务图（节点只能依赖已添加的节点，因此不会成环）"""
+    
+    def __init__(self, name: str = ""):
+        self.name = name
+        self.tasks: Dict[str, Task] = {}
+    
+    def add(self, name: str, func: Callable, deps: Iterable[str] = (), args: tuple = (),
+            kwargs: Dict[str, Any] = None, kind: str = IO) -> "TaskGraph":
+        """添加节点，返回自身便于链式调用"""
+        if name in self.tasks:
+            raise ValueError(f"节点重复: {name}")
+        if kind not in (IO, CPU):
+            raise ValueError(f"未知节点类型: {kind}")
+        deps = tuple(deps)
+        unknown = [dep for dep in deps if dep not in self.tasks]
+        if unknown:
+            raise ValueError(f"节点 {name} 依赖未定义的节点: {unknown}")
+        
+        self.tasks[name] = Task(name, func, deps, tuple(args), dict(kwargs or {}), kind)
+        return self
+
+
+class _GraphRun:
+    """单个任务图的执行状态"""
+    
+    def __init__(self, graph: TaskGraph):
+        self.graph = graph
+        self.results: Dict[str, Any] = {}
+        self.waiting = dict(graph.tasks)
+        self.running = 0
+        self.error: Optional[TaskError] = None
+    
+    def ready(self) -> List[Task]:
+        """依赖都已完成、可以提交的节点（失败后不再提交新节点）"""
+        if self.error is not None:
+            return []
+        tasks = [task for task in self.waiting.values() if all(dep in self.results for dep in task.deps)]
+        for task in tasks:
+            del self.waiting[task.name]
+        return tasks
+    
+    @property
+    def finished(self) -> bool:
+        return self.running == 0 and (self.error is not None or not self.waiting)
+
+
+class PipelineExecutor:
+    """任务图执行器（线程池跑 io 节点，进程池跑 cpu 节点，用完 close 或用 with）"""
+    
+    def __init__(self, io_workers: int = FETCH_MAX_WORKERS, cpu_workers: int = PIPELINE_CPU_WORKERS,
+                 max_in_flight: int = PIPELINE_MAX_IN_FLIGHT):
+        self.io_workers = max(1, io_workers)
+        self.cpu_workers = max(0, cpu_workers)
+        self.max_in_flight = max(1, max_in_flight)
+        
+        self._io_pool: Optional[ThreadPoolExecutor] = None
+        self._cpu_pool: Optional[ProcessPoolExecutor] = None
+        
+        self.stats = {"graphs": 0, "failed": 0, "tasks": 0}
+    
+    def _pool(self, kind: str):
+        """按节点类型取执行池（懒创建）"""
+        if kind == CPU and self.cpu_workers > 0:
+            if self._cpu_pool is None:
+                # spawn：父进程里有数据库连接和多个线程，fork 不安全
+                self._cpu_pool = ProcessPoolExecutor(max_workers=self.cpu_workers,
+                                                     mp_context=multiprocessing.get_context("spawn"))
+            return self._cpu_pool
+        
+        if self._io_pool is None:
+            self._io_pool = ThreadPoolExecutor(max_workers=self.io_workers, thread_name_prefix="etl-io")
+        return self._io_pool
+    
+    def run(self, graph: TaskGraph) -> Dict[str, Any]:
+        """执行单个任务图，返回 {节点名: 结果}；有节点失败时抛出 TaskError"""
+        for _, results, error in self.stream([graph]):
+            if error is not None:
+                raise error
+            return results
+        return {}
+    
+    def stream(self, graphs: Iterable[TaskGraph]) -> Iterator[Tuple[TaskGraph, Dict[str, Any], Optional[TaskError]]]:
+        """流水线执行多个任务图，按完成顺序产出 (任务图, 结果, 错误)
+        
+        graphs 可以是惰性生成器：只有在途任务图少于 max_in_flight 时才取下一个。
+        """
+        graphs = iter(graphs)
+        exhausted = False
+        active: List[_GraphRun] = []
+        futures: Dict[Future, Tuple[_GraphRun, Task]] = {}
+        
+        def submit_ready(run: _GraphRun):
+            for task in run.ready():
+                args = task.args + tuple(run.results[dep] for dep in task.deps)
+                try:
+                    future = self._pool(task.kind).submit(task.func, *args, **task.kwargs)
+                except Exception as e:
+                    # 进程池已损坏等：记为该图失败，不影响调度循环
+                    run.error = run.error or TaskError(run.graph.name, task.name, e)
+                    return
+                futures[future] = (run, task)
+                run.running += 1
+        
+        try:
+            while True:
+                # 接入新任务图，直到在途数达到上限（背压）
+                while not exhausted and len(active) < self.max_in_flight:
+                    graph = next(graphs, None)
+                    if graph is None:
+                        exhausted = True
+                        break
+                    run = _GraphRun(graph)
+                    active.append(run)
+                    submit_ready(run)
+                
+                for run in [run for run in active if run.finished]:
+                    active.remove(run)
+                    self.stats["graphs"] += 1
+                    self.stats["failed"] += run.error is not None
+                    yield run.graph, run.results, run.error
+                
+                if not futures:
+                    if exhausted and not active:
+                        break
+                    continue
+                
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    run, task = futures.pop(future)
+                    run.running -= 1
+                    self.stats["tasks"] += 1
+                    try:
+                        run.results[task.name] = future.result()
+                    except Exception as e:
+                        if run.error is None:
+                            run.error = TaskError(run.graph.name, task.name, e)
+                        continue
+                    submit_ready(run)
+        finally:
+            # 消费方提前退出：未开始的节点不再执行
+            for future in futures:
+                future.cancel()
+    
+    def close(self):
+        """关闭执行池（等待已提交的节点结束）"""
+        for pool in (self._io_pool, self._cpu_pool):
+            if pool is not None:
+                pool.shutdown(wait=True)
+        self._io_pool = self._cpu_pool = None
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
@@ -0,0 +1,189 @@
+"""调用规划：把 (代码 x 日期) 的拉取需求切成接口调用，并按成本选择切片方式
+
+同时支持按交易日和按代码拉取的接口（注册表 slice_by_code: true）有两种切法：
+- 按交易日：每天一次调用拿全市场，每次返回当天的全部证券，超过 max_rows 还要翻页
+- 按代码：每个代码一次调用拿一段日期，日期区间按 max_rows 打包（每段不超过 max_rows - 1 个交易日，
+  返回行数不会触发翻页）
+plan_slicing 估算两种切法的调用数（含翻页），取调用数少的一种；拉取前可用 CallPlan.describe()
+查看估计调用数与当前限频下的耗时。
+    plan = plan_slicing("daily", config, trade_dates, ["000001.SZ", "600000.SH"])
+    logger.info(plan.describe())   # daily: 按代码 2 次调用（按交易日需 730 次），预计 0.1 秒
+"""
+import math
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+import pandas as pd
+from config import FETCH_MAX_WORKERS, load_endpoint_registry
+from src.core import db, rate_limiter
+from src.core.schema import to_iso_date
+
+# 调用规划方式（注册表 increment_strategy）
+BY_TRADE_DATE = "by_trade_date"
+BY_DATE_RANGE = "by_date_range"
+BY_ANN_DATE_WITH_LOOKBACK = "by_ann_date_with_lookback"
+BY_TS_CODE = "by_ts_code"
+SNAPSHOT = "snapshot"
+STRATEGIES = (BY_TRADE_DATE, BY_DATE_RANGE, BY_ANN_DATE_WITH_LOOKBACK, BY_TS_CODE, SNAPSHOT)
+
+SLICING_NAMES = {BY_TRADE_DATE: "按交易日", BY_TS_CODE: "按代码", BY_DATE_RANGE: "按日期区间",
+                 BY_ANN_DATE_WITH_LOOKBACK: "按公告日区间", SNAPSHOT: "整表"}
+
+# 估算耗时用的单次调用响应时间（秒）：限频不是瓶颈时，耗时由并发线程数决定
+EST_CALL_SECONDS = 0.5
+
+
+def apis_with_strategy(strategy: str) -> List[str]:
+    """注册表中配置为某种规划方式的接口"""
+    return [api_name for api_name, config in load_endpoint_registry().items()
+            if (config or {}).get("increment_strategy") == strategy]
+
+
+def shift_date(value: str, days: int) -> str:
+    """YYYYMMDD 日期前后平移若干天"""
+    day = datetime.strptime(to_iso_date(value)[:10], "%Y-%m-%d") + timedelta(days=days)
+    return day.strftime("%Y%m%d")
+
+
+def date_windows(start_date: str, end_date: str, days: int) -> List[Tuple[str, str]]:
+    """把 start_date~end_date 切成每段最多 days 天的闭区间"""
+    windows = []
+    while start_date <= end_date:
+        window_end = min(shift_date(start_date, days - 1), end_date)
+        windows.append((start_date, window_end))
+        start_date = shift_date(window_end, 1)
+    return windows
+
+
+def pack_date_ranges(trade_dates: List[str], days_per_call: int) -> List[Tuple[str, str]]:
+    """把有序交易日按每段 days_per_call 个打包成 (起, 止) 区间"""
+    days_per_call = max(1, days_per_call)
+    return [(trade_dates[i], trade_dates[min(i + days_per_call, len(trade_dates)) - 1])
+            for i in range(0, len(trade_dates), days_per_call)]
+
+
+@dataclass
+class ApiCall:
+    """一次规划好的接口调用"""
+    api_name: str
+    params: Dict[str, str] = field(default_factory=dict)
+    # 按交易日切片时为该交易日：写入后推进水位并登记完成台账
+    trade_date: Optional[str] = None
+    # False 时绕过响应缓存（回看窗口要拿到更正后的数据，已关闭的日期区间在缓存中永不过期）
+    use_cache: bool = True
+    
+    @property
+    def label(self) -> str:
+        params = " ".join(f"{key}={value}" for key, value in self.params.items())
+        return f"{self.api_name}({params})"
+
+
+@dataclass
+class CallPlan:
+    """调用计划与成本估计"""
+    api_name: str
+    slicing: str
+    calls: List[ApiCall]
+    # 估计调用数（含超过 max_rows 的翻页）
+    estimated_calls: int
+    # 各候选切片方式的估计调用数
+    alternatives: Dict[str, int] = field(default_factory=dict)
+    
+    @property
+    def estimated_seconds(self) -> float:
+        """当前限频与并发线程数下的预计耗时"""
+        return estimate_seconds(self.api_name, self.estimated_calls)
+    
+    def describe(self) -> str:
+        others = "，".join(f"{SLICING_NAMES[slicing]}需 {calls} 次"
+                          for slicing, calls in self.alternatives.items() if slicing != self.slicing)
+        others = f"（{others}）" if others else ""
+        return (f"{self.api_name}: {SLICING_NAMES[self.slicing]} {self.estimated_calls} 次调用{others}，"
+                f"预计 {self.estimated_seconds:.1f} 秒")
+
+
+def estimate_seconds(api_name: str, calls: int, workers: int = FETCH_MAX_WORKERS) -> float:
+    """预计耗时：限频下的最短时间与并发线程数下的响应时间取大者"""
+    return max(rate_limiter.estimate_seconds(calls, api_name),
+               calls * EST_CALL_SECONDS / max(1, workers))
+
+
+def rows_per_date(api_name: str, default: int) -> float:
+    """按交易日调用一次返回的行数：取完成台账中该接口的历史均值，没有记录时用 default"""
+    if db.table_exists("etl_ledger"):
+        result = db.query("SELECT avg(row_count) AS rows FROM etl_ledger WHERE api_name = ? AND row_count > 0",
+                          (api_name,))
+        if len(result) > 0 and pd.notna(result.iloc[0]["rows"]):
+            return float(result.iloc[0]["rows"])
+    return float(default)
+
+
+def _cal_date_expr() -> str:
+    """trade_cal.cal_date 的 DATE 表达式（兼容迁移前的 YYYYMMDD 字符串列）"""
+    if db.get_column_types("trade_cal").get("cal_date") == "DATE":
+        return "cal_date"
+    return "CAST(strptime(cal_date, '%Y%m%d') AS DATE)"
+
+
+def missing_dates(api_names: List[str], start_date: str, end_date: str,
+                  resume: bool = True) -> Dict[str, List[str]]:
+    """各接口在区间内缺失的交易日（开市日 x 接口，一次反连接减去完成台账 etl_ledger）
+    
+    resume=False 时不看台账，返回区间内全部交易日。
+    """
+    if not db.table_exists("trade_cal"):
+        raise ValueError("trade_cal 不存在，请先拉取交易日历")
+    
+    ledger = """
+        ANTI JOIN etl_ledger l ON l.api_name = a.api_name AND l.trade_date = c.cal_date
+    """ if resume else ""
+    df = db.query(f"""
+        SELECT a.api_name, strftime(c.cal_date, '%Y%m%d') AS trade_date
+        FROM (
+            SELECT DISTINCT {_cal_date_expr()} AS cal_date FROM trade_cal
+            WHERE is_open = 1
+        ) c
+        CROSS JOIN (SELECT unnest(CAST(? AS VARCHAR[])) AS api_name) a
+        {ledger}
+        WHERE c.cal_date BETWEEN CAST(? AS DATE) AND CAST(? AS DATE)
+        ORDER BY 1, 2
+    """, (list(api_names), to_iso_date(start_date), to_iso_date(end_date)))
+    
+    missing = {api_name: [] for api_name in api_names}
+    for api_name, trade_date in df.itertuples(index=False):
+        missing[api_name].append(trade_date)
+    return missing
+
+
+def first_completed_date(api_name: str) -> Optional[str]:
+    """完成台账中该接口最早的交易日（没有记录时为 None）"""
+    if not db.table_exists("etl_ledger"):
+        return None
+    result = db.query("SELECT strftime(min(trade_date), '%Y%m%d') AS first FROM etl_ledger WHERE api_name = ?",
+                      (api_name,))
+    if len(result) > 0 and pd.notna(result.iloc[0]["first"]):
+        return result.iloc[0]["first"]
+    return None
+
+
+def plan_slicing(api_name: str, config: dict, trade_dates: List[str], codes: List[str]) -> CallPlan:
+    """codes x trade_dates 的拉取需求：比较按交易日与按代码两种切法的调用数，取少者（相同时按交易日）"""
+    max_rows = int(config.get("max_rows") or 5000)
+    param = config.get("date_param", "trade_date")
+    
+    # 按交易日：每天返回全市场（台账均值，缺省按一页计），超过 max_rows 翻页
+    pages_per_date = max(1, math.ceil(rows_per_date(api_name, max_rows - 1) / max_rows))
+    by_date = len(trade_dates) * pages_per_date
+    
+    # 按代码：每个代码每个交易日一行，区间打包到 max_rows - 1 个交易日
+    ranges = pack_date_ranges(trade_dates, max_rows - 1)
+    by_code = len(codes) * len(ranges)
+    
+    alternatives = {BY_TRADE_DATE: by_date, BY_TS_CODE: by_code}
+    if by_code < by_date:
+        calls = [ApiCall(api_name, {"ts_code": ts_code, "start_date": start, "end_date": end})
+                 for ts_code in codes for start, end in ranges]
+        return CallPlan(api_name, BY_TS_CODE, calls, by_code, alternatives)
+    
+    calls = [ApiCall(api_name, {param: trade_date}, trade_date) for trade_date in trade_dates]
+    return CallPlan(api_name, BY_TRADE_DATE, calls, by_date, alternatives)
@@ -1,5 +1,9 @@
 """数据转换器（清洗、规范化）"""
+from typing import List
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
 from loguru import logger
 
 
@@ -83,6 +87,26 @@ class DataTransformer:
         
         return merged
     
+    @classmethod
+    def merge_daily_panel(cls, daily_df: pd.DataFrame, basic_df: pd.DataFrame,
+                          adj_df: pd.DataFrame) -> pd.DataFrame:
+        """合并日线、每日指标与复权因子（以日线为左表）"""
+        panel = daily_df.copy()
+        
+        if basic_df is not None and len(basic_df) > 0:
+            panel = pd.merge(panel, basic_df, on=['ts_code', 'trade_date'], how='left', suffixes=('', '_basic'))
+        
+        if adj_df is not None and len(adj_df) > 0:
+            panel = cls.compute_adj_price(panel, adj_df)
+        
+        return panel
+    
+    @staticmethod
+    def select_columns(df: pd.DataFrame, columns: List[str]) -> pd.DataFrame:
+        """按顺序选取存在的列"""
+        available_cols = [col for col in columns if col in df.columns]
+        return df[available_cols].copy()
+    
     @staticmethod
     def normalize_financial(df: pd.DataFrame) -> pd.DataFrame:
         """规范化财务数据"""
@@ -99,3 +123,146 @@ class DataTransformer:
         df = df.drop_duplicates(subset=['ts_code', 'end_date', 'ann_date'], keep='last')
         
         return df
+
+
+class ArrowTransformer:
+    """Arrow转换器（与 DataTransformer 接口一致，输入输出均为 pyarrow.Table）
+    
+    全部用 Arrow compute 内核完成，不经过 pandas：字符串列保持 Arrow 字符串，
+    日期直接解析为 date32，DuckDB 注册时零拷贝扫描。
+    """
+    
+    DAILY_NUMERIC = ['open', 'high', 'low', 'close', 'pre_close', 'change', 'pct_chg', 'vol', 'amount']
+    DAILY_BASIC_NUMERIC = ['turnover_rate', 'turnover_rate_f', 'volume_ratio',
+                           'pe', 'pe_ttm', 'pb', 'ps', 'ps_ttm',
+                           'total_share', 'float_share', 'free_share',
+                           'total_mv', 'circ_mv']
+    
+    @staticmethod
+    def to_arrow(df) -> pa.Table:
+        """pandas -> Arrow（已是 Arrow 时原样返回）"""
+        if df is None or isinstance(df, pa.Table):
+            return df
+        return pa.Table.from_pandas(df, preserve_index=False)
+    
+    @staticmethod
+    def _set_column(table: pa.Table, name: str, values) -> pa.Table:
+        """替换或追加一列"""
+        index = table.schema.get_field_index(name)
+        if index >= 0:
+            return table.set_column(index, name, values)
+        return table.append_column(name, values)
+    
+    @classmethod
+    def _parse_dates(cls, table: pa.Table, columns: List[str]) -> pa.Table:
+        """YYYYMMDD 字符串 -> date32（无法解析的置空）"""
+        for col in columns:
+            if col not in table.column_names:
+                continue
+            values = table[col]
+            if pa.types.is_string(values.type) or pa.types.is_large_string(values.type):
+                valid = pc.match_substring_regex(values, r"^\d{8}$")
+                values = pc.if_else(valid, values, pa.scalar(None, values.type))
+                values = pc.cast(pc.strptime(values, format="%Y%m%d", unit="s"), pa.date32())
+            elif pa.types.is_timestamp(values.type):
+                values = pc.cast(values, pa.date32())
+            table = cls._set_column(table, col, values)
+        return table
+    
+    @classmethod
+    def _to_float(cls, table: pa.Table, columns: List[str]) -> pa.Table:
+        """数值列统一为 float64（字符串中无法解析的值置空）"""
+        for col in columns:
+            if col not in table.column_names:
+                continue
+            values = table[col]
+            if pa.types.is_floating(values.type) and values.type == pa.float64():
+                continue
+            if pa.types.is_string(values.type) or pa.types.is_large_string(values.type):
+                valid = pc.match_substring_regex(values, r"^\s*[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?\s*$")
+                values = pc.if_else(valid, values, pa.scalar(None, values.type))
+            table = cls._set_column(table, col, pc.cast(values, pa.float64()))
+        return table
+    
+    @staticmethod
+    def drop_duplicates(table: pa.Table, keys: List[str]) -> pa.Table:
+        """按主键去重，保留最后一条"""
+        if table.num_rows == 0:
+            return table
+        indexed = table.append_column("__row", pa.array(np.arange(table.num_rows)))
+        last = indexed.group_by(keys).aggregate([("__row", "max")])["__row_max"]
+        if len(last) == table.num_rows:
+            return table
+        return table.take(np.sort(last.to_numpy()))
+    
+    @classmethod
+    def normalize_daily(cls, table: pa.Table) -> pa.Table:
+        """规范化日线数据"""
+        if table is None or table.num_rows == 0:
+            return table
+        
+        table = cls._parse_dates(cls.to_arrow(table), ['trade_date'])
+        table = cls._to_float(table, cls.DAILY_NUMERIC)
+        return cls.drop_duplicates(table, ['ts_code', 'trade_date'])
+    
+    @classmethod
+    def normalize_daily_basic(cls, table: pa.Table) -> pa.Table:
+        """规范化每日指标"""
+        if table is None or table.num_rows == 0:
+            return table
+        
+        table = cls._parse_dates(cls.to_arrow(table), ['trade_date'])
+        table = cls._to_float(table, cls.DAILY_BASIC_NUMERIC)
+        return cls.drop_duplicates(table, ['ts_code', 'trade_date'])
+    
+    @classmethod
+    def normalize_adj_factor(cls, table: pa.Table) -> pa.Table:
+        """规范化复权因子"""
+        if table is None or table.num_rows == 0:
+            return table
+        
+        table = cls._parse_dates(cls.to_arrow(table), ['trade_date'])
+        table = cls._to_float(table, ['adj_factor'])
+        return cls.drop_duplicates(table, ['ts_code', 'trade_date'])
+    
+    @classmethod
+    def compute_adj_price(cls, daily: pa.Table, adj: pa.Table) -> pa.Table:
+        """计算复权价格"""
+        if daily is None or adj is None:
+            return daily
+        
+        merged = daily.join(adj.select(['ts_code', 'trade_date', 'adj_factor']),
+                            keys=['ts_code', 'trade_date'], join_type='left outer')
+        
+        if 'close' in merged.column_names and 'adj_factor' in merged.column_names:
+            merged = cls._set_column(merged, 'adj_close', pc.multiply(merged['close'], merged['adj_factor']))
+        
+        return merged
+    
+    @classmethod
+    def merge_daily_panel(cls, daily: pa.Table, basic: pa.Table, adj: pa.Table) -> pa.Table:
+        """合并日线、每日指标与复权因子（以日线为左表）"""
+        panel = daily
+        
+        if basic is not None and basic.num_rows > 0:
+            panel = panel.join(basic, keys=['ts_code', 'trade_date'], join_type='left outer',
+                               right_suffix='_basic')
+        
+        if adj is not None and adj.num_rows > 0:
+            panel = cls.compute_adj_price(panel, adj)
+        
+        return panel
+    
+    @staticmethod
+    def select_columns(table: pa.Table, columns: List[str]) -> pa.Table:
+        """按顺序选取存在的列"""
+        return table.select([col for col in columns if col in table.column_names])
+    
+    @classmethod
+    def normalize_financial(cls, table: pa.Table) -> pa.Table:
+        """规范化财务数据"""
+        if table is None or table.num_rows == 0:
+            return table
+        
+        table = cls._parse_dates(cls.to_arrow(table), ['end_date', 'ann_date', 'f_ann_date'])
+        return cls.drop_duplicates(table, ['ts_code', 'end_date', 'ann_date'])
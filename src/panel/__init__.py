@@ -1,5 +1,6 @@
 """面板构建模块初始化"""
 from .daily_panel import DailyPanelBuilder
 from .funda_panel import FundaPanelBuilder
+from .snapshot import PanelSnapshot
 
-__all__ = ["DailyPanelBuilder", "FundaPanelBuilder"]
+__all__ = ["DailyPanelBuilder", "FundaPanelBuilder", "PanelSnapshot"]
@@ -1,52 +1,116 @@
 """交易日面板构建器"""
 import pandas as pd
+import pyarrow as pa
 from loguru import logger
+from config import PIPELINE_FORMAT, COMPACT_STORAGE
 from src.core import db
-from src.etl import DataExtractor, DataTransformer, DataLoader
+from src.core.schema import COMPACT_FLOAT_COLUMNS
+from src.etl import DataExtractor, DataTransformer, ArrowTransformer, DataLoader, BatchLoader, PipelineExecutor, TaskGraph
+from src.etl.pipeline import CPU
+from .snapshot import PanelSnapshot
+
+
+def merge_panel(transformer, daily, basic, adj):
+    """合并三张表（日线为空时返回 None；模块级函数，可在进程池中执行）"""
+    if daily is None or len(daily) == 0:
+        return None
+    return transformer.merge_daily_panel(daily, basic, adj)
 
 
 class DailyPanelBuilder:
     """交易日面板构建器（daily + daily_basic + adj_factor 合并）"""
     
+    # 主键字段（每个来源接口都要拉取，用于合并）
+    KEY_FIELDS = ["ts_code", "trade_date"]
+    
+    # 按交易日排序的只读副本（截面查询用，由 optimize_layout 生成，面板写入后失效）
+    BY_DATE_TABLE = "daily_panel_by_date"
+    
+    # 面板字段来源：决定各接口的 fields 投影，只拉取 daily_panel 用得到的列
+    SOURCE_FIELDS = {
+        "daily": ["open", "high", "low", "close", "pre_close", "change", "pct_chg", "vol", "amount"],
+        "daily_basic": ["turnover_rate", "turnover_rate_f", "volume_ratio",
+                        "pe", "pe_ttm", "pb", "ps", "ps_ttm", "dv_ratio", "dv_ttm",
+                        "total_share", "float_share", "free_share", "total_mv", "circ_mv"],
+        "adj_factor": ["adj_factor"],
+    }
+    
+    @classmethod
+    def required_fields(cls, api_name: str) -> list:
+        """面板构建需要从某接口拉取的列"""
+        return cls.KEY_FIELDS + cls.SOURCE_FIELDS[api_name]
+    
     def __init__(self):
         self.extractor = DataExtractor()
-        self.transformer = DataTransformer()
+        self.transformer = ArrowTransformer() if PIPELINE_FORMAT == "arrow" else DataTransformer()
         self.loader = DataLoader()
     
-    def build_for_date(self, trade_date: str):
-        """为单个交易日构建面板"""
-        logger.info(f"构建 {trade_date} 的交易日面板")
-        
-        # 1. 提取三张表
-        daily_df = self.extractor.extract_daily_by_date(trade_date)
-        basic_df = self.extractor.extract_daily_basic_by_date(trade_date)
-        adj_df = self.extractor.extract_adj_factor_by_date(trade_date)
+    def build_graph(self, trade_date: str, batch: BatchLoader = None) -> TaskGraph:
+        """单个交易日的任务图：三个接口并行拉取 -> 各自规范化 -> 合并 -> 加载
         
-        if daily_df is None or len(daily_df) == 0:
-            logger.warning(f"{trade_date} 无行情数据")
-            return
-        
-        # 2. 规范化
-        daily_df = self.transformer.normalize_daily(daily_df)
-        basic_df = self.transformer.normalize_daily_basic(basic_df)
-        adj_df = self.transformer.normalize_adj_factor(adj_df)
+        传入 batch 时该日的完成台账与水位暂缓提交，由执行方在整图成功后 release、失败后 discard。
+        """
+        graph = TaskGraph(trade_date)
+        if batch is not None:
+            batch.hold(trade_date)
+        normalizers = {
+            "daily": self.transformer.normalize_daily,
+            "daily_basic": self.transformer.normalize_daily_basic,
+            "adj_factor": self.transformer.normalize_adj_factor,
+        }
+        
+        # 1-2. 提取（只拉取面板需要的列，拉取失败时整图失败）与规范化
+        for api_name, normalize in normalizers.items():
+            graph.add(f"extract_{api_name}", self.extractor.fetch_date, args=(api_name, trade_date),
+                      kwargs={"fields": self.required_fields(api_name), "loader": batch})
+            graph.add(f"transform_{api_name}", normalize, deps=[f"extract_{api_name}"], kind=CPU)
         
         # 3. 合并（左连接）
-        panel = daily_df.copy()
+        graph.add("merge", merge_panel, args=(self.transformer,),
+                  deps=[f"transform_{api_name}" for api_name in normalizers], kind=CPU)
         
-        if basic_df is not None and len(basic_df) > 0:
-            panel = pd.merge(panel, basic_df, on=['ts_code', 'trade_date'], how='left', suffixes=('', '_basic'))
-        
-        if adj_df is not None and len(adj_df) > 0:
-            panel = self.transformer.compute_adj_price(panel, adj_df)
-        
-        # 4. 加载到面板表
-        self.loader.load_to_daily_panel(panel)
+        # 4. 加载
+        graph.add("load", self._load_panel, args=(trade_date, batch), deps=["merge"])
+        return graph
+    
+    def _load_panel(self, trade_date: str, batch: BatchLoader, panel) -> int:
+        """加载到面板表（按日期排序的副本随之过期；COMPACT_STORAGE 时新出现的证券登记进证券主表）"""
+        if panel is None or len(panel) == 0:
+            logger.warning(f"{trade_date} 无行情数据")
+            return 0
+        
+        self.invalidate_by_date_copy()
+        codes = []
+        if COMPACT_STORAGE:
+            codes = panel["ts_code"].to_pylist() if isinstance(panel, pa.Table) else panel["ts_code"].tolist()
+        if batch is not None:
+            # 多个交易日并行加载：证券登记交给批量加载器在提交时串行执行
+            batch.register_securities(codes)
+            batch.add("daily_panel", panel, pk_fields=["ts_code", "trade_date"])
+        else:
+            if codes:
+                db.register_securities(codes)
+            self.loader.load_to_daily_panel(panel)
         
         logger.info(f"{trade_date} 面板构建完成: {len(panel)} 只股票")
+        return len(panel)
+    
+    def build_for_date(self, trade_date: str, batch: BatchLoader = None):
+        """为单个交易日构建面板（传入 batch 时原始表与面板只缓冲，由批量加载器统一提交）"""
+        logger.info(f"构建 {trade_date} 的交易日面板")
+        
+        with PipelineExecutor(cpu_workers=0) as executor:
+            try:
+                executor.run(self.build_graph(trade_date, batch))
+            except Exception:
+                if batch is not None:
+                    batch.discard(trade_date)
+                raise
+        if batch is not None:
+            batch.release(trade_date)
     
     def build_for_range(self, start_date: str, end_date: str):
-        """批量构建日期范围的面板"""
+        """批量构建日期范围的面板（按交易日流水线执行，多日攒批，单事务提交）"""
         trade_dates = self.extractor.get_trading_dates(start_date, end_date)
         
         if not trade_dates:
@@ -55,18 +119,60 @@ class DailyPanelBuilder:
         
         logger.info(f"开始构建 {len(trade_dates)} 个交易日的面板")
         
-        for trade_date in trade_dates:
-            try:
-                self.build_for_date(trade_date)
-            except Exception as e:
-                logger.error(f"构建 {trade_date} 失败: {e}")
-                continue
+        with BatchLoader() as batch, PipelineExecutor() as executor:
+            graphs = (self.build_graph(trade_date, batch) for trade_date in trade_dates)
+            for graph, _, error in executor.stream(graphs):
+                if error is not None:
+                    # 面板未写成：该日原始表的台账与水位也不推进，断点续传时重新构建
+                    batch.discard(graph.name)
+                    logger.error(f"构建 {graph.name} 失败: {error.cause}")
+                else:
+                    batch.release(graph.name)
         
         logger.info("批量构建完成")
+        self.refresh_snapshot(trade_dates[0])
+    
+    @staticmethod
+    def refresh_snapshot(start_date: str):
+        """已导出过面板快照（scripts/export_panel_snapshot.py）时，增量刷新 start_date 之后的部分"""
+        if PanelSnapshot.latest() is None:
+            return
+        try:
+            PanelSnapshot.refresh(start_date)
+        except Exception as e:
+            logger.error(f"面板快照刷新失败: {e}")
+    
+    @classmethod
+    def optimize_layout(cls, by_date_copy: bool = False) -> dict:
+        """维护命令：按 (ts_code, trade_date) 聚簇重写 daily_panel
+        
+        单只股票查一段日期（行情终端的典型查询）只会命中少数行组；COMPACT_STORAGE 时顺带把面板中的
+        证券补登记进证券主表。by_date_copy=True 时另存一份按 (trade_date, ts_code) 排序的副本，供截面查询使用。
+        """
+        if COMPACT_STORAGE:
+            codes = db.query("SELECT DISTINCT ts_code FROM daily_panel")["ts_code"].tolist()
+            db.register_securities(codes)
+        
+        result = {"daily_panel": db.rewrite_sorted("daily_panel", ["ts_code", "trade_date"])}
+        if by_date_copy:
+            result[cls.BY_DATE_TABLE] = db.create_sorted_copy("daily_panel", cls.BY_DATE_TABLE,
+                                                              ["trade_date", "ts_code"])
+        return result
+    
+    @classmethod
+    def invalidate_by_date_copy(cls):
+        """删除过期的按日期排序副本（截面查询回落到 daily_panel）"""
+        if db.table_exists(cls.BY_DATE_TABLE):
+            db.drop_table(cls.BY_DATE_TABLE)
+            logger.info(f"{cls.BY_DATE_TABLE} 已过期，已删除（重新运行 optimize_layout 生成）")
     
     def query_panel(self, ts_codes: list = None, start_date: str = None, 
                     end_date: str = None, limit: int = 1000) -> pd.DataFrame:
-        """查询面板数据"""
+        """查询面板数据（不限股票的截面查询优先走按日期排序的副本）
+        
+        COMPACT_STORAGE 时 ts_code 以证券主表编号取回、还原为 category，
+        量额/股本/市值列（COMPACT_FLOAT_COLUMNS）转为 float32；价格与复权因子保留 float64。
+        """
         conditions = []
         params = []
         
@@ -85,11 +191,44 @@ class DailyPanelBuilder:
         
         where_clause = " AND ".join(conditions) if conditions else "1=1"
         
+        table = "daily_panel"
+        if not ts_codes and db.table_exists(self.BY_DATE_TABLE):
+            table = self.BY_DATE_TABLE
+        
+        compact = COMPACT_STORAGE and db.table_exists("security_master")
+        if compact:
+            # 只取整数编号，避免为每行物化一个 Python 字符串
+            query = f"""
+                SELECT m.security_id AS ts_code, p.* EXCLUDE (ts_code)
+                FROM {table} p LEFT JOIN security_master m USING (ts_code)
+                WHERE {where_clause}
+                ORDER BY p.trade_date DESC, p.ts_code
+                LIMIT {limit}
+            """
+            df = db.query(query, tuple(params) if params else None)
+            # 编号只增不改，查询之后再取类别表即可覆盖结果中的全部编号
+            if not df["ts_code"].isna().any():
+                return self._compact(df, db.security_codes())
+            logger.warning("部分 ts_code 未登记到证券主表，按字符串查询（运行 optimize_layout 补登记）")
+        
         query = f"""
-            SELECT * FROM daily_panel
+            SELECT * FROM {table}
             WHERE {where_clause}
             ORDER BY trade_date DESC, ts_code
             LIMIT {limit}
         """
         
-        return db.query(query, tuple(params) if params else None)
+        df = db.query(query, tuple(params) if params else None)
+        return self._compact(df) if compact else df
+    
+    @staticmethod
+    def _compact(df: pd.DataFrame, categories: list = None) -> pd.DataFrame:
+        """ts_code -> category（categories 给定时由编号还原），COMPACT_FLOAT_COLUMNS -> float32"""
+        if categories is not None:
+            df["ts_code"] = pd.Categorical.from_codes(df["ts_code"].to_numpy(dtype="int64"), categories=categories)
+        else:
+            df["ts_code"] = df["ts_code"].astype("category")
+        # 与库内存储一致：只有量额/股本/市值降为 float32，价格乘复权因子需要完整精度
+        float_cols = [col for col in COMPACT_FLOAT_COLUMNS if col in df.columns]
+        df[float_cols] = df[float_cols].astype("float32")
+        return df
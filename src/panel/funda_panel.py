@@ -1,24 +1,38 @@
 """财务面板构建器"""
 import pandas as pd
 from loguru import logger
+from config import PIPELINE_FORMAT
 from src.core import db
-from src.etl import DataExtractor, DataTransformer, DataLoader
+from src.etl import DataExtractor, DataTransformer, ArrowTransformer, DataLoader
 
 
 class FundaPanelBuilder:
     """财务面板构建器（三大报表 + 财务指标合并）"""
     
+    # 面板字段来源：决定各接口的 fields 投影（income 约80列，面板只用其中十几列）
+    SOURCE_FIELDS = {
+        "income": ['ts_code', 'end_date', 'ann_date', 'f_ann_date', 'report_type',
+                   'total_revenue', 'operating_profit', 'total_profit',
+                   'n_income', 'n_income_attr_p', 'basic_eps', 'diluted_eps'],
+    }
+    
+    @classmethod
+    def required_fields(cls, api_name: str) -> list:
+        """面板构建需要从某接口拉取的列"""
+        return cls.SOURCE_FIELDS[api_name]
+    
     def __init__(self):
         self.extractor = DataExtractor()
-        self.transformer = DataTransformer()
+        self.transformer = ArrowTransformer() if PIPELINE_FORMAT == "arrow" else DataTransformer()
         self.loader = DataLoader()
     
     def build_for_period(self, period: str, start_date: str = None, end_date: str = None):
         """为指定报告期或公告日范围构建面板"""
         logger.info(f"构建财务面板: period={period}, {start_date}~{end_date}")
         
-        # 1. 提取利润表（简化版，完整版需要三表+指标）
-        income_df = self.extractor.extract_income_by_period(period, start_date, end_date)
+        # 1. 提取利润表（简化版，完整版需要三表+指标）；投影后的窄表只进面板，不写 raw_income
+        income_df = self.extractor.extract_income_by_period(period, start_date, end_date,
+                                                            fields=self.required_fields("income"), store=False)
         
         if income_df is None or len(income_df) == 0:
             logger.warning("无财务数据")
@@ -27,14 +41,9 @@ class FundaPanelBuilder:
         # 2. 规范化
         income_df = self.transformer.normalize_financial(income_df)
         
-        # 3. 选择关键字段（简化版）
-        key_cols = ['ts_code', 'end_date', 'ann_date', 'f_ann_date', 'report_type',
-                    'total_revenue', 'operating_profit', 'total_profit', 
-                    'n_income', 'n_income_attr_p', 'basic_eps', 'diluted_eps',
-                    'revenue_yoy', 'operate_profit_yoy', 'net_profit_yoy']
-        
-        available_cols = [col for col in key_cols if col in income_df.columns]
-        panel = income_df[available_cols].copy()
+        # 3. 选择关键字段（与 SOURCE_FIELDS 投影一致）
+        key_cols = list(dict.fromkeys(col for cols in self.SOURCE_FIELDS.values() for col in cols))
+        panel = self.transformer.select_columns(income_df, key_cols)
         
         # 4. 加载到面板表
         self.loader.load_to_funda_panel(panel)
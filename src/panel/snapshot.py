@@ -0,0 +1,185 @@
+"""面板快照：daily_panel 导出为 Arrow IPC 文件，供多个分析进程内存映射只读共享
+
+布局按 (trade_date, ts_code) 稠密排列：每个交易日一块，块内是完整的证券轴（当天没有
+数据的证券填 NaN），每个数值列因此直接就是 [交易日 x 证券] 矩阵。
+    snap = PanelSnapshot.open()
+    close = snap.field("close")     # np.ndarray (n_dates, n_stocks)，直接指向映射的文件
+    snap.frame("close")             # 同一块内存上的宽表 DataFrame
+
+文件不压缩、只有一个 record batch，open() 只做 mmap，不反序列化也不复制；多个进程打开
+同一个文件共享操作系统页缓存。刷新时写一个新版本文件，再原子替换目录下的 LATEST 指针
+（同 writer.py 的数据库快照）：被映射的文件从不覆盖（Windows 上也无法覆盖），已打开的
+进程继续读旧版本，旧版本保留 SNAPSHOT_KEEP 份。
+"""
+import json
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from loguru import logger
+from config import PANEL_SNAPSHOT_PATH, SNAPSHOT_KEEP
+from src.core import db
+from src.core.schema import to_iso_date
+from src.core.writer import read_latest, switch_latest
+
+# 文件元数据：布局标记与证券轴
+LAYOUT = "date_major_dense"
+META_LAYOUT = b"panel.layout"
+META_CODES = b"panel.ts_codes"
+
+# 导出的数值类型（updated_at 等元数据列不导出）
+NUMERIC_TYPES = ("DOUBLE", "FLOAT", "BIGINT", "INTEGER", "SMALLINT", "TINYINT")
+
+
+class PanelSnapshot:
+    """内存映射的 daily_panel 快照（只读）"""
+    
+    def __init__(self, path: Path, table: pa.Table):
+        metadata = table.schema.metadata or {}
+        if metadata.get(META_LAYOUT) != LAYOUT.encode():
+            raise ValueError(f"不是面板快照文件: {path}")
+        
+        self.path = Path(path)
+        self.table = table
+        self.ts_codes: List[str] = json.loads(metadata[META_CODES])
+        self.n_stocks = len(self.ts_codes)
+        self.n_dates = table.num_rows // self.n_stocks if self.n_stocks else 0
+    
+    @staticmethod
+    def latest(path: Path = PANEL_SNAPSHOT_PATH) -> Optional[Path]:
+        """快照目录中 LATEST 指向的版本文件（尚未导出过返回 None）"""
+        return read_latest(path)
+    
+    @classmethod
+    def open(cls, path: Path = PANEL_SNAPSHOT_PATH) -> "PanelSnapshot":
+        """只读映射快照（path 为快照目录时打开最新版本，也可直接给某个版本文件）"""
+        path = Path(path)
+        if path.is_dir():
+            latest = cls.latest(path)
+            if latest is None:
+                raise FileNotFoundError(f"面板快照尚未导出: {path}")
+            path = latest
+        source = pa.memory_map(str(path), "r")
+        return cls(path, pa.ipc.open_file(source).read_all())
+    
+    @property
+    def dates(self) -> np.ndarray:
+        """交易日轴（datetime64[D]）"""
+        rows = np.arange(0, self.table.num_rows, max(self.n_stocks, 1))
+        return self.table.column("trade_date").take(rows).to_numpy()
+    
+    @property
+    def fields(self) -> List[str]:
+        """可取的数值列"""
+        return [name for name in self.table.column_names if name not in ("trade_date", "ts_code")]
+    
+    def field(self, name: str) -> np.ndarray:
+        """某一列的 [交易日 x 证券] 矩阵（零拷贝只读视图）"""
+        column = self.table.column(name)
+        array = column.chunk(0) if column.num_chunks == 1 else column.combine_chunks()
+        return array.to_numpy(zero_copy_only=True).reshape(self.n_dates, self.n_stocks)
+    
+    def frame(self, name: str) -> pd.DataFrame:
+        """某一列的宽表（行：交易日，列：ts_code）"""
+        return pd.DataFrame(
+            self.field(name),
+            index=pd.DatetimeIndex(self.dates, name="trade_date"),
+            columns=pd.Index(self.ts_codes, name="ts_code"),
+            copy=False,
+        )
+    
+    @classmethod
+    def refresh(cls, start_date: str = None, path: Path = PANEL_SNAPSHOT_PATH) -> "PanelSnapshot":
+        """导出/刷新快照，返回新快照
+        
+        已有快照且证券轴没有变化时只重查 start_date 及之后的交易日，之前的部分直接取自旧文件；
+        否则（首次导出、出现新证券、未给 start_date）全量导出。
+        """
+        path = Path(path)
+        db.sync_snapshot()
+        
+        codes = db.query("SELECT DISTINCT ts_code FROM daily_panel ORDER BY ts_code")["ts_code"].tolist()
+        columns = [col for col, col_type in db.get_column_types("daily_panel").items()
+                   if col_type in NUMERIC_TYPES]
+        
+        previous = cls.open(path) if start_date and cls.latest(path) is not None else None
+        if previous is not None and (previous.ts_codes != codes or previous.fields != columns):
+            logger.info("证券轴或列已变化，面板快照全量导出")
+            previous = None
+        
+        if previous is not None:
+            start = np.datetime64(to_iso_date(start_date), "D")
+            kept_dates = int(np.searchsorted(previous.dates, start))
+            kept = previous.table.slice(0, kept_dates * previous.n_stocks).drop_columns(["ts_code"])
+            added = cls._query_dense(codes, columns, start_date)
+            table = pa.concat_tables([kept, added.cast(kept.schema)])
+            logger.info(f"面板快照增量刷新: 保留 {kept_dates} 个交易日，重查 {added.num_rows // max(len(codes), 1)} 个")
+        else:
+            table = cls._query_dense(codes, columns)
+        
+        # 旧版本可能仍被映射：写新版本文件，切换指针后再清理
+        name = cls._write(path, table, codes)
+        switch_latest(path, name)
+        cls._prune(path)
+        return cls.open(path)
+    
+    @staticmethod
+    def _query_dense(codes: List[str], columns: List[str], start_date: Optional[str] = None) -> pa.Table:
+        """按 交易日 x 证券轴 稠密展开（缺失填 NaN）"""
+        axis = pa.table({"ts_code": pa.array(codes, pa.string()),
+                         "pos": pa.array(np.arange(len(codes), dtype=np.int32))})
+        where = "WHERE trade_date >= CAST(? AS DATE)" if start_date else ""
+        params = [to_iso_date(start_date)] if start_date else []
+        select_list = ", ".join(f'p."{col}"' for col in columns)
+        
+        with db.registered(axis, prefix="_axis") as axis_view:
+            result = db.get_connection().execute(f"""
+                SELECT d.trade_date, {select_list}
+                FROM (SELECT DISTINCT trade_date FROM daily_panel {where}) d
+                CROSS JOIN {axis_view} a
+                LEFT JOIN daily_panel p ON p.trade_date = d.trade_date AND p.ts_code = a.ts_code
+                ORDER BY d.trade_date, a.pos
+            """, params).arrow()
+            # 新版 DuckDB 的 .arrow() 返回 RecordBatchReader，须在视图注销前读完
+            table = result.read_all() if isinstance(result, pa.RecordBatchReader) else result
+        
+        # 空值填 NaN：没有 validity bitmap 的数组才能零拷贝转 numpy
+        for col in columns:
+            index = table.schema.get_field_index(col)
+            values = table.column(col)
+            if not pa.types.is_floating(values.type):
+                values = values.cast(pa.float64())
+            table = table.set_column(index, col, pc.fill_null(values, np.nan))
+        return table
+    
+    @staticmethod
+    def _write(path: Path, table: pa.Table, codes: List[str]) -> str:
+        """在快照目录下写一个新版本（单个 record batch 的 IPC 文件，不压缩），返回文件名"""
+        n_dates = table.num_rows // len(codes) if codes else 0
+        ts_code = pa.DictionaryArray.from_arrays(
+            pa.array(np.tile(np.arange(len(codes), dtype=np.int32), n_dates)), pa.array(codes, pa.string())
+        )
+        table = table.add_column(1, "ts_code", ts_code).combine_chunks()
+        table = table.replace_schema_metadata({META_LAYOUT: LAYOUT, META_CODES: json.dumps(codes)})
+        
+        path.mkdir(parents=True, exist_ok=True)
+        name = f"daily_panel_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.arrow"
+        with pa.OSFile(str(path / name), "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table, max_chunksize=max(table.num_rows, 1))
+        
+        logger.info(f"面板快照已写入: {path / name} ({n_dates} 个交易日 x {len(codes)} 只证券)")
+        return name
+    
+    @staticmethod
+    def _prune(path: Path, keep: int = SNAPSHOT_KEEP):
+        """只保留最近 keep 个版本（仍被其他进程映射的文件删不掉，下次刷新再试）"""
+        versions = sorted(path.glob("daily_panel_*.arrow"))
+        for old in versions[:-max(keep, 1)]:
+            try:
+                old.unlink()
+            except OSError as e:
+                logger.debug(f"删除旧面板快照失败 {old}: {e}")
@@ -0,0 +1,13 @@
+"""测试公共配置：不依赖真实 token 与网络"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# 在导入 config 之前设置：本地限频后端、关闭响应缓存、库文件放在临时目录
+os.environ.setdefault("TUSHARE_TOKEN", "test-token")
+os.environ.setdefault("RATE_LIMIT_BACKEND", "local")
+os.environ.setdefault("CACHE_ENABLED", "false")
+os.environ.setdefault("DATABASE_PATH", str(Path(tempfile.mkdtemp(prefix="tushare-test-")) / "test.duckdb"))
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,48 @@
+"""交易日面板：某个来源接口拉取失败时，该交易日的台账与水位都不推进"""
+import pandas as pd
+import pytest
+
+pytest.importorskip("tushare")
+
+from src.core import db
+from src.etl import extractors as extractors_module
+from src.panel.daily_panel import DailyPanelBuilder
+
+
+class StubClient:
+    """替身客户端：按 fields 投影返回一行数据，failing 中的 (接口, 交易日) 返回 None（同拉取失败）"""
+    
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+    
+    def fetch(self, api_name, use_cache=True, fields=None, **params):
+        trade_date = params["trade_date"]
+        if (api_name, trade_date) in self.failing:
+            return None
+        row = {field: 1.0 for field in fields.split(",")}
+        row.update(ts_code="000001.SZ", trade_date=trade_date)
+        return pd.DataFrame([row])
+
+
+@pytest.fixture
+def builder(monkeypatch):
+    monkeypatch.setattr(extractors_module, "get_client",
+                        lambda: StubClient(failing=[("adj_factor", "20240103")]))
+    builder = DailyPanelBuilder()
+    monkeypatch.setattr(builder.extractor, "get_trading_dates", lambda start, end: ["20240102", "20240103"])
+    monkeypatch.setattr(DailyPanelBuilder, "refresh_snapshot", staticmethod(lambda start_date: None))
+    return builder
+
+
+def test_failed_fetch_not_recorded(builder):
+    builder.build_for_range("20240102", "20240103")
+    
+    ledger = db.query("SELECT api_name, strftime(trade_date, '%Y%m%d') AS trade_date FROM etl_ledger")
+    assert set(ledger["trade_date"]) == {"20240102"}
+    assert set(ledger["api_name"]) == {"daily", "daily_basic", "adj_factor"}
+    
+    watermarks = db.query("SELECT watermark_value FROM etl_state")["watermark_value"]
+    assert set(watermarks) == {"20240102"}
+    
+    panel = db.query("SELECT strftime(trade_date, '%Y%m%d') AS trade_date FROM daily_panel")
+    assert set(panel["trade_date"]) == {"20240102"}
@@ -0,0 +1,29 @@
+"""财务面板：列投影拉到的利润表只进面板，不写 raw_income"""
+import pandas as pd
+import pytest
+
+pytest.importorskip("tushare")
+
+from src.core import db
+from src.etl import extractors as extractors_module
+from src.panel.funda_panel import FundaPanelBuilder
+
+
+class StubClient:
+    """替身客户端：按 fields 投影返回一行利润表"""
+    
+    def fetch(self, api_name, use_cache=True, fields=None, **params):
+        row = {field: 1.0 for field in fields.split(",")}
+        row.update(ts_code="000001.SZ", end_date="20231231", ann_date="20240320",
+                   f_ann_date="20240320", report_type="1")
+        return pd.DataFrame([row])
+
+
+def test_projected_income_not_stored(monkeypatch):
+    monkeypatch.setattr(extractors_module, "get_client", StubClient)
+    db.create_funda_panel_table()
+    
+    FundaPanelBuilder().build_for_period("20231231")
+    
+    assert not db.table_exists("raw_income")
+    assert len(db.query("SELECT * FROM funda_panel WHERE ts_code = '000001.SZ'")) == 1
@@ -0,0 +1,215 @@
+"""本地 HTTP 替身服务：经真实 HTTP 往返验证客户端的重试、offset 分页与按日期拆分"""
+import asyncio
+import json
+import threading
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("tushare")
+
+from src.core import async_client as async_module
+from src.core import tushare_client as client_module
+from src.core.errors import BadRequestError
+from src.core.rate_limiter import LocalStateBackend, RateLimiter
+from src.core.resilience import CircuitBreakerRegistry
+from src.core.tushare_client import TushareClient
+
+THROTTLE_MESSAGE = "抱歉，您每分钟最多访问该接口500次"
+
+
+class StandInServer(ThreadingHTTPServer):
+    """Tushare HTTP 接口替身：POST {api_name, token, params, fields}，返回 {code, msg, data: {fields, items}}
+    
+    - rows: 接口 -> 全部行（按 trade_date / start_date~end_date 过滤）
+    - max_rows: 单次返回行数上限（同服务端截断）
+    - honour_offset: False 时忽略 offset/limit，总是返回第一页
+    - script: 接口 -> 预设的前几次响应，int 为 HTTP 状态码，str 为 Tushare 错误消息
+    """
+    
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StandInHandler)
+        self.rows = {}
+        self.max_rows = 4
+        self.honour_offset = True
+        self.script = {}
+        self.requests = []
+    
+    @property
+    def url(self) -> str:
+        host, port = self.server_address
+        return f"http://{host}:{port}"
+    
+    def respond(self, api_name: str, params: dict):
+        """返回 (HTTP 状态码, 响应体)"""
+        self.requests.append((api_name, params))
+        script = self.script.get(api_name) or []
+        if script:
+            outcome = script.pop(0)
+            if isinstance(outcome, int):
+                return outcome, {"code": -1, "msg": f"HTTP {outcome}"}
+            return 200, {"code": 40203, "msg": outcome, "data": None}
+        
+        rows = [row for row in self.rows.get(api_name, []) if self._matches(row, params)]
+        offset = int(params.get("offset") or 0) if self.honour_offset else 0
+        limit = min(int(params.get("limit") or self.max_rows), self.max_rows)
+        page = rows[offset:offset + limit]
+        
+        fields = list(page[0]) if page else []
+        return 200, {"code": 0, "msg": "", "data": {"fields": fields,
+                                                    "items": [[row[f] for f in fields] for row in page]}}
+    
+    @staticmethod
+    def _matches(row: dict, params: dict) -> bool:
+        date = row["trade_date"]
+        return (params.get("trade_date") in (None, date)
+                and params.get("start_date", date) <= date <= params.get("end_date", date))
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        status, payload = self.server.respond(body["api_name"], body.get("params") or {})
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+    
+    def log_message(self, format, *args):
+        pass
+
+
+class HttpPro:
+    """同步客户端的 pro：按 tushare DataApi 的请求格式直连替身服务"""
+    
+    def __init__(self, url: str, token: str = "test-token"):
+        self.url = url
+        self.token = token
+    
+    def __getattr__(self, api_name):
+        def query(fields: str = "", **kwargs):
+            payload = {"api_name": api_name, "token": self.token, "params": kwargs, "fields": fields}
+            request = urllib.request.Request(self.url, data=json.dumps(payload).encode("utf-8"),
+                                             headers={"Content-Type": "application/json"})
+            # HTTP 错误由 urllib 抛出 HTTPError（带 status），同 requests 的 raise_for_status
+            with urllib.request.urlopen(request, timeout=5) as resp:
+                result = json.loads(resp.read())
+            if result["code"] != 0:
+                raise Exception(result["msg"])
+            return pd.DataFrame(result["data"]["items"], columns=result["data"]["fields"])
+        return query
+
+
+class RecordingLimiter(RateLimiter):
+    """不等待的限频器，记录限频反馈"""
+    
+    def __init__(self):
+        super().__init__(backend=LocalStateBackend(), registry={})
+        self.throttled = []
+    
+    def acquire(self, api_name: str = None):
+        pass
+    
+    async def acquire_async(self, api_name: str = None):
+        pass
+    
+    def report_throttle(self, api_name: str):
+        self.throttled.append(api_name)
+
+
+def daily_rows(dates, codes=("000001.SZ", "000002.SZ")):
+    return [{"ts_code": code, "trade_date": date, "close": 10.0} for date in dates for code in codes]
+
+
+@pytest.fixture
+def server():
+    server = StandInServer()
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def limiter(monkeypatch):
+    limiter = RecordingLimiter()
+    breakers = CircuitBreakerRegistry()
+    for module in (client_module, async_module):
+        monkeypatch.setattr(module, "rate_limiter", limiter)
+        monkeypatch.setattr(module, "circuit_breakers", breakers)
+        monkeypatch.setattr(module, "backoff_delay", lambda attempt, error: 0)
+    monkeypatch.setattr(client_module, "RETRY_MAX_TRIES", 3)
+    return limiter
+
+
+@pytest.fixture
+def client(server, limiter):
+    client = TushareClient.__new__(TushareClient)
+    client.pro = HttpPro(server.url)
+    client.endpoints = {"daily": {"max_rows": server.max_rows, "pk_fields": ["ts_code", "trade_date"]}}
+    return client
+
+
+def test_retry_over_http(server, client, limiter):
+    server.rows["daily"] = daily_rows(["20240102"])
+    server.script["daily"] = [503, THROTTLE_MESSAGE]
+    
+    df = client._call_api("daily", trade_date="20240102")
+    
+    assert len(df) == 2
+    assert len(server.requests) == 3
+    assert limiter.throttled == ["daily"]
+
+
+def test_bad_request_not_retried_over_http(server, client):
+    server.script["daily"] = [400]
+    
+    with pytest.raises(BadRequestError):
+        client._call_api("daily", trade_date="20240102")
+    assert len(server.requests) == 1
+
+
+def test_paginates_over_http(server, client):
+    dates = [f"202401{day:02d}" for day in range(2, 7)]
+    server.rows["daily"] = daily_rows(dates)
+    
+    df = client._call_paginated("daily", start_date="20240102", end_date="20240106")
+    
+    assert len(df) == 10
+    assert not df.duplicated(["ts_code", "trade_date"]).any()
+    assert [params.get("offset") for _, params in server.requests] == [None, 4, 8]
+
+
+def test_splits_by_date_when_offset_ignored(server, client):
+    dates = [f"202401{day:02d}" for day in range(2, 10)]
+    server.rows["daily"] = daily_rows(dates)
+    server.honour_offset = False
+    
+    df = client._call_paginated("daily", start_date="20240102", end_date="20240109")
+    
+    assert len(df) == 16
+    assert sorted(df["trade_date"].unique()) == dates
+    # 拆分后的每段请求都在原区间内
+    windows = [(p["start_date"], p["end_date"]) for _, p in server.requests if "offset" not in p]
+    assert all("20240102" <= start <= end <= "20240109" for start, end in windows)
+
+
+def test_async_client_retries_over_http(server, limiter):
+    pytest.importorskip("aiohttp")
+    server.rows["daily"] = daily_rows(["20240102"])
+    server.script["daily"] = [502, THROTTLE_MESSAGE]
+    
+    async def call():
+        async with async_module.AsyncTushareClient(token="test-token", http_url=server.url, tries=3) as client:
+            return await client._call_api("daily", trade_date="20240102")
+    
+    df = asyncio.run(call())
+    
+    assert len(df) == 2
+    assert len(server.requests) == 3
+    assert limiter.throttled == ["daily"]
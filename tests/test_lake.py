@@ -0,0 +1,61 @@
+"""Parquet 湖：视图中的日期列为 DATE；多个进程同时写同一分区不会互相覆盖"""
+import multiprocessing
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("tushare")
+
+from src.core import db
+from src.core.lake import ParquetLake, raw_lake
+
+
+def write_rows(root, codes):
+    """子进程：逐行写入同一分区（每次都是读改写）"""
+    lake = ParquetLake(root=root, enabled=True)
+    lake.ensure_view = lambda table_name: None
+    for code in codes:
+        lake.write("raw_fund_nav", pd.DataFrame([{"ts_code": code, "nav_date": "20240102", "unit_nav": 1.0}]),
+                   pk_fields=["ts_code", "nav_date"])
+
+
+@pytest.fixture
+def lake(tmp_path, monkeypatch):
+    monkeypatch.setattr(raw_lake, "root", tmp_path)
+    monkeypatch.setattr(raw_lake, "enabled", True)
+    monkeypatch.setattr(raw_lake, "_views", set())
+    return raw_lake
+
+
+def test_view_casts_every_date_column(lake):
+    lake.write("raw_fund_nav", pd.DataFrame({
+        "ts_code": ["000001.OF", "000002.OF"],
+        "nav_date": ["20240102", "20240102"],
+        "ann_date": ["20240103", None],
+        "end_date": ["20240102", ""],
+        "unit_nav": [1.0, 2.0],
+    }), pk_fields=["ts_code", "nav_date"])
+    
+    types = dict(db.query("DESCRIBE raw_fund_nav")[["column_name", "column_type"]].values)
+    assert types["nav_date"] == "DATE"
+    assert types["ann_date"] == "DATE"
+    assert types["end_date"] == "DATE"
+    assert types["unit_nav"] == "DOUBLE"
+    
+    rows = db.query("SELECT ts_code, ann_date, end_date FROM raw_fund_nav ORDER BY ts_code")
+    assert str(rows["ann_date"][0])[:10] == "2024-01-03"
+    assert pd.isna(rows["ann_date"][1]) and pd.isna(rows["end_date"][1])
+
+
+def test_concurrent_processes_keep_all_rows(tmp_path):
+    context = multiprocessing.get_context("spawn")
+    workers = [context.Process(target=write_rows, args=(tmp_path, [f"{i:06d}.OF" for i in range(k, 40, 4)]))
+               for k in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(timeout=120)
+        assert worker.exitcode == 0
+    
+    path = ParquetLake(root=tmp_path).partition_path("raw_fund_nav", "20240102") / "part-0.parquet"
+    assert len(pd.read_parquet(path)) == 40
@@ -0,0 +1,69 @@
+"""限频器：模拟时钟下任意一个周期内的放行次数不超过配额"""
+import importlib
+from bisect import bisect_left
+
+import pytest
+
+pytest.importorskip("tushare")
+
+from src.core.rate_limiter import LocalStateBackend, RateLimiter, SqliteStateBackend
+
+
+class FakeClock:
+    """可手动推进的时钟"""
+    
+    def __init__(self, start: float = 1_000_000.0):
+        self.now = start
+    
+    def __call__(self) -> float:
+        return self.now
+
+
+def run_greedy(limiter: RateLimiter, clock: FakeClock, seconds: float, api_name: str = None):
+    """贪心调用方：被拒绝时按返回的等待时间推进时钟，返回全部放行时刻"""
+    end = clock.now + seconds
+    grants = []
+    while clock.now < end:
+        wait = limiter._reserve(api_name)
+        if wait > 0:
+            clock.now += wait
+        else:
+            grants.append(clock.now)
+            clock.now += 0.001
+    return grants
+
+
+def max_in_window(grants, period: float) -> int:
+    """任意长度为 period 的窗口内最多的放行次数"""
+    return max(bisect_left(grants, start + period) - i for i, start in enumerate(grants))
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    # src.core 包导出了同名的全局单例，按模块路径取模块本身
+    monkeypatch.setattr(importlib.import_module("src.core.rate_limiter").time, "time", clock)
+    return clock
+
+
+@pytest.mark.parametrize("backend", ["local", "sqlite"])
+def test_grants_within_quota_in_any_minute(clock, tmp_path, backend):
+    state = LocalStateBackend() if backend == "local" else SqliteStateBackend(tmp_path / "rl.sqlite")
+    limiter = RateLimiter(calls_per_minute=500, calls_per_day=100000, backend=state, registry={})
+    
+    grants = run_greedy(limiter, clock, 180)
+    
+    assert max_in_window(grants, 60) <= 500
+    # 仍能用满配额：三分钟内放行接近三个周期的配额
+    assert len(grants) >= 1400
+    assert limiter.get_stats()["calls_last_minute"] <= 500
+
+
+def test_endpoint_bucket_within_quota(clock):
+    limiter = RateLimiter(calls_per_minute=500, calls_per_day=100000, backend=LocalStateBackend(),
+                          registry={"daily": {"rate_limit_per_minute": 50}})
+    
+    grants = run_greedy(limiter, clock, 150, api_name="daily")
+    
+    assert max_in_window(grants, 60) <= 50
+    assert limiter.get_stats()["endpoints"]["daily"]["calls_last_minute"] <= 50
@@ -0,0 +1,254 @@
+"""错误分类、分类重试、限频反馈与熔断（用替身 pro 注入各类失败）"""
+import time
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("tushare")
+
+from src.core import tushare_client as client_module
+from src.core.errors import (
+    BadRequestError,
+    CircuitOpenError,
+    PermissionDeniedError,
+    ThrottleError,
+    TransientError,
+    TushareAPIError,
+    classify_error,
+)
+from src.core.rate_limiter import LocalStateBackend, RateLimiter
+from src.core.resilience import CircuitBreaker, CircuitBreakerRegistry
+from src.core.tushare_client import TushareClient
+
+
+class HTTPStatusError(Exception):
+    """带状态码的 HTTP 错误（同 aiohttp.ClientResponseError）"""
+    
+    def __init__(self, status: int):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+
+
+class ReadTimeout(Exception):
+    """同名于 requests.exceptions.ReadTimeout"""
+
+
+class FakePro:
+    """替身 pro：每个接口按顺序返回预设结果，结果为异常时抛出"""
+    
+    def __init__(self, **outcomes):
+        self.outcomes = {name: list(results) for name, results in outcomes.items()}
+        self.calls = {name: 0 for name in outcomes}
+    
+    def __getattr__(self, api_name):
+        if api_name not in self.outcomes:
+            raise AttributeError(api_name)
+        
+        def call(**kwargs):
+            self.calls[api_name] += 1
+            results = self.outcomes[api_name]
+            result = results.pop(0) if len(results) > 1 else results[0]
+            if isinstance(result, BaseException):
+                raise result
+            return result
+        return call
+
+
+class RecordingLimiter(RateLimiter):
+    """不等待的限频器，记录限频反馈"""
+    
+    def __init__(self):
+        super().__init__(backend=LocalStateBackend(), registry={})
+        self.throttled = []
+    
+    def acquire(self, api_name: str = None):
+        pass
+    
+    def report_throttle(self, api_name: str):
+        self.throttled.append(api_name)
+        super().report_throttle(api_name)
+
+
+FRAME = pd.DataFrame({"ts_code": ["000001.SZ"], "close": [10.0]})
+
+
+@pytest.fixture
+def limiter(monkeypatch):
+    limiter = RecordingLimiter()
+    monkeypatch.setattr(client_module, "rate_limiter", limiter)
+    return limiter
+
+
+@pytest.fixture
+def breakers(monkeypatch):
+    breakers = CircuitBreakerRegistry()
+    monkeypatch.setattr(client_module, "circuit_breakers", breakers)
+    return breakers
+
+
+@pytest.fixture
+def make_client(monkeypatch, limiter, breakers):
+    """绕过 token 与网络初始化，注入替身 pro；退避等待置零"""
+    monkeypatch.setattr(client_module, "backoff_delay", lambda attempt, error: 0)
+    monkeypatch.setattr(client_module, "RETRY_MAX_TRIES", 3)
+    
+    def make(**outcomes):
+        client = TushareClient.__new__(TushareClient)
+        client.pro = FakePro(**outcomes)
+        client.endpoints = {}
+        return client
+    return make
+
+
+@pytest.mark.parametrize("exc, expected", [
+    (Exception("抱歉，您每分钟最多访问该接口500次"), ThrottleError),
+    (HTTPStatusError(429), ThrottleError),
+    (Exception("抱歉，您没有访问该接口的权限"), PermissionDeniedError),
+    (Exception("您的token不对，请确认。"), PermissionDeniedError),
+    (HTTPStatusError(403), PermissionDeniedError),
+    (Exception("必填参数 ts_code 缺失"), BadRequestError),
+    (ValueError("bad date"), BadRequestError),
+    (HTTPStatusError(400), BadRequestError),
+    (ConnectionError("reset by peer"), TransientError),
+    (ReadTimeout("read timed out"), TransientError),
+    (HTTPStatusError(503), TransientError),
+    (Exception("系统繁忙，请稍后再试"), TransientError),
+])
+def test_classify_error(exc, expected):
+    error = classify_error(exc, "daily")
+    assert type(error) is expected
+    assert error.api_name == "daily"
+    assert str(exc) in str(error)
+
+
+def test_classify_unknown_error_is_retryable():
+    error = classify_error(RuntimeError("???"), "daily")
+    assert type(error) is TushareAPIError
+    assert error.retryable
+
+
+@pytest.mark.parametrize("exc, expected", [
+    (Exception("抱歉，您没有访问该接口的权限"), PermissionDeniedError),
+    (Exception("参数错误: trade_date"), BadRequestError),
+])
+def test_no_retry_on_permission_or_bad_request(make_client, breakers, exc, expected):
+    client = make_client(daily=[exc, FRAME])
+    
+    with pytest.raises(expected):
+        client._call_api("daily", trade_date="20240102")
+    
+    assert client.pro.calls["daily"] == 1
+    # 非可重试错误不计入熔断
+    assert breakers.get("daily").failures == 0
+
+
+def test_transient_error_retried_then_succeeds(make_client, breakers):
+    client = make_client(daily=[ConnectionError("reset"), ReadTimeout("timed out"), FRAME])
+    
+    df = client._call_api("daily", trade_date="20240102")
+    
+    assert df.equals(FRAME)
+    assert client.pro.calls["daily"] == 3
+    assert breakers.get("daily").state == "closed"
+
+
+def test_retries_exhausted_raise_classified_error(make_client, breakers):
+    client = make_client(daily=[ConnectionError("reset")])
+    
+    with pytest.raises(TransientError) as info:
+        client._call_api("daily", trade_date="20240102")
+    
+    assert isinstance(info.value.__cause__, ConnectionError)
+    assert client.pro.calls["daily"] == 3
+    assert breakers.get("daily").failures == 1
+
+
+def test_throttle_feedback_reaches_limiter(make_client, limiter):
+    client = make_client(daily=[Exception("抱歉，您每分钟最多访问该接口500次"), FRAME])
+    
+    df = client._call_api("daily", trade_date="20240102")
+    
+    assert df.equals(FRAME)
+    assert limiter.throttled == ["daily"]
+    assert limiter._penalty_factor("daily", time.time()) == 0.5
+    # 降速体现为该接口的分钟桶配额减半
+    limits = {name: limit for name, _, limit in limiter._buckets("daily")}
+    assert limits["daily:minute"] == limiter.calls_per_minute // 2
+
+
+def test_throttle_penalty_paces_without_burst(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    # 未单独配置配额的接口：降速后的接口桶此前没有状态
+    limiter = RateLimiter(calls_per_minute=500, backend=LocalStateBackend(), registry={})
+    limiter.report_throttle("daily")
+    
+    grants = []
+    while now[0] < 1060.0:
+        wait = limiter._reserve("daily")
+        if wait > 0:
+            now[0] += wait
+        else:
+            grants.append(now[0])
+            now[0] += 0.001
+    
+    # 按减半后的间隔（60/250 秒）匀速放行，不会立即突发半个配额
+    assert sum(1 for granted in grants if granted < 1001.0) <= 5
+    assert len(grants) <= 250
+
+
+def test_breaker_open_half_open_closed(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("src.core.resilience.time.time", lambda: now[0])
+    breaker = CircuitBreaker("daily", failure_threshold=2, reset_seconds=60)
+    
+    # 非可重试错误不计数
+    breaker.record_failure(PermissionDeniedError("denied", "daily"))
+    assert breaker.state == "closed" and breaker.failures == 0
+    
+    breaker.record_failure(TransientError("timeout", "daily"))
+    assert breaker.state == "closed"
+    breaker.record_failure(TransientError("timeout", "daily"))
+    assert breaker.state == "open"
+    assert not breaker.allow()
+    
+    # 冷却结束放行试探调用，试探失败重新打开
+    now[0] += 61
+    assert breaker.allow()
+    assert breaker.state == "half_open"
+    breaker.record_failure(TransientError("timeout", "daily"))
+    assert breaker.state == "open"
+    assert not breaker.allow()
+    
+    # 再次冷却，试探成功则关闭
+    now[0] += 61
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.failures == 0
+    assert breaker.allow()
+
+
+def test_client_rejects_calls_while_breaker_open(make_client, breakers, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("src.core.resilience.time.time", lambda: now[0])
+    breakers._breakers["daily"] = CircuitBreaker("daily", failure_threshold=2, reset_seconds=60)
+    client = make_client(daily=[ConnectionError("reset"), ConnectionError("reset"), ConnectionError("reset"),
+                                ConnectionError("reset"), ConnectionError("reset"), ConnectionError("reset"),
+                                FRAME])
+    
+    for _ in range(2):
+        with pytest.raises(TransientError):
+            client._call_api("daily", trade_date="20240102")
+    assert breakers.get("daily").state == "open"
+    
+    # 熔断期间不调用接口
+    with pytest.raises(CircuitOpenError):
+        client._call_api("daily", trade_date="20240102")
+    assert client.pro.calls["daily"] == 6
+    
+    # 冷却后试探调用成功，熔断关闭
+    now[0] += 61
+    df = client._call_api("daily", trade_date="20240102")
+    assert df.equals(FRAME)
+    assert client.pro.calls["daily"] == 7
+    assert breakers.get("daily").state == "closed"
@@ -0,0 +1,35 @@
+"""写入进程连接密钥"""
+import os
+import stat
+import sys
+
+import pytest
+
+pytest.importorskip("tushare")
+
+from src.core.writer import WriterError, load_authkey
+
+
+def test_default_authkey_refused(tmp_path):
+    with pytest.raises(WriterError):
+        load_authkey("tushare-writer", create=True, key_path=tmp_path / "writer.key")
+
+
+def test_configured_authkey_used(tmp_path):
+    assert load_authkey("8f1c2e9a7b", key_path=tmp_path / "writer.key") == b"8f1c2e9a7b"
+    assert not (tmp_path / "writer.key").exists()
+
+
+def test_generated_key_shared_with_clients(tmp_path):
+    key_path = tmp_path / "serve" / "writer.key"
+    
+    # 写入进程启动前客户端拿不到密钥
+    with pytest.raises(WriterError):
+        load_authkey("", key_path=key_path)
+    
+    key = load_authkey("", create=True, key_path=key_path)
+    assert len(key) == 64
+    assert load_authkey("", create=True, key_path=key_path) == key
+    assert load_authkey("", key_path=key_path) == key
+    if sys.platform != "win32":
+        assert stat.S_IMODE(os.stat(key_path).st_mode) == 0o600
@@ -7,7 +7,7 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
 from src.core import get_client, db
-from src.etl import DataExtractor
+from src.etl import DataExtractor, BatchLoader
 from src.panel import DailyPanelBuilder
 
 st.set_page_config(page_title="Data Studio", page_icon="🔧", layout="wide")
@@ -137,17 +137,19 @@ with tab1:
                         progress_bar = st.progress(0)
                         status_text = st.empty()
                         
-                        for i, date in enumerate(trade_dates):
-                            status_text.text(f"正在拉取: {date}")
-                            
-                            try:
-                                extractor.extract_daily_by_date(date)
-                                extractor.extract_daily_basic_by_date(date)
-                                extractor.extract_adj_factor_by_date(date)
-                            except Exception as e:
-                                st.warning(f"{date} 拉取失败: {e}")
-                            
-                            progress_bar.progress((i + 1) / len(trade_dates))
+                        # 多日攒批，单事务提交（水位在提交后推进）
+                        with BatchLoader() as batch:
+                            for i, date in enumerate(trade_dates):
+                                status_text.text(f"正在拉取: {date}")
+                                
+                                try:
+                                    extractor.extract_daily_by_date(date, loader=batch)
+                                    extractor.extract_daily_basic_by_date(date, loader=batch)
+                                    extractor.extract_adj_factor_by_date(date, loader=batch)
+                                except Exception as e:
+                                    st.warning(f"{date} 拉取失败: {e}")
+                                
+                                progress_bar.progress((i + 1) / len(trade_dates))
                         
                         status_text.text("✅ 批量拉取完成")
                         st.success(f"已完成 {len(trade_dates)} 个交易日的数据拉取")
@@ -157,11 +157,7 @@ if st.button("🚀 探测所有接口", key="probe_all"):
             # 保存到数据库
             from src.core import db
             for result in results:
-                db.execute("""
-                    INSERT OR REPLACE INTO endpoint_capabilities 
-                    (api_name, status, message, last_probe_at)
-                    VALUES (?, ?, ?, datetime('now'))
-                """, (result["接口名"], result["探测状态"], result["消息"]))
+                db.record_capability(result["接口名"], result["探测状态"], result["消息"])
             
             st.success("探测结果已保存到数据库")
         
@@ -196,6 +192,8 @@ if selected_api:
         st.write(f"- **增量字段**: {api_config.get('watermark_field', 'N/A')}")
         st.write(f"- **最大行数**: {api_config.get('max_rows', 'N/A')}")
         st.write(f"- **增量策略**: {api_config.get('increment_strategy', 'N/A')}")
+        if api_config.get('rate_limit_per_minute') or api_config.get('daily_quota'):
+            st.write(f"- **接口限频**: {api_config.get('rate_limit_per_minute', '-')}次/分钟, {api_config.get('daily_quota', '-')}次/天")
 
 st.markdown("---")
 st.caption("💡 提示：独立权限接口需要联系Tushare官方单独开通（如分钟线、新闻公告等）")